@@ -0,0 +1,210 @@
+# agent_server.py
+"""
+Local HTTP/WebSocket front end for the agent service, so several clients can share one Jarvis process.
+
+Usage:
+    python agent_server.py [--host 127.0.0.1] [--port 8765] [--workers 8]
+
+Endpoints:
+    POST /threads/{thread_id}/messages  {"message": "..."} -> {"status": ..., "response": ...}
+    POST /threads/{thread_id}/cancel    -> {"cancelled": <number of requests>}
+    GET  /stats                         -> service counters and active threads
+    WS   /threads/{thread_id}/ws        send {"message": "..."} or {"cancel": true};
+                                        receive {"event": "start", "data": <message>} when a message
+                                        starts running, {"event": ..., "data": ...} for every agent event,
+                                        then {"event": "done", "data": {"status": ..., "response": ...}}
+
+The agent can run commands and control the desktop, so the server only listens on localhost by
+default and every request needs a token: clients must send "Authorization: Bearer <token>" (or
+?token=<token> on the WebSocket). The token is JARVIS_SERVER_TOKEN if set; otherwise one is
+generated and written to .jarvis_cache/server_token, readable only by the current user, where
+local clients pick it up (see read_server_token). Requests from a browser page (with an Origin
+header) are only accepted from localhost or the origins listed in JARVIS_SERVER_ORIGINS, so a web
+page open in the user's browser can't connect to the server.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+from urllib.parse import urlsplit
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from agent_service import AgentService, jarvis
+
+logger = logging.getLogger(__name__)
+
+class MessageRequest(BaseModel):
+    message: str
+
+def _event_json(event, payload):
+    """Converts an agent event to a JSON-serializable dict."""
+    if event == "tool_result":
+        payload = {"name": payload.name, "tool_call_id": payload.tool_call_id, "content": payload.content}
+    return {"event": event, "data": payload}
+
+CACHE_DIR = os.getenv("JARVIS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jarvis_cache"))
+TOKEN_PATH = os.path.join(CACHE_DIR, "server_token")
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+def read_server_token():
+    """Returns the server's token: JARVIS_SERVER_TOKEN, or the generated one from TOKEN_PATH (None if there is none yet)."""
+    token = os.getenv("JARVIS_SERVER_TOKEN")
+    if token:
+        return token
+    try:
+        with open(TOKEN_PATH, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def create_server_token():
+    """Returns the token clients must send, generating and saving a new one if JARVIS_SERVER_TOKEN isn't set."""
+    token = os.getenv("JARVIS_SERVER_TOKEN")
+    if token:
+        return token
+    token = secrets.token_urlsafe(32)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Readable by the current user only; a new token replaces the previous run's
+    fd = os.open(TOKEN_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+def _authorized(supplied, token):
+    return supplied is not None and hmac.compare_digest(supplied.encode(), token.encode())
+
+def _allowed_origin(origin):
+    """Requests without an Origin header don't come from a browser page; pages must be local or allow-listed."""
+    if origin is None:
+        return True
+    allowed = [o.strip().rstrip("/") for o in os.getenv("JARVIS_SERVER_ORIGINS", "").split(",") if o.strip()]
+    if origin.rstrip("/") in allowed:
+        return True
+    parts = urlsplit(origin)
+    return parts.scheme in ("http", "https") and parts.hostname in LOCAL_HOSTS
+
+def _bearer(header):
+    if header and header.lower().startswith("bearer "):
+        return header[7:].strip()
+    return None
+
+def _use_async():
+    return os.getenv("JARVIS_ASYNC_AGENT", "1") != "0"
+
+def create_app(service=None, token=None):
+    """
+    Creates the FastAPI app serving requests through the given AgentService (a new one by default).
+
+    Args:
+        service: The AgentService to run requests on.
+        token: The token clients must send; by default JARVIS_SERVER_TOKEN or a newly generated one (see create_server_token).
+    """
+    service = service or AgentService(max_workers=8, use_async=_use_async())
+    token = token or create_server_token()
+    app = FastAPI(title="Jarvis agent service")
+
+    @app.middleware("http")
+    async def check_token(request: Request, call_next):
+        if not _allowed_origin(request.headers.get("origin")):
+            return JSONResponse({"detail": "Origin not allowed"}, status_code=403)
+        if not _authorized(_bearer(request.headers.get("authorization")), token):
+            return JSONResponse({"detail": "Unauthorized"}, status_code=401)
+        return await call_next(request)
+
+    @app.post("/threads/{thread_id}/messages")
+    async def post_message(thread_id: str, body: MessageRequest):
+        request = service.submit(thread_id, body.message)
+        try:
+            response = await asyncio.wrap_future(request.future)
+        except Exception as e:
+            raise HTTPException(status_code=429 if request.status == "rejected" else 500, detail=str(e))
+        return {"status": request.status, "response": response}
+
+    @app.post("/threads/{thread_id}/cancel")
+    async def cancel(thread_id: str):
+        return {"cancelled": service.cancel(thread_id)}
+
+    @app.get("/stats")
+    async def stats():
+        result = {**service.stats, "max_workers": service.max_workers, "active_threads": service.active_threads()}
+        cache = jarvis.response_cache
+        if cache is not None:
+            result["response_cache"] = {**cache.stats, "hit_rate": cache.hit_rate(), "entries": len(cache)}
+        return result
+
+    @app.websocket("/threads/{thread_id}/ws")
+    async def conversation(websocket: WebSocket, thread_id: str):
+        supplied = websocket.query_params.get("token") or _bearer(websocket.headers.get("authorization"))
+        if not _allowed_origin(websocket.headers.get("origin")) or not _authorized(supplied, token):
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+
+        loop = asyncio.get_running_loop()
+        outgoing = asyncio.Queue()
+
+        def send_from_worker(item):
+            # Called on a service worker thread or the service's event loop; the run continues even if the client has gone away
+            try:
+                loop.call_soon_threadsafe(outgoing.put_nowait, item)
+            except RuntimeError:
+                pass
+
+        def on_event(event, payload):
+            send_from_worker(_event_json(event, payload))
+
+        def on_done(request):
+            try:
+                data = {"status": request.status, "response": request.future.result()}
+            except Exception as e:
+                data = {"status": "error", "response": str(e)}
+            send_from_worker({"event": "done", "data": data})
+
+        async def send_events():
+            while True:
+                item = await outgoing.get()
+                await websocket.send_text(json.dumps(item, default=str))
+
+        sender = asyncio.create_task(send_events())
+        try:
+            while True:
+                incoming = await websocket.receive_json()
+                if incoming.get("cancel"):
+                    await outgoing.put({"event": "cancelled", "data": {"cancelled": service.cancel(thread_id)}})
+                elif isinstance(incoming.get("message"), str):
+                    request = service.submit(thread_id, incoming["message"], on_event=on_event)
+                    request.future.add_done_callback(lambda future, request=request: on_done(request))
+                else:
+                    await outgoing.put({"event": "error", "data": "Expected {\"message\": ...} or {\"cancel\": true}"})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Jarvis agent over HTTP and WebSocket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8, help="Agent interactions that may run at the same time")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("JARVIS_LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    token = create_server_token()
+    if os.getenv("JARVIS_SERVER_TOKEN"):
+        logger.info("Clients must send the token from JARVIS_SERVER_TOKEN")
+    else:
+        logger.info("Clients must send the token saved in %s", TOKEN_PATH)
+    if args.host not in LOCAL_HOSTS:
+        logger.warning("Serving on a non-local address: anyone on the network with the token can control this computer")
+
+    import uvicorn
+    uvicorn.run(create_app(AgentService(max_workers=args.workers, use_async=_use_async()), token), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
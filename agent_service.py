@@ -0,0 +1,244 @@
+# agent_service.py
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from tools.lazy_import import lazy_import
+
+# Imported on first use so the UI can create the service before LangChain is loaded
+jarvis = lazy_import("jarvis")
+async_runtime = lazy_import("tools.async_runtime")
+
+logger = logging.getLogger(__name__)
+
+class AgentRequest:
+    """
+    One message sent to the agent, as tracked by AgentService.
+
+    status moves from "queued" to "running" and ends as "done", "cancelled" or "error" (or is
+    "rejected" right away if the thread's queue is full). future
+    resolves to the final response text (or the error), so callers can wait for it or chain on it.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, thread_id, user_input, on_event=None):
+        self.id = next(self._ids)
+        self.thread_id = thread_id
+        self.user_input = user_input
+        self.on_event = on_event
+        self.status = "queued"
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._task = None # Future of the task running the request, in async mode
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+class AgentService:
+    """
+    Runs agent interactions for many conversation threads on a bounded worker pool.
+
+    Each thread ID has its own queue: messages for one conversation run one after another in the
+    order they were sent, while different conversations run concurrently on up to max_workers
+    workers. A new message is always accepted, even while an earlier one is still running.
+
+    With use_async, interactions run as tasks on the shared event loop of tools.async_runtime
+    instead of on worker threads, and a cancelled request stops right away, even in the middle
+    of a model call. max_workers then only limits how many run at the same time.
+
+    Args:
+        max_workers: Number of interactions that may run at the same time.
+        max_queued_per_thread: Messages a conversation may have waiting; more are rejected.
+        stream: Function streaming one interaction. Defaults to jarvis.stream_agent_interaction.
+        cancel_tools: Function cancelling a thread's running tool calls. Defaults to jarvis.cancel_agent_interaction.
+        use_async: Whether to run interactions on the event loop.
+        astream: Async generator function streaming one interaction, used with use_async.
+            Defaults to jarvis.astream_agent_interaction.
+    """
+
+    def __init__(self, max_workers=4, max_queued_per_thread=16, stream=None, cancel_tools=None, use_async=False, astream=None):
+        self.max_workers = max_workers
+        self.max_queued_per_thread = max_queued_per_thread
+        self.use_async = use_async
+        self._stream = stream
+        self._astream = astream
+        self._cancel_tools = cancel_tools
+        self._executor = None if use_async else ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jarvis-agent")
+        self._slots = None # Semaphore limiting the interactions running on the event loop
+        self._lock = threading.Lock()
+        self._queues = {} # thread_id -> deque of waiting AgentRequests
+        self._running = {} # thread_id -> the AgentRequest being run
+        self.stats = {"submitted": 0, "completed": 0, "cancelled": 0, "failed": 0, "rejected": 0}
+
+    def submit(self, thread_id, user_input, on_event=None):
+        """
+        Queues a message for a conversation thread.
+
+        Args:
+            thread_id: The conversation thread ID.
+            user_input: The user's message.
+            on_event: Optional callback receiving each (event, payload) of the interaction, from a
+                worker thread (or the event loop's thread with use_async): ("start", user_input) when
+                the request starts running, after the earlier messages of the thread have finished,
+                then the events of jarvis.stream_agent_interaction. Not called for a request
+                cancelled while it was queued.
+
+        Returns:
+            The AgentRequest. Its future fails with RuntimeError if the thread's queue is full.
+        """
+        request = AgentRequest(thread_id, user_input, on_event)
+        with self._lock:
+            queue = self._queues.setdefault(thread_id, deque())
+            if len(queue) >= self.max_queued_per_thread:
+                self.stats["rejected"] += 1
+                request.status = "rejected"
+                request.future.set_exception(RuntimeError(f"Too many queued messages for thread {thread_id}"))
+                return request
+            queue.append(request)
+            self.stats["submitted"] += 1
+            # A thread with a run in progress is picked up again when that run finishes
+            if thread_id not in self._running:
+                self._schedule(thread_id)
+        return request
+
+    def cancel(self, thread_id, include_queued=True):
+        """
+        Stops the run in progress for a thread and, unless include_queued is False, drops its waiting messages.
+
+        Returns:
+            The number of requests cancelled.
+        """
+        with self._lock:
+            cancelled = []
+            if include_queued:
+                queue = self._queues.get(thread_id) or deque()
+                cancelled.extend(queue)
+                queue.clear()
+            running = self._running.get(thread_id)
+        for request in cancelled:
+            self._finish(request, "cancelled", result="Cancelled.")
+        if running is not None and not running.cancelled:
+            running._cancel.set()
+            # Tools notice the cancellation right away; the model stream stops at its next event
+            (self._cancel_tools or jarvis.cancel_agent_interaction)(thread_id)
+            if running._task is not None:
+                running._task.cancel()
+            cancelled.append(running)
+        return len(cancelled)
+
+    def pending(self, thread_id):
+        """Returns how many messages of a thread are running or waiting."""
+        with self._lock:
+            return len(self._queues.get(thread_id) or ()) + (thread_id in self._running)
+
+    def active_threads(self):
+        with self._lock:
+            return list(self._running)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            thread_ids = list(self._queues)
+            running = [request.future for request in self._running.values()]
+        for thread_id in thread_ids:
+            self.cancel(thread_id)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        elif wait:
+            wait_futures(running)
+
+    def _schedule(self, thread_id):
+        """Starts the next queued request of a thread. Must be called with the lock held."""
+        queue = self._queues.get(thread_id)
+        if not queue:
+            self._queues.pop(thread_id, None)
+            return
+        request = queue.popleft()
+        self._running[thread_id] = request
+        if self.use_async:
+            request._task = asyncio.run_coroutine_threadsafe(self._arun(request), async_runtime.get_loop())
+        else:
+            self._executor.submit(self._run, request)
+
+    def _run(self, request):
+        request.status = "running"
+        request.started_at = time.monotonic()
+        status, result = "done", None
+        try:
+            if request.on_event is not None:
+                request.on_event("start", request.user_input)
+            stream = (self._stream or jarvis.stream_agent_interaction)(request.user_input, request.thread_id)
+            try:
+                for event, payload in stream:
+                    if request.cancelled:
+                        status, result = "cancelled", "Cancelled."
+                        break
+                    if event == "final":
+                        result = payload
+                    if request.on_event is not None:
+                        request.on_event(event, payload)
+            finally:
+                stream.close()
+        except Exception as e:
+            status, result = "error", e
+            logger.exception("Request %s on thread %s failed: %s", request.id, request.thread_id, e)
+        finally:
+            self._complete(request, status, result)
+
+    async def _arun(self, request):
+        if self._slots is None:
+            # Created here, as it belongs to the loop; only this loop touches it
+            self._slots = asyncio.Semaphore(self.max_workers)
+        status, result = "done", None
+        try:
+            async with self._slots:
+                request.status = "running"
+                request.started_at = time.monotonic()
+                if request.on_event is not None:
+                    request.on_event("start", request.user_input)
+                stream = (self._astream or jarvis.astream_agent_interaction)(request.user_input, request.thread_id)
+                try:
+                    async for event, payload in stream:
+                        if request.cancelled:
+                            status, result = "cancelled", "Cancelled."
+                            break
+                        if event == "final":
+                            result = payload
+                        if request.on_event is not None:
+                            request.on_event(event, payload)
+                finally:
+                    await stream.aclose()
+        except asyncio.CancelledError:
+            status, result = "cancelled", "Cancelled."
+        except Exception as e:
+            status, result = "error", e
+            logger.exception("Request %s on thread %s failed: %s", request.id, request.thread_id, e)
+        finally:
+            self._complete(request, status, result)
+
+    def _complete(self, request, status, result):
+        with self._lock:
+            self._running.pop(request.thread_id, None)
+        # Resolved after the request stopped counting as running, so pending() is accurate in callbacks
+        self._finish(request, status, result)
+        with self._lock:
+            # submit() may have started the next request in the meantime
+            if request.thread_id not in self._running:
+                self._schedule(request.thread_id)
+
+    def _finish(self, request, status, result):
+        request.status = status
+        request.finished_at = time.monotonic()
+        with self._lock:
+            self.stats[{"done": "completed", "cancelled": "cancelled", "error": "failed"}[status]] += 1
+        if status == "error":
+            request.future.set_exception(result)
+        else:
+            request.future.set_result(result)
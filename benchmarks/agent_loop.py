@@ -0,0 +1,428 @@
+# benchmarks/agent_loop.py
+"""
+Measures the agent loop offline, with a scripted chat model and fake tool backends.
+
+No API keys, network or desktop are needed, so it runs on a headless CI machine. The model replays
+predetermined tool calls and token streams with a configurable latency; web search, screen capture,
+the vision model and pyautogui are replaced by local fakes that sleep for --tool-latency. Time a turn
+spends outside the model and the tools (graph steps, checkpointing, history management, tool
+dispatch, streaming, tracing) is the orchestration overhead.
+
+Reports:
+    turns        p50/p95 turn latency and orchestration overhead per turn and per graph step, per scenario
+    memory       checkpointer bytes and Python heap growth per conversation thread
+    concurrency  turns per second and peak thread count through AgentService with an increasing number
+                 of workers, running interactions on worker threads and as tasks on the event loop
+
+Usage:
+    python benchmarks/agent_loop.py [--turns 20] [--ttft 0.05] [--token-delay 0.002] [--tool-latency 0.02]
+                                    [--json results.json] [--baseline results.json --tolerance 0.25]
+
+With --baseline, the run fails (exit code 1) if the p50 overhead per step of any scenario grew by
+more than the tolerance compared to an earlier --json result.
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from typing import Any, List
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# Caches and spilled state go to a scratch directory, so runs neither reuse nor touch real data
+os.environ["JARVIS_CACHE_DIR"] = tempfile.mkdtemp(prefix="jarvis-bench-")
+# Placeholders: nothing is sent, but the tools check that keys are configured
+os.environ.setdefault("OPENAI_API_KEY", "sk-agent-loop-benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "tvly-agent-loop-benchmark")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Scenarios: the model responses of one turn, in order. {n} in a tool argument is replaced by a
+# counter, so searches and screen contents differ between turns and caches don't hide the work.
+SCENARIOS = {
+    "chat": [
+        {"text": "I am Jarvis, the AI assistant created by Rahees Ahmed. I can search the web, run commands, "
+                 "read your screen and click, type or press keys for you. What would you like to do?"},
+    ],
+    "search": [
+        {"tool_calls": [("search_on_web_tool", {"query": "latest artificial intelligence news {n}"})]},
+        {"text": "Here are the latest developments in artificial intelligence: several labs released new models "
+                 "this week, and regulators published draft guidance on model evaluations."},
+    ],
+    "screen": [
+        {"tool_calls": [("describe_screen_content", {"user_prompt": "Where is the Submit button? {n}"})]},
+        {"tool_calls": [("click_coordinates", {"x": 960, "y": 540})]},
+        {"tool_calls": [("describe_screen_content", {"user_prompt": "Did the form submit? {n}", "focus": "changes"})]},
+        {"text": "I clicked Submit and the form was sent successfully."},
+    ],
+    "parallel": [
+        {"tool_calls": [
+            ("search_web_multi", {"queries": ["python packaging {n}", "python packaging guide {n}", "pyproject.toml {n}"]}),
+            ("describe_screen_content", {"user_prompt": "What is open in the editor? {n}"}),
+            ("press_key", {"key": "enter"}),
+        ]},
+        {"text": "Your editor shows pyproject.toml, and the packaging guide recommends declaring the build backend there."},
+    ],
+}
+
+# Characters of tool-call arguments per streamed chunk (about one token)
+ARGS_CHUNK_CHARS = 4
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model replaying a scripted turn: its k-th response after the user's message is script[k].
+
+    The response is chosen from the conversation, not from a call counter, so one model can serve
+    many threads at once. Text is streamed word by word and tool-call arguments a few characters at
+    a time, after ttft seconds and with token_delay seconds between chunks.
+    """
+
+    script: List[Any]
+    ttft: float = 0.0
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _response(self, messages):
+        rounds = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                rounds += 1
+        step = self.script[min(rounds, len(self.script) - 1)]
+        tool_calls = [
+            {"name": name, "args": _fill(args), "id": f"call_{next(_call_ids)}"}
+            for name, args in step.get("tool_calls", [])
+        ]
+        usage = {"input_tokens": sum(len(str(m.content)) // 4 for m in messages), "output_tokens": len(step.get("text", "").split()) + 10 * len(tool_calls)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return step.get("text", ""), tool_calls, usage
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.ttft)
+        text, tool_calls, usage = self._response(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, tool_calls=tool_calls, usage_metadata=usage))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.ttft)
+        text, tool_calls, usage = self._response(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, tool_calls=tool_calls, usage_metadata=usage))])
+
+    def _chunks(self, text, tool_calls, usage):
+        chunks = [AIMessageChunk(content=word if i == 0 else " " + word) for i, word in enumerate(text.split(" ") if text else [])]
+        for index, tool_call in enumerate(tool_calls):
+            # Arguments arrive a few characters at a time, like a real model's
+            args = json.dumps(tool_call["args"])
+            for start in range(0, len(args), ARGS_CHUNK_CHARS):
+                first = start == 0
+                chunks.append(AIMessageChunk(content="", tool_call_chunks=[{
+                    "name": tool_call["name"] if first else None, "id": tool_call["id"] if first else None,
+                    "args": args[start:start + ARGS_CHUNK_CHARS], "index": index,
+                }]))
+        chunks.append(AIMessageChunk(content="", usage_metadata=usage))
+        return [ChatGenerationChunk(message=message) for message in chunks]
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, tool_calls, usage = self._response(messages)
+        time.sleep(self.ttft)
+        for i, chunk in enumerate(self._chunks(text, tool_calls, usage)):
+            if i:
+                time.sleep(self.token_delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, tool_calls, usage = self._response(messages)
+        await asyncio.sleep(self.ttft)
+        for i, chunk in enumerate(self._chunks(text, tool_calls, usage)):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+_call_ids = itertools.count(1)
+_fill_counter = itertools.count(1)
+
+def _fill(args):
+    n = next(_fill_counter)
+    def fill(value):
+        if isinstance(value, str):
+            return value.replace("{n}", str(n))
+        if isinstance(value, list):
+            return [fill(item) for item in value]
+        return value
+    return {key: fill(value) for key, value in args.items()}
+
+class MemorySink:
+    """Keeps trace records in memory, for computing the overhead of each turn."""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, records):
+        self.records.extend(records)
+
+def install_fakes(tool_latency):
+    """Replaces pyautogui, screen capture, the vision model and the search backends with local fakes."""
+    pyautogui = types.ModuleType("pyautogui")
+    pyautogui.KEYBOARD_KEYS = ["enter", "tab", "esc", "backspace", "space", "up", "down", "left", "right"]
+    pyautogui.FAILSAFE = False
+    pyautogui.size = lambda: (1920, 1080)
+    pyautogui.position = lambda: (0, 0)
+    pyautogui.click = pyautogui.write = pyautogui.press = pyautogui.hotkey = lambda *args, **kwargs: None
+    sys.modules["pyautogui"] = pyautogui
+
+    from PIL import Image, ImageDraw
+    from tools import screen_capture, screen_reader, screen_watcher, ui_automation, web_search
+    frames = itertools.count()
+
+    def capture_screen():
+        # A window that moves a little between captures, so frames differ like a real screen's
+        image = Image.new("RGB", (1920, 1080), (30, 30, 30))
+        offset = next(frames) % 200
+        ImageDraw.Draw(image).rectangle([400 + offset, 300, 1400 + offset, 800], fill=(230, 230, 230))
+        return image
+
+    screen_capture.capture_screen = capture_screen
+    # Background captures of the screen watcher would only add noise to the timings
+    screen_watcher.watcher.fps = 0
+    ui_automation.pyperclip = None
+
+    completion = types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(content="A form with a Submit button at (960, 540)."))],
+        usage=types.SimpleNamespace(prompt_tokens=300, completion_tokens=20),
+    )
+
+    def create(**kwargs):
+        time.sleep(tool_latency)
+        return completion
+
+    async def acreate(**kwargs):
+        await asyncio.sleep(tool_latency)
+        return completion
+
+    screen_reader.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    screen_reader._client_initialized = True
+    screen_reader.async_client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=acreate)))
+
+    def results(query):
+        return [
+            {"title": f"{query} - result {i}", "url": f"https://example.com/{abs(hash(query)) % 10000}/{i}",
+             "content": f"Result {i} for {query}: " + " ".join(f"word{i}{j}" for j in range(60)), "score": 1 - i / 10}
+            for i in range(5)
+        ]
+
+    def search(query):
+        time.sleep(tool_latency)
+        return results(query)
+
+    async def multi_search(query):
+        await asyncio.sleep(tool_latency)
+        return results(query)
+
+    web_search.set_search_backend(search)
+    web_search.set_multi_search_backend(multi_search)
+
+def _ms(value):
+    return None if value is None else round(value * 1000, 3)
+
+def turn_overheads(records):
+    """
+    Returns (overhead per turn, overhead per graph step) in seconds for the traced turns.
+
+    Overhead is the turn's wall time minus the time spent in model calls and running tools.
+    """
+    by_trace = {}
+    for record in records:
+        by_trace.setdefault(record["trace_id"], []).append(record)
+    per_turn, per_step = [], []
+    for trace in by_trace.values():
+        turn = next((record for record in trace if record["type"] == "turn"), None)
+        if turn is None:
+            continue
+        model_time = sum(record["duration"] for record in trace if record["type"] == "model")
+        tools_time = sum(record["duration"] for record in trace if record["type"] == "node" and record["name"] == "tools")
+        steps = sum(1 for record in trace if record["type"] == "node")
+        overhead = max(0.0, turn["duration"] - model_time - tools_time)
+        per_turn.append(overhead)
+        per_step.append(overhead / max(steps, 1))
+    return per_turn, per_step
+
+def bench_turns(jarvis, args, sink):
+    from checkpointer import BoundedMemorySaver
+    from tracing import percentile
+    results = {}
+    for name, script in SCENARIOS.items():
+        model = ScriptedChatModel(script=script, ttft=args.ttft, token_delay=args.token_delay)
+        graph, _, _ = jarvis.build_agent(model, summary_model=ScriptedChatModel(script=[{"text": "Summary."}]),
+                                         checkpointer=BoundedMemorySaver(max_threads=1000))
+        # One warm-up turn so imports and first-call setup aren't measured
+        jarvis.run_agent_interaction(f"{name} warm-up", f"{name}-warmup", graph)
+        sink.records.clear()
+        latencies = []
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            # A few threads that each grow over the run, as conversations do
+            jarvis.run_agent_interaction(f"{name} request {turn}", f"{name}-{turn % 4}", graph)
+            latencies.append(time.perf_counter() - start)
+        per_turn, per_step = turn_overheads(sink.records)
+        results[name] = {
+            "turns": args.turns,
+            "latency_p50_ms": _ms(percentile(latencies, 50)),
+            "latency_p95_ms": _ms(percentile(latencies, 95)),
+            "overhead_p50_ms": _ms(percentile(per_turn, 50)),
+            "overhead_p95_ms": _ms(percentile(per_turn, 95)),
+            "step_overhead_p50_ms": _ms(percentile(per_step, 50)),
+            "step_overhead_p95_ms": _ms(percentile(per_step, 95)),
+        }
+    return results
+
+def bench_memory(jarvis, args):
+    from checkpointer import BoundedMemorySaver
+    memory = BoundedMemorySaver(max_threads=args.threads + 1, max_bytes=1 << 40)
+    graph, _, _ = jarvis.build_agent(ScriptedChatModel(script=SCENARIOS["search"]), checkpointer=memory)
+    sinks, jarvis.trace_sinks = jarvis.trace_sinks, []
+    try:
+        jarvis.run_agent_interaction("warm-up", "memory-warmup", graph)
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for thread in range(args.threads):
+            for turn in range(args.turns_per_thread):
+                jarvis.run_agent_interaction(f"memory request {turn}", f"memory-{thread}", graph)
+        gc.collect()
+        heap_growth = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+    finally:
+        jarvis.trace_sinks = sinks
+    metrics = memory.metrics()
+    return {
+        "threads": args.threads,
+        "turns_per_thread": args.turns_per_thread,
+        "checkpoint_bytes_per_thread": round(metrics["resident_bytes"] / args.threads),
+        "heap_growth_bytes_per_thread": round(heap_growth / args.threads),
+    }
+
+def bench_concurrency(jarvis, args):
+    from agent_service import AgentService
+    from checkpointer import BoundedMemorySaver
+    model = ScriptedChatModel(script=SCENARIOS["parallel"], ttft=args.ttft, token_delay=args.token_delay)
+    graph, _, _ = jarvis.build_agent(model, checkpointer=BoundedMemorySaver(max_threads=1000))
+    jarvis.run_agent_interaction("warm-up", "concurrency-warmup", graph)
+    results = []
+    for mode in ("threads", "async"):
+        first = len(results)
+        for workers in args.workers:
+            service = AgentService(
+                max_workers=workers,
+                stream=lambda text, thread_id: jarvis.stream_agent_interaction(text, thread_id, graph),
+                use_async=mode == "async",
+                astream=lambda text, thread_id: jarvis.astream_agent_interaction(text, thread_id, graph),
+            )
+            start = time.perf_counter()
+            requests = [
+                service.submit(f"concurrency-{mode}-{workers}-{conversation}", f"request {turn}")
+                for turn in range(args.turns_per_thread)
+                for conversation in range(args.conversations)
+            ]
+            peak_threads = threading.active_count()
+            while not all(request.future.done() for request in requests):
+                time.sleep(0.01)
+                peak_threads = max(peak_threads, threading.active_count())
+            seconds = time.perf_counter() - start
+            service.shutdown()
+            results.append({"mode": mode, "workers": workers, "turns": len(requests), "seconds": round(seconds, 3),
+                            "turns_per_second": round(len(requests) / seconds, 2), "peak_threads": peak_threads})
+        for result in results[first:]:
+            result["speedup"] = round(result["turns_per_second"] / results[first]["turns_per_second"], 2)
+    return results
+
+def check_baseline(results, path, tolerance):
+    """Returns the scenarios whose p50 overhead per step regressed by more than tolerance."""
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, result in results["turns"].items():
+        before = baseline.get("turns", {}).get(name, {}).get("step_overhead_p50_ms")
+        after = result["step_overhead_p50_ms"]
+        # A small absolute allowance keeps timer noise on fast steps from failing the run
+        if before is not None and after is not None and after > before * (1 + tolerance) + 0.5:
+            regressions.append(f"{name}: {before:.3f} ms -> {after:.3f} ms per step")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20, help="Measured turns per scenario")
+    parser.add_argument("--ttft", type=float, default=0.05, help="Seconds before the model's first token")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="Seconds between streamed words")
+    parser.add_argument("--tool-latency", type=float, default=0.02, help="Seconds each fake backend call takes")
+    parser.add_argument("--threads", type=int, default=50, help="Conversation threads for the memory benchmark")
+    parser.add_argument("--turns-per-thread", type=int, default=3, help="Turns per thread in the memory and concurrency benchmarks")
+    parser.add_argument("--conversations", type=int, default=16, help="Concurrent conversations for the concurrency benchmark")
+    parser.add_argument("--workers", type=lambda value: [int(n) for n in value.split(",")], default=[1, 2, 4, 8],
+                        help="Comma-separated worker counts for the concurrency benchmark")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="Earlier --json results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative growth of overhead per step")
+    args = parser.parse_args()
+
+    install_fakes(args.tool_latency)
+    import jarvis
+    sink = MemorySink()
+    jarvis.trace_sinks = [sink]
+
+    results = {
+        "config": {key: getattr(args, key) for key in ("turns", "ttft", "token_delay", "tool_latency")},
+        "turns": bench_turns(jarvis, args, sink),
+        "memory": bench_memory(jarvis, args),
+        "concurrency": bench_concurrency(jarvis, args),
+    }
+
+    print(f"{'scenario':<10}{'latency p50':>13}{'p95':>10}{'overhead p50':>14}{'p95':>10}{'per step p50':>14}{'p95':>10}")
+    for name, result in results["turns"].items():
+        print(f"{name:<10}{result['latency_p50_ms']:>11.1f}ms{result['latency_p95_ms']:>8.1f}ms"
+              f"{result['overhead_p50_ms']:>12.2f}ms{result['overhead_p95_ms']:>8.2f}ms"
+              f"{result['step_overhead_p50_ms']:>12.2f}ms{result['step_overhead_p95_ms']:>8.2f}ms")
+
+    memory = results["memory"]
+    print(f"\nMemory after {memory['turns_per_thread']} turns on each of {memory['threads']} threads: "
+          f"{memory['checkpoint_bytes_per_thread'] / 1024:.1f} KiB of checkpoints and "
+          f"{memory['heap_growth_bytes_per_thread'] / 1024:.1f} KiB of heap per thread")
+
+    print(f"\n{'mode':<10}{'workers':>8}{'turns':>8}{'seconds':>10}{'turns/s':>10}{'speedup':>10}{'threads':>10}")
+    for result in results["concurrency"]:
+        print(f"{result['mode']:<10}{result['workers']:>8}{result['turns']:>8}{result['seconds']:>10.2f}"
+              f"{result['turns_per_second']:>10.1f}{result['speedup']:>9.2f}x{result['peak_threads']:>10}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        regressions = check_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print("\nOrchestration overhead regressed:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regression against {args.baseline}.")
+
+if __name__ == "__main__":
+    main()
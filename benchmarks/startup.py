@@ -0,0 +1,119 @@
+# benchmarks/startup.py
+"""
+Measures how long Jarvis takes to start.
+
+Each scenario runs in a fresh Python process so nothing is cached between runs, and is repeated
+--runs times; the median, minimum and maximum are reported. No requests are sent: a placeholder
+OPENAI_API_KEY is used if none is set, since building the agent only constructs the clients.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--importtime 15] [--skip-ui]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each script prints a JSON object of {metric name: seconds} as its last line
+SCENARIOS = {
+    "agent": """
+import json, time
+start = time.perf_counter()
+import jarvis
+imported = time.perf_counter() - start
+jarvis.get_graph()
+print(json.dumps({"import jarvis": imported, "import jarvis + build graph": time.perf_counter() - start}))
+""",
+    "ui": """
+import json, sys, time
+start = time.perf_counter()
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+import jarvis_ui
+window = jarvis_ui.JarvisWindow()
+window.show()
+app.processEvents()
+result = {"time to window": time.perf_counter() - start}
+
+def finish(*args):
+    result["time to agent ready"] = time.perf_counter() - start
+    app.quit()
+
+window.warmup.ready.connect(finish)
+window.warmup.failed.connect(finish)
+QTimer.singleShot(120000, app.quit)
+if window.warmup.isFinished():
+    finish()
+else:
+    app.exec_()
+print(json.dumps(result))
+""",
+}
+
+def _environment():
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-startup-benchmark")
+    env.setdefault("TAVILY_API_KEY", "tvly-startup-benchmark")
+    # Lets the UI scenario run without a display
+    if sys.platform.startswith("linux") and not env.get("DISPLAY"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+def run_scenario(script, env):
+    completed = subprocess.run([sys.executable, "-c", script], cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def import_profile(top, env):
+    """Returns the top modules by cumulative import time when importing jarvis, as (seconds, module) pairs."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import jarvis"], cwd=REPO_DIR, env=env,
+                               capture_output=True, text=True)
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Nesting is shown by two spaces per level; only jarvis itself and its direct imports are listed
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            modules.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per scenario")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="Also list the N slowest imports of jarvis")
+    parser.add_argument("--skip-ui", action="store_true", help="Skip the scenario that opens the PyQt5 window")
+    args = parser.parse_args()
+
+    env = _environment()
+    samples = {}
+    for name, script in SCENARIOS.items():
+        if name == "ui" and args.skip_ui:
+            continue
+        for _ in range(args.runs):
+            try:
+                result = run_scenario(script, env)
+            except Exception as e:
+                print(f"Scenario '{name}' failed: {e}")
+                break
+            for metric, seconds in result.items():
+                samples.setdefault(metric, []).append(seconds)
+
+    print(f"{'metric':<32}{'median':>10}{'min':>10}{'max':>10}")
+    for metric, values in samples.items():
+        print(f"{metric:<32}{statistics.median(values):>9.3f}s{min(values):>9.3f}s{max(values):>9.3f}s")
+
+    if args.importtime:
+        print(f"\nSlowest imports of jarvis (cumulative):")
+        for seconds, module in import_profile(args.importtime, env):
+            print(f"  {seconds:7.3f}s  {module}")
+
+if __name__ == "__main__":
+    main()
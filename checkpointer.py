@@ -0,0 +1,273 @@
+# checkpointer.py
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from langgraph.checkpoint.memory import MemorySaver
+
+def _blob_size(blob):
+    return len(blob[1])
+
+def _entry_size(entry):
+    checkpoint, metadata, _parent = entry
+    return len(checkpoint[1]) + len(metadata[1])
+
+def _writes_size(writes):
+    return sum(len(value[1]) for _task_id, _channel, value, _path in (writes or {}).values())
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer with bounded memory use.
+
+    Each thread keeps only its most recent checkpoints, and whole threads are evicted in
+    least-recently-used order once there are more than max_threads resident or they hold
+    more than max_bytes of serialized state. If spill_path is set, evicted threads are
+    written to a local SQLite file and reloaded transparently the next time they are used.
+    The spill file is bounded too: threads spilled more than spill_max_age seconds ago, and the
+    oldest ones beyond spill_max_threads, are deleted for good.
+
+    Args:
+        max_threads: Maximum number of conversation threads kept in memory.
+        max_checkpoints_per_thread: Number of most recent checkpoints kept per thread and namespace.
+        max_bytes: Byte budget for the serialized state of all resident threads.
+        spill_path: Optional path of a SQLite file that evicted threads are spilled to.
+            Without it, evicted threads are dropped.
+        spill_max_threads: Maximum number of threads kept in the spill file.
+        spill_max_age: Seconds a spilled thread is kept without being used.
+
+    Note: list() without a thread_id only covers resident threads.
+    """
+
+    def __init__(self, *, max_threads=64, max_checkpoints_per_thread=20, max_bytes=256 * 1024 * 1024, spill_path=None,
+                 spill_max_threads=1000, spill_max_age=30 * 24 * 3600, serde=None):
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        # The parent of the latest checkpoint is read back for pending sends
+        self.max_checkpoints_per_thread = max(2, max_checkpoints_per_thread)
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.spill_max_threads = spill_max_threads
+        self.spill_max_age = spill_max_age
+
+        self._lock = threading.RLock()
+        self._lru = OrderedDict() # thread_id -> None, least recently used first
+        self._thread_bytes = {}
+        self._blob_keys = {} # thread_id -> keys into self.blobs
+        self._write_keys = {} # thread_id -> keys into self.writes
+        self._versions = {} # (thread_id, checkpoint_ns, checkpoint_id) -> channel versions
+        self._spill_db = None
+        self._evictions = 0
+        self._reloads = 0
+        self._pruned_checkpoints = 0
+        self._expired_threads = 0
+
+    # --- Metrics ---
+
+    def metrics(self):
+        """Returns resident thread/byte counts and eviction statistics."""
+        with self._lock:
+            return {
+                "resident_threads": len(self._lru),
+                "resident_bytes": sum(self._thread_bytes.values()),
+                "spilled_threads": self._spilled_count(),
+                "evictions": self._evictions,
+                "reloads": self._reloads,
+                "pruned_checkpoints": self._pruned_checkpoints,
+                "expired_threads": self._expired_threads,
+            }
+
+    # --- Checkpointer API ---
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if not self._ensure_resident(thread_id):
+                return None
+            self._lru.move_to_end(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with self._lock:
+            if config:
+                thread_id = config["configurable"]["thread_id"]
+                if not self._ensure_resident(thread_id):
+                    return
+                self._lru.move_to_end(thread_id)
+            # Materialize under the lock so eviction can't change the dicts mid-iteration
+            items = [*super().list(config, filter=filter, before=before, limit=limit)]
+        yield from items
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            self._ensure_resident(thread_id)
+            self._lru[thread_id] = None
+            self._lru.move_to_end(thread_id)
+
+            blob_keys = [(thread_id, checkpoint_ns, k, v) for k, v in new_versions.items()]
+            replaced = sum(_blob_size(self.blobs[key]) for key in blob_keys if key in self.blobs)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+
+            added = sum(_blob_size(self.blobs[key]) for key in blob_keys)
+            added += _entry_size(self.storage[thread_id][checkpoint_ns][checkpoint["id"]])
+            self._blob_keys.setdefault(thread_id, set()).update(blob_keys)
+            self._versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+            self._add_bytes(thread_id, added - replaced)
+
+            self._prune(thread_id, checkpoint_ns)
+            self._enforce_limits(keep=thread_id)
+            return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+        with self._lock:
+            self._ensure_resident(thread_id)
+            before = _writes_size(self.writes.get(outer_key))
+            super().put_writes(config, writes, task_id, task_path)
+            self._write_keys.setdefault(thread_id, set()).add(outer_key)
+            self._add_bytes(thread_id, _writes_size(self.writes.get(outer_key)) - before)
+            self._enforce_limits(keep=thread_id)
+
+    def delete_thread(self, thread_id):
+        """Deletes all checkpoints and writes of a thread, in memory and in the spill file."""
+        with self._lock:
+            self._drop(thread_id)
+            db = self._spill()
+            if db is not None:
+                db.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+                db.commit()
+
+    async def adelete_thread(self, thread_id):
+        return self.delete_thread(thread_id)
+
+    # --- Bookkeeping ---
+
+    def _add_bytes(self, thread_id, delta):
+        self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + delta
+
+    def _prune(self, thread_id, checkpoint_ns):
+        """Drops all but the newest checkpoints of a thread namespace, plus blobs and writes only they used."""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        excess = len(checkpoints) - self.max_checkpoints_per_thread
+        if excess <= 0:
+            return
+
+        freed = 0
+        # Checkpoint IDs are time-ordered, so the smallest are the oldest
+        for checkpoint_id in sorted(checkpoints)[:excess]:
+            freed += _entry_size(checkpoints.pop(checkpoint_id))
+            self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            outer_key = (thread_id, checkpoint_ns, checkpoint_id)
+            freed += _writes_size(self.writes.pop(outer_key, None))
+            self._write_keys.get(thread_id, set()).discard(outer_key)
+
+        referenced = {
+            (thread_id, checkpoint_ns, channel, version)
+            for checkpoint_id in checkpoints
+            for channel, version in self._versions.get((thread_id, checkpoint_ns, checkpoint_id), {}).items()
+        }
+        blob_keys = self._blob_keys.get(thread_id, set())
+        for key in [key for key in blob_keys if key[1] == checkpoint_ns and key not in referenced]:
+            blob_keys.discard(key)
+            freed += _blob_size(self.blobs.pop(key))
+
+        self._pruned_checkpoints += excess
+        self._add_bytes(thread_id, -freed)
+
+    def _enforce_limits(self, keep):
+        while len(self._lru) > 1 and (
+            len(self._lru) > self.max_threads or sum(self._thread_bytes.values()) > self.max_bytes
+        ):
+            victim = next(iter(self._lru))
+            if victim == keep:
+                # The thread being written is never evicted; try the next least recently used one
+                if len(self._lru) == 1:
+                    break
+                self._lru.move_to_end(keep)
+                victim = next(iter(self._lru))
+            self._evict(victim)
+
+    def _drop(self, thread_id):
+        """Removes a thread from memory. Returns (its state, its size in bytes)."""
+        payload = {
+            "storage": dict(self.storage.pop(thread_id, {})),
+            "writes": {key: self.writes.pop(key) for key in self._write_keys.pop(thread_id, set()) if key in self.writes},
+            "blobs": {key: self.blobs.pop(key) for key in self._blob_keys.pop(thread_id, set()) if key in self.blobs},
+            "versions": {key: self._versions.pop(key) for key in [k for k in self._versions if k[0] == thread_id]},
+        }
+        self._lru.pop(thread_id, None)
+        return payload, self._thread_bytes.pop(thread_id, 0)
+
+    def _evict(self, thread_id):
+        """Removes a thread from memory, spilling it to disk first if a spill store is configured."""
+        payload, size = self._drop(thread_id)
+        self._evictions += 1
+
+        db = self._spill()
+        if db is not None:
+            db.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, data, size, evicted_at) VALUES (?, ?, ?, ?)",
+                (thread_id, pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), size, time.time()),
+            )
+            self._expire_spilled(db)
+            db.commit()
+
+    def _expire_spilled(self, db):
+        """Deletes spilled threads older than spill_max_age, and the oldest beyond spill_max_threads."""
+        expired = db.execute("DELETE FROM threads WHERE evicted_at < ?", (time.time() - self.spill_max_age,)).rowcount
+        expired += db.execute(
+            "DELETE FROM threads WHERE thread_id IN (SELECT thread_id FROM threads ORDER BY evicted_at DESC LIMIT -1 OFFSET ?)",
+            (self.spill_max_threads,),
+        ).rowcount
+        self._expired_threads += expired
+
+    def _ensure_resident(self, thread_id):
+        """Loads a spilled thread back into memory. Returns whether the thread has any state."""
+        if thread_id in self._lru:
+            return True
+        db = self._spill()
+        if db is None:
+            return False
+        row = db.execute("SELECT data, size FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        if row is None:
+            return False
+
+        payload = pickle.loads(row[0])
+        for checkpoint_ns, checkpoints in payload["storage"].items():
+            self.storage[thread_id][checkpoint_ns].update(checkpoints)
+        self.writes.update(payload["writes"])
+        self.blobs.update(payload["blobs"])
+        self._versions.update(payload["versions"])
+        self._write_keys[thread_id] = set(payload["writes"])
+        self._blob_keys[thread_id] = set(payload["blobs"])
+        self._thread_bytes[thread_id] = row[1]
+        self._lru[thread_id] = None
+        db.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+        db.commit()
+        self._reloads += 1
+
+        self._enforce_limits(keep=thread_id)
+        return True
+
+    def _spill(self):
+        if not self.spill_path:
+            return None
+        if self._spill_db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+            self._spill_db = sqlite3.connect(self.spill_path, check_same_thread=False)
+            self._spill_db.execute(
+                "CREATE TABLE IF NOT EXISTS threads (thread_id TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, evicted_at REAL NOT NULL)"
+            )
+            self._spill_db.execute("CREATE INDEX IF NOT EXISTS threads_evicted_at ON threads (evicted_at)")
+            # Threads left over from earlier runs expire too
+            self._expire_spilled(self._spill_db)
+            self._spill_db.commit()
+        return self._spill_db
+
+    def _spilled_count(self):
+        db = self._spill()
+        return db.execute("SELECT COUNT(*) FROM threads").fetchone()[0] if db is not None else 0
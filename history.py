@@ -0,0 +1,226 @@
+# history.py
+import json
+import logging
+import threading
+from collections import OrderedDict
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.constants import TAG_NOSTREAM
+
+logger = logging.getLogger(__name__)
+
+# Tokenizer used by gpt-4o. Loading its vocabulary is slow, so it happens on first use.
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+# Fixed per-message overhead of the chat format, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and Jarvis, an AI assistant with tools. "
+    "Update the existing summary with the new messages below. Keep facts, decisions, file paths, commands "
+    "and results that may matter later; drop pleasantries and raw tool output. Reply with the summary only."
+)
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def _content_text(content):
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+def _truncate_text(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[: max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+class HistoryManager:
+    """
+    Builds the message list sent to the model so the prompt stays within a token budget.
+
+    Used as the agent's prompt (see as_runnable), so it runs before every model call without changing
+    the checkpointed conversation. The system prompt and the most recent turns are sent unchanged
+    (apart from truncating large tool outputs of earlier turns); older turns are replaced by a
+    rolling summary that is extended incrementally as more turns fall out of the window.
+
+    Token counts and truncated copies are cached per message ID, so each call only tokenizes
+    messages it has not seen before.
+
+    Args:
+        system_prompt: The system prompt placed at the start of every request.
+        summary_model: Chat model used to summarize old turns. Without it, old turns are dropped.
+        max_tokens: Token budget for the history (excluding the system prompt and summary).
+        min_recent_turns: Number of latest turns always kept, even if they exceed the budget.
+        max_tool_tokens: Tool outputs of earlier turns longer than this are truncated.
+        max_threads: Number of conversation threads whose summaries are cached.
+    """
+
+    def __init__(self, system_prompt, *, summary_model=None, max_tokens=12000, min_recent_turns=1, max_tool_tokens=800, max_threads=256):
+        self.system_message = SystemMessage(content=system_prompt)
+        self.summary_model = summary_model
+        self.max_tokens = max_tokens
+        # Once over budget, trim down to this so the summary isn't recomputed on every turn
+        self.low_watermark = int(max_tokens * 0.6)
+        self.min_recent_turns = max(1, min_recent_turns)
+        self.max_tool_tokens = max_tool_tokens
+        self.max_threads = max_threads
+
+        self._lock = threading.Lock()
+        self._token_counts = OrderedDict() # message ID -> token count
+        self._truncated = OrderedDict() # message ID -> truncated ToolMessage
+        self._summaries = OrderedDict() # thread key -> (number of messages covered, summary text)
+
+    def as_runnable(self):
+        """
+        Returns the manager as a prompt runnable for create_react_agent. On the async path it awaits
+        the summary model instead of blocking the event loop (and every other session on it).
+        """
+        return RunnableLambda(self.__call__, afunc=self.acall, name="Prompt")
+
+    def __call__(self, state, config):
+        messages, thread_key, covered, cut, latest_turn, summary = self._plan(state, config)
+        if cut > covered:
+            summary = self._store_summary(thread_key, cut, self._summarize(summary, messages[covered:cut]))
+        return self._prompt(messages, cut, latest_turn, summary)
+
+    async def acall(self, state, config):
+        """Async version of __call__."""
+        messages, thread_key, covered, cut, latest_turn, summary = self._plan(state, config)
+        if cut > covered:
+            summary = self._store_summary(thread_key, cut, await self._asummarize(summary, messages[covered:cut]))
+        return self._prompt(messages, cut, latest_turn, summary)
+
+    def _plan(self, state, config):
+        """Decides which messages are summarized: returns (messages, thread key, messages already summarized, cut, latest turn, summary)."""
+        messages = state["messages"] if isinstance(state, dict) else state.messages
+        thread_key = (config or {}).get("configurable", {}).get("thread_id") or (messages[0].id if messages else None)
+
+        covered, summary = self._summaries.get(thread_key, (0, None))
+
+        # Turns start at each user message; a cut never separates tool calls from their results
+        turn_starts = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage) and i >= covered] or [covered]
+        latest_turn = turn_starts[-1]
+        counts = {i: self._count(messages[i], truncate=i < latest_turn) for i in range(covered, len(messages))}
+
+        cut = covered
+        if sum(counts.values()) > self.max_tokens:
+            # Keep the newest turns that fit under the low watermark, but always min_recent_turns of them
+            kept_tokens = 0
+            end = len(messages)
+            for n, start in enumerate(reversed(turn_starts)):
+                turn_tokens = sum(counts[i] for i in range(start, end))
+                if n >= self.min_recent_turns and kept_tokens + turn_tokens > self.low_watermark:
+                    cut = end
+                    break
+                kept_tokens += turn_tokens
+                end = start
+        return messages, thread_key, covered, cut, latest_turn, summary
+
+    def _store_summary(self, thread_key, cut, summary):
+        with self._lock:
+            self._summaries[thread_key] = (cut, summary)
+            self._summaries.move_to_end(thread_key)
+            while len(self._summaries) > self.max_threads:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def _prompt(self, messages, cut, latest_turn, summary):
+        prompt = [self.system_message]
+        if summary:
+            prompt.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        prompt.extend(self._truncated_copy(message) if i < latest_turn else message for i, message in enumerate(messages) if i >= cut)
+        return prompt
+
+    def _count(self, message, truncate):
+        if truncate and isinstance(message, ToolMessage):
+            message = self._truncated_copy(message)
+        if message.id is None:
+            return self._count_uncached(message)
+        key = (message.id, truncate and isinstance(message, ToolMessage))
+        with self._lock:
+            if key in self._token_counts:
+                return self._token_counts[key]
+        tokens = self._count_uncached(message)
+        with self._lock:
+            self._token_counts[key] = tokens
+            # Bounded by roughly the size of the live conversations
+            while len(self._token_counts) > self.max_threads * 200:
+                self._token_counts.popitem(last=False)
+        return tokens
+
+    def _count_uncached(self, message):
+        tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(_content_text(message.content))
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            tokens += count_tokens(tool_call["name"]) + count_tokens(json.dumps(tool_call["args"]))
+        return tokens
+
+    def _truncated_copy(self, message):
+        """Returns the message with its tool output cut to max_tool_tokens, leaving other messages untouched."""
+        if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+            return message
+        with self._lock:
+            if message.id is not None and message.id in self._truncated:
+                return self._truncated[message.id]
+        truncated = message
+        text = message.content
+        if count_tokens(text) > self.max_tool_tokens:
+            truncated = message.model_copy(update={
+                "content": _truncate_text(text, self.max_tool_tokens) + f"\n[... output truncated to {self.max_tool_tokens} tokens ...]"
+            })
+        if message.id is not None:
+            with self._lock:
+                self._truncated[message.id] = truncated
+                while len(self._truncated) > self.max_threads * 50:
+                    self._truncated.popitem(last=False)
+        return truncated
+
+    def _summarize(self, summary, messages):
+        if self.summary_model is None:
+            return None
+        try:
+            # Tagged so the summary tokens are not streamed to the user as part of the answer
+            response = self.summary_model.invoke(self._summary_request(summary, messages), config={"tags": [TAG_NOSTREAM]})
+            return _content_text(response.content)
+        except Exception as e:
+            logger.warning("Error summarizing conversation history: %s", e)
+            return summary
+
+    async def _asummarize(self, summary, messages):
+        if self.summary_model is None:
+            return None
+        try:
+            response = await self.summary_model.ainvoke(self._summary_request(summary, messages), config={"tags": [TAG_NOSTREAM]})
+            return _content_text(response.content)
+        except Exception as e:
+            logger.warning("Error summarizing conversation history: %s", e)
+            return summary
+
+    def _summary_request(self, summary, messages):
+        transcript = "\n".join(
+            f"{type(message).__name__}: {_content_text(self._truncated_copy(message).content)}"
+            + "".join(f" [tool call: {tool_call['name']}({json.dumps(tool_call['args'])})]" for tool_call in getattr(message, "tool_calls", None) or [])
+            for message in messages
+        )
+        return [
+            SystemMessage(content=SUMMARY_INSTRUCTIONS),
+            HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"),
+        ]
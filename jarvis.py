@@ -1,25 +1,34 @@
+import asyncio
 import getpass
+import logging
 import os
-from langgraph.prebuilt import create_react_agent
+import threading
 from dotenv import load_dotenv
 from typing import Literal
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage, ToolMessage, AIMessage
-from tools.web_search import search_on_web_tool
-from tools.open_terminal import run_windows_command
-from tools.ui_automation import click_coordinates, press_key
-from tools.screen_reader import describe_screen_content
+from langchain_core.messages import HumanMessage, ToolMessage, AIMessage, AIMessageChunk
+from checkpointer import BoundedMemorySaver
+from tool_registry import registry
+from tracing import TurnTracer, sinks_from_env
 # Load the environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-# Initialize the model
-model = ChatOpenAI(model="gpt-4o", temperature=0)
+# Local directory for caches and spilled conversation state
+CACHE_DIR = os.getenv("JARVIS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jarvis_cache"))
 
 # Initialize the memory
-memory = MemorySaver()
+# Idle conversation threads are evicted (least recently used first) and spilled to disk
+memory = BoundedMemorySaver(
+    max_threads=32,
+    max_checkpoints_per_thread=20,
+    max_bytes=128 * 1024 * 1024,
+    spill_path=os.path.join(CACHE_DIR, "checkpoints.sqlite"),
+)
+
+# Where per-turn traces of model calls, tool calls and graph steps go (see tracing.py)
+trace_sinks = sinks_from_env(os.path.join(CACHE_DIR, "traces.jsonl"))
 
 # For this tutorial we will use custom tool that returns pre-defined values for weather in two cities (NYC & SF)
 
@@ -37,118 +46,406 @@ def get_weather(city: Literal["nyc", "sf"]):
 # We can add our system prompt here
 prompt = "You are Jarvis, the AI assistant created by Rahees Ahmed. You are a helpful assistant that can answer questions and help with tasks."
 
-# Define the graph
-tools = [get_weather, search_on_web_tool, run_windows_command, click_coordinates, describe_screen_content, press_key, describe_screen_content]
+# The model, tools and graph are built on first use (see get_graph), so importing this module is fast
+model = None
+tools = None
+tool_node = None
+history = None
+# Answers repeated questions without calling the model; opt-in with JARVIS_RESPONSE_CACHE=1
+response_cache = None
+EMBEDDING_MODEL = "text-embedding-3-small"
+_graph = None
+_graph_lock = threading.Lock()
+
+def build_agent(chat_model, summary_model=None, checkpointer=None):
+    """
+    Builds the agent graph around a chat model, with Jarvis's tools, prompt and history management.
+
+    get_graph() calls this with the OpenAI models; benchmarks pass a scripted model instead.
 
-graph = create_react_agent(model, tools=tools, checkpointer=memory, prompt=prompt)
+    Args:
+        chat_model: The chat model answering the user and calling tools.
+        summary_model: Model summarizing old turns once the prompt exceeds its token budget.
+        checkpointer: Where conversation state is saved. Defaults to the module's memory.
 
-def run_agent_interaction(user_input: str, thread_id: str, graph):
+    Returns:
+        (graph, tool node, history manager)
     """
-    Runs a single interaction with the LangGraph agent.
+    from langgraph.prebuilt import create_react_agent
+    from tool_executor import ParallelToolNode, read_only
+    from history import HistoryManager
+
+    # Runs every tool call of a turn concurrently; slow tools get their own timeouts. Read-only
+    # tools may start while the model is still streaming its message (JARVIS_TOOL_PREFETCH=0 to disable)
+    node = ParallelToolNode(
+        [read_only(get_weather)] + registry.tools(),
+        max_workers=8,
+        default_timeout=60,
+        timeouts={"run_windows_command": 70, "describe_screen_content": 90},
+        # Results longer than these token budgets are cut in the middle (see tools/tool_results.py)
+        default_token_budget=2000,
+        token_budgets={"run_windows_command": 3000, "read_command_output": 8000, "read_url": 3000,
+                       "search_web_multi": 4000, "describe_screen_content": 1500},
+        prefetch=os.getenv("JARVIS_TOOL_PREFETCH", "1") != "0",
+    )
+
+    # Keeps the prompt sent to the model within a token budget as the conversation grows
+    manager = HistoryManager(
+        prompt,
+        summary_model=summary_model,
+        max_tokens=12000,
+        max_tool_tokens=800,
+    )
+
+    graph = create_react_agent(chat_model, tools=node, checkpointer=checkpointer if checkpointer is not None else memory, prompt=manager.as_runnable())
+    return graph, node, manager
+
+def get_graph():
+    """Builds the agent graph on the first call and returns it. Safe to call from several threads."""
+    global model, tools, tool_node, history, response_cache, _graph
+    with _graph_lock:
+        if _graph is not None:
+            return _graph
+
+        from langchain_openai import ChatOpenAI
+
+        # Initialize the model; stream_usage reports token counts for streamed responses too
+        model = ChatOpenAI(model="gpt-4o", temperature=0, stream_usage=True)
+
+        graph, tool_node, history = build_agent(model, summary_model=ChatOpenAI(model="gpt-4o-mini", temperature=0, stream_usage=True))
+        tools = list(tool_node.tools_by_name.values())
+
+        if os.getenv("JARVIS_RESPONSE_CACHE") == "1":
+            from langchain_openai import OpenAIEmbeddings
+            from response_cache import SemanticResponseCache
+            response_cache = SemanticResponseCache(
+                OpenAIEmbeddings(model=EMBEDDING_MODEL).embed_documents,
+                path=os.path.join(CACHE_DIR, "responses.sqlite"),
+                threshold=float(os.getenv("JARVIS_RESPONSE_CACHE_THRESHOLD", "0.92")),
+                ttl=int(os.getenv("JARVIS_RESPONSE_CACHE_TTL", str(24 * 3600))),
+            )
+
+        _graph = graph
+        return _graph
+
+def __getattr__(name):
+    # Keeps `from jarvis import graph` working; building the graph is deferred until then
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _message_text(content):
+    """Returns the plain text of a message's content, which may be a string or a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict) and block.get("type") == "text")
+
+def _lookup_cached_response(graph, config, user_input):
+    """
+    Looks the user's message up in the response cache.
+
+    The answer may depend on the conversation so far, so the previous reply is part of the context
+    fingerprint along with the prompt, model and tools: a cached answer is only reused in the same
+    context, e.g. as the first message of a conversation.
+
+    Returns:
+        (cached answer or None, key to pass to _store_cached_response)
+    """
+    from response_cache import context_fingerprint
+    previous_reply = ""
+    for message in reversed(graph.get_state(config).values.get("messages", [])):
+        if isinstance(message, AIMessage) and not message.tool_calls:
+            previous_reply = _message_text(message.content)
+            break
+    fingerprint = context_fingerprint(prompt, getattr(model, "model_name", type(model).__name__), sorted(t.name for t in tools), EMBEDDING_MODEL, previous_reply)
+    try:
+        answer, embedding = response_cache.lookup(user_input, fingerprint)
+    except Exception as e:
+        logger.warning("Response cache lookup failed: %s", e)
+        return None, None
+    return answer, (fingerprint, embedding)
+
+def _start_turn(graph, thread_id):
+    """
+    Sets up the run config of one turn: tracing and, if enabled, early starts of read-only tool calls.
+
+    Returns:
+        (config, tracer, prefetcher or None)
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+
+    # Records model, tool and node timings and token counts of this turn
+    tracer = TurnTracer(thread_id, trace_sinks)
+    callbacks = [tracer] if trace_sinks else []
+
+    # A cancellation from a previous run must not affect this one
+    if tool_node is not None:
+        tool_node.reset_cancel(thread_id)
+
+    # Starts read-only tool calls as soon as their arguments have streamed in
+    prefetcher = None
+    node = _tool_node_of(graph)
+    if node is not None and node.prefetch_enabled:
+        from tool_executor import ToolCallPrefetcher
+        prefetcher = ToolCallPrefetcher(node, {"configurable": {"thread_id": thread_id}, "callbacks": list(callbacks)})
+        callbacks.append(prefetcher)
+    if callbacks:
+        config["callbacks"] = callbacks
+    return config, tracer, prefetcher
+
+def _stream_events(mode, chunk, turn):
+    """
+    Converts one item of the graph's stream to the events of stream_agent_interaction.
+
+    turn is a dict collecting the names of the tools called ("tools_used") and the final answer ("final").
+    """
+    events = []
+    if mode == "messages":
+        message, metadata = chunk
+        # Only forward tokens generated by the model node, not messages emitted by tools
+        if metadata.get("langgraph_node") == "agent" and isinstance(message, AIMessageChunk):
+            text = _message_text(message.content)
+            if text:
+                events.append(("token", text))
+    elif mode == "custom":
+        events.append(("tool_progress", chunk))
+    else:
+        for update in chunk.values():
+            if not isinstance(update, dict):
+                continue
+            for message in update.get("messages", []):
+                if isinstance(message, AIMessage):
+                    if message.tool_calls:
+                        for tool_call in message.tool_calls:
+                            turn["tools_used"].append(tool_call["name"])
+                            events.append(("tool_call", tool_call))
+                    else:
+                        turn["final"] = _message_text(message.content)
+                elif isinstance(message, ToolMessage):
+                    events.append(("tool_result", message))
+    return events
+
+def _store_cached_response(user_input, cache_key, turn):
+    fingerprint, embedding = cache_key
+    try:
+        # Turns that ran side-effecting or screen-dependent tools are not stored
+        response_cache.store(user_input, fingerprint, turn["final"], turn["tools_used"], embedding=embedding)
+    except Exception as e:
+        logger.warning("Response cache store failed: %s", e)
+
+def _answer_from_cache(graph, config, user_input, tracer):
+    """
+    Looks the message up in the response cache and, on a hit, records the exchange in the conversation.
+
+    Returns:
+        (cached answer or None, key for _store_cached_response or None)
+    """
+    with tracer.step("response_cache_lookup"):
+        cached_answer, cache_key = _lookup_cached_response(graph, config, user_input)
+    if cached_answer is not None:
+        # Record the exchange so the conversation continues as if the model had answered
+        with tracer.step("update_state"):
+            graph.update_state(config, {"messages": [HumanMessage(content=user_input), AIMessage(content=cached_answer)]}, as_node="agent")
+    return cached_answer, cache_key
+
+STREAM_MODES = ["messages", "updates", "custom"]
+
+def stream_agent_interaction(user_input: str, thread_id: str, graph=None):
+    """
+    Streams a single interaction with the LangGraph agent as it is generated.
+
+    Uses LangGraph's "messages" stream mode for token deltas from the model, the
+    "updates" stream mode for completed tool calls and tool results, and the "custom"
+    stream mode for progress reported by running tools.
 
     Args:
         user_input: The input message from the user.
         thread_id: The conversation thread ID.
-        graph: The compiled LangGraph agent.
-        tools: The list of tools available to the agent.
+        graph: The compiled LangGraph agent. Defaults to the one built by get_graph().
 
-    Returns:
-        The final response content from the agent as a string, or an error message.
+    Yields:
+        (event, payload) tuples, where event is one of:
+            "token": payload is a text delta (str) from the model.
+            "tool_call": payload is a tool call dict (name, args, id) requested by the model.
+            "tool_progress": payload is a progress dict written by a running tool (includes "tool").
+            "tool_result": payload is the ToolMessage returned by the tool.
+            "final": payload is the final response content (str). Always the last event.
     """
-    config = {"configurable": {"thread_id": thread_id}}
+    if graph is None:
+        graph = get_graph()
+    config, tracer, prefetcher = _start_turn(graph, thread_id)
     inputs = {"messages": [HumanMessage(content=user_input)]}
+    turn = {"tools_used": [], "final": None}
+    status = "interrupted"
+
+    try:
+        cache_key = None
+        if response_cache is not None and graph is _graph:
+            cached_answer, cache_key = _answer_from_cache(graph, config, user_input, tracer)
+            if cached_answer is not None:
+                status = "cached"
+                yield "token", cached_answer
+                yield "final", cached_answer
+                return
+
+        stream = graph.stream(inputs, config=config, stream_mode=STREAM_MODES)
+        completed = False
+        try:
+            for mode, chunk in stream:
+                yield from _stream_events(mode, chunk, turn)
+            completed = True
+        finally:
+            stream.close()
+            if not completed:
+                # The run was abandoned (cancelled or failed) part way through
+                with tracer.step("close_dangling_tool_calls"):
+                    _close_dangling_tool_calls(graph, config)
+
+        if cache_key is not None and turn["final"]:
+            with tracer.step("response_cache_store"):
+                _store_cached_response(user_input, cache_key, turn)
+
+        status = "done"
+        yield "final", turn["final"] or "Agent did not produce a final AI response."
+    finally:
+        if prefetcher is not None:
+            prefetcher.finish()
+        tracer.finish(status)
+
+async def astream_agent_interaction(user_input: str, thread_id: str, graph=None):
+    """
+    Async version of stream_agent_interaction, built on graph.astream. Yields the same events.
+
+    Model calls and async tools (web search, page reading, screen description, terminal commands)
+    are awaited on the running event loop, so many conversations can run at once without a thread
+    each. Synchronous tools still run on worker threads. Blocking bookkeeping outside the graph
+    (building the agent, the response cache) runs in a thread as well.
+    """
+    if graph is None:
+        graph = _graph if _graph is not None else await asyncio.to_thread(get_graph)
+    config, tracer, prefetcher = _start_turn(graph, thread_id)
+    inputs = {"messages": [HumanMessage(content=user_input)]}
+    turn = {"tools_used": [], "final": None}
+    status = "interrupted"
+
+    try:
+        cache_key = None
+        if response_cache is not None and graph is _graph:
+            cached_answer, cache_key = await asyncio.to_thread(_answer_from_cache, graph, config, user_input, tracer)
+            if cached_answer is not None:
+                status = "cached"
+                yield "token", cached_answer
+                yield "final", cached_answer
+                return
+
+        stream = graph.astream(inputs, config=config, stream_mode=STREAM_MODES)
+        completed = False
+        try:
+            async for mode, chunk in stream:
+                for event in _stream_events(mode, chunk, turn):
+                    yield event
+            completed = True
+        finally:
+            await stream.aclose()
+            if not completed:
+                with tracer.step("close_dangling_tool_calls"):
+                    await asyncio.to_thread(_close_dangling_tool_calls, graph, config)
+
+        if cache_key is not None and turn["final"]:
+            with tracer.step("response_cache_store"):
+                await asyncio.to_thread(_store_cached_response, user_input, cache_key, turn)
 
-    print(f"--- Running agent for input: '{user_input}' (Thread: {thread_id}) ---")
+        status = "done"
+        yield "final", turn["final"] or "Agent did not produce a final AI response."
+    finally:
+        if prefetcher is not None:
+            prefetcher.finish()
+        tracer.finish(status)
 
-    # Stream until the interrupt
-    stream_output = []
-    print("Streaming initial agent response...")
-    for chunk in graph.stream(inputs, config=config, stream_mode="values"):
-         stream_output.append(chunk)
-         # Optional: print intermediate steps here if desired
-         message = chunk["messages"][-1]
-         if not isinstance(message, tuple):
-             print("Intermediate step:", type(message).__name__)
-             # message.pretty_print() # Uncomment for full message details
+def _tool_node_of(graph):
+    """Returns the ParallelToolNode of an agent graph, or None if it has none."""
+    node = getattr(getattr(graph, "nodes", {}).get("tools"), "bound", None)
+    return node if hasattr(node, "prefetch") else None
 
+def _close_dangling_tool_calls(graph, config):
+    """
+    Commits the results of tool calls left open by an interrupted run.
+
+    The model API rejects a conversation in which a tool call is not followed by its result, so
+    without this the thread could not be continued after a run was stopped during a tool call.
+    Results the tools already returned may only exist as pending writes of the interrupted step,
+    which a new run discards, so they are written again (messages are merged by ID) together with
+    a cancellation result for every call that has none.
+    """
+    try:
+        messages = graph.get_state(config).values.get("messages", [])
+        position = len(messages)
+        while position > 0 and isinstance(messages[position - 1], ToolMessage):
+            position -= 1
+        if position == 0 or not isinstance(messages[position - 1], AIMessage) or not messages[position - 1].tool_calls:
+            return
+        results = messages[position:]
+        answered = {result.tool_call_id for result in results}
+        results += [
+            ToolMessage(content="Error: Cancelled before the tool finished.", tool_call_id=tool_call["id"], name=tool_call["name"])
+            for tool_call in messages[position - 1].tool_calls
+            if tool_call["id"] not in answered
+        ]
+        graph.update_state(config, {"messages": results}, as_node="tools")
+    except Exception as e:
+        logger.error("Error closing interrupted tool calls for thread %s: %s", config["configurable"]["thread_id"], e)
 
-    # Get state after the initial run/interrupt
-    state = graph.get_state(config)
-    print("State after initial stream:", state.next)
+def cancel_agent_interaction(thread_id: str):
+    """Cancels the tool calls currently running for a conversation thread."""
+    if tool_node is not None:
+        tool_node.cancel(thread_id)
+
+def _log_event(event, payload):
+    if event == "tool_call":
+        logger.info("Executing tool: %s (ID: %s)", payload["name"], payload["id"])
+        logger.debug("Tool args: %s", payload["args"])
+    elif event == "tool_result":
+        logger.debug("Tool result: %s", payload.content)
+
+def run_agent_interaction(user_input: str, thread_id: str, graph=None):
+    """
+    Runs a single interaction with the LangGraph agent.
+
+    Tool calls requested by the model are executed inside the graph by the tool node,
+    so the whole turn completes in a single streamed run.
+
+    Args:
+        user_input: The input message from the user.
+        thread_id: The conversation thread ID.
+        graph: The compiled LangGraph agent. Defaults to the one built by get_graph().
+
+    Returns:
+        The final response content from the agent as a string, or an error message.
+    """
+    logger.info("Running agent on thread %s", thread_id)
+    logger.debug("Input: %r", user_input)
 
-    last_message = state.values["messages"][-1]
     final_response_content = None
+    for event, payload in stream_agent_interaction(user_input, thread_id, graph):
+        _log_event(event, payload)
+        if event == "final":
+            final_response_content = payload
 
-    # Check for tool calls
-    if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-        print("Tool call detected.")
-        # For simplicity, handling only the first tool call if multiple exist
-        tool_call = last_message.tool_calls[0]
-        tool_name = tool_call["name"]
-        tool_args = tool_call["args"]
-        tool_id = tool_call["id"]
-
-        print(f"Executing tool: {tool_name} with args: {tool_args} (ID: {tool_id})")
-
-        tool_to_use = next((t for t in tools if t.name == tool_name), None)
-        if tool_to_use:
-            try:
-                # Execute the tool
-                result = tool_to_use.invoke(tool_args)
-                print(f"Tool result: {result}")
-                tool_message = ToolMessage(content=str(result), tool_call_id=tool_id)
-            except Exception as e:
-                print(f"Error executing tool {tool_name}: {e}")
-                # Send error message back to the graph
-                tool_message = ToolMessage(content=f"Error executing tool {tool_name}: {e}", tool_call_id=tool_id)
-
-            # Update state with tool response/error
-            graph.update_state(config, {"messages": [tool_message]})
-
-            # Invoke the graph with None input to continue from the updated state
-            print("\nInvoking graph to continue execution after tool call...")
-            final_state = graph.invoke(None, config=config)
-
-            # Extract the final AI message from the final state
-            final_ai_message = final_state["messages"][-1]
-            if isinstance(final_ai_message, AIMessage):
-                 print("Final Agent Response:")
-                 final_ai_message.pretty_print()
-                 final_response_content = final_ai_message.content
-            else:
-                 print("Final state did not end with an AIMessage:", final_state)
-                 final_response_content = "Agent did not produce a final AI response after tool call."
-
-        else:
-            print(f"Tool {tool_name} not found in the provided tool list.")
-            final_response_content = f"Error: Tool {tool_name} not found."
-            # It might be appropriate to update state with an error message here too
-            # graph.update_state(config, {"messages": [ToolMessage(content=f"Tool {tool_name} not found.", tool_call_id=tool_id)]})
-            # final_state = graph.invoke(None, config=config) # Or just return the error
+    logger.debug("Agent interaction finished. Response: %r", final_response_content)
+    return final_response_content
 
-    else:
-        # No tool call, the answer should be in the last message of the current state or stream
-        print("No tool call detected.")
-        if isinstance(last_message, AIMessage):
-            print("Final Agent Response:")
-            last_message.pretty_print()
-            final_response_content = last_message.content
-        elif stream_output:
-             # Check the very last message from the initial stream output
-             final_message_in_stream = stream_output[-1]["messages"][-1]
-             if isinstance(final_message_in_stream, AIMessage):
-                 print("Final Agent Response (from stream end):")
-                 final_message_in_stream.pretty_print()
-                 final_response_content = final_message_in_stream.content
-             else:
-                print(f"No tool call and last message in state/stream ({type(final_message_in_stream).__name__}) is not AIMessage.")
-                final_response_content = "Agent did not produce a final AI response."
-        else:
-             print("No tool call, no stream output, and last message in state is not AIMessage.")
-             final_response_content = "Agent did not produce a final AI response."
-
-
-    print(f"--- Agent interaction finished. Response: '{final_response_content}' ---")
+async def arun_agent_interaction(user_input: str, thread_id: str, graph=None):
+    """Async version of run_agent_interaction, built on astream_agent_interaction."""
+    logger.info("Running agent on thread %s", thread_id)
+    logger.debug("Input: %r", user_input)
+
+    final_response_content = None
+    async for event, payload in astream_agent_interaction(user_input, thread_id, graph):
+        _log_event(event, payload)
+        if event == "final":
+            final_response_content = payload
+
+    logger.debug("Agent interaction finished. Response: %r", final_response_content)
     return final_response_content
 
 # # Main execution block
@@ -1,16 +1,27 @@
 import sys
 import os
+import logging
 import subprocess
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                            QHBoxLayout, QPushButton, QTextEdit, QLineEdit,
                            QLabel, QDialog, QMessageBox, QFrame,
                            QGraphicsDropShadowEffect, QProgressBar)
-from PyQt5.QtCore import Qt, QSize, QTimer, QPropertyAnimation, QEasingCurve, pyqtSignal, QThread, QPoint
+from PyQt5.QtCore import Qt, QSize, QTimer, QPropertyAnimation, QEasingCurve, pyqtSignal, QThread, QPoint, QObject
 from PyQt5.QtGui import QColor, QIcon, QPixmap, QFont, QPalette, QLinearGradient, QGradient, QPainter, QBrush, QTextCursor, QFontDatabase
-import qdarkstyle
 import uuid # For generating unique thread IDs
-from jarvis import graph,run_agent_interaction
-from tools.web_search import search_on_web_tool
+from agent_service import AgentService
+from tool_registry import registry
+from tools.lazy_import import lazy_import
+from transcript_view import TranscriptView, history_entries
+
+logger = logging.getLogger(__name__)
+
+# Imported by the background threads that use it, so the window shows before LangChain is loaded
+jarvis = lazy_import("jarvis")
+
+# Runs agent requests; different conversations run concurrently, one conversation's messages in order.
+# Requests run as tasks on the shared asyncio loop rather than a thread each (JARVIS_ASYNC_AGENT=0 for threads)
+service = AgentService(max_workers=4, use_async=os.getenv("JARVIS_ASYNC_AGENT", "1") != "0")
 
 # --- Futuristic Styling ---
 # Attempt to load a modern font
@@ -41,7 +52,7 @@ QWidget {{
     font-size: 10pt;
 }}
 
-QTextEdit {{
+QTextEdit, QListView {{
     background-color: {COLOR_BACKGROUND_LIGHTER};
     border: 1px solid {COLOR_BORDER};
     border-radius: 8px;
@@ -137,35 +148,51 @@ QLabel#titleLabel {{ /* Style for a potential title */
 """
 # --- End Styling ---
 
-# Worker thread for running the agent interaction
-class AgentWorker(QThread):
+# Relays events of agent requests, which run on the service's event loop (or worker threads), to the UI thread
+class AgentEvents(QObject):
+    requestStarted = pyqtSignal(str) # The user's message of a request that starts running
     responseReady = pyqtSignal(str)
     errorOccurred = pyqtSignal(str)
+    tokenReceived = pyqtSignal(str) # Incremental text from the model
+    toolCallStarted = pyqtSignal(str) # Name of a tool the agent is about to run
+    toolProgress = pyqtSignal(str, str) # Tool name and its latest progress line
+    requestFinished = pyqtSignal(str, bool) # Final status of a request ("done", "cancelled" or "error") and whether it had started
+
+    def handleEvent(self, event, payload):
+        if event == "start":
+            self.requestStarted.emit(payload)
+        elif event == "token":
+            self.tokenReceived.emit(payload)
+        elif event == "tool_call":
+            self.toolCallStarted.emit(payload["name"])
+        elif event == "tool_progress":
+            self.toolProgress.emit(payload.get("tool", "tool"), payload.get("last_line", ""))
+        elif event == "final":
+            self.responseReady.emit(payload or "Agent returned an empty response.")
+
+    def handleDone(self, request):
+        try:
+            response = request.future.result()
+            logger.debug("[Thread %s] Agent response (%s): %s", request.thread_id, request.status, response)
+        except Exception as e:
+            error_message = f"An error occurred in the agent thread: {e}"
+            logger.error(error_message)
+            self.errorOccurred.emit(error_message)
+        self.requestFinished.emit(request.status, request.started_at is not None)
 
-    def __init__(self, user_input, thread_id, graph_obj):
-        super().__init__()
-        self.user_input = user_input
-        self.thread_id = thread_id
-        self.graph = graph_obj
-      
+class AgentWarmup(QThread):
+    """Builds the agent and initializes tool dependencies in the background after the window is shown."""
+    ready = pyqtSignal()
+    failed = pyqtSignal(str)
 
     def run(self):
         try:
-            print(f"[Thread {self.thread_id}] Running agent for input: {self.user_input}")
-            response = run_agent_interaction(
-                self.user_input,
-                self.thread_id,
-                self.graph
-                
-            )
-            print(f"[Thread {self.thread_id}] Agent response: {response}")
-            self.responseReady.emit(response or "Agent returned an empty response.")
+            jarvis.get_graph()
+            registry.warm_up()
+            self.ready.emit()
         except Exception as e:
-            error_message = f"An error occurred in the agent thread: {e}"
-            print(error_message)
-            import traceback
-            traceback.print_exc() # Print full traceback to console
-            self.errorOccurred.emit(error_message)
+            logger.exception("Agent warm-up failed: %s", e)
+            self.failed.emit(str(e))
 
 # Main UI Window
 class JarvisWindow(QMainWindow):
@@ -174,10 +201,16 @@ class JarvisWindow(QMainWindow):
         self.setWindowTitle("J.A.R.V.I.S Interface")
         self.setGeometry(100, 100, 700, 800)
         self.thread_id = f"ui-session-{uuid.uuid4()}"
-        print(f"Starting new conversation thread: {self.thread_id}")
+        logger.info("Starting new conversation thread: %s", self.thread_id)
 
         self.initUI()
 
+        # The window is usable right away; the agent is built in the background. A message sent
+        # before the warm-up finishes simply waits for it in its worker thread.
+        self.warmup = AgentWarmup()
+        self.warmup.failed.connect(lambda error: self.appendMessage("System Error", f"Agent failed to start: {error}"))
+        self.warmup.start()
+
     def initUI(self):
         # Central Widget and Layout
         central_widget = QWidget(self)
@@ -186,9 +219,8 @@ class JarvisWindow(QMainWindow):
         main_layout.setContentsMargins(20, 20, 20, 20)
         main_layout.setSpacing(15)
 
-        # Conversation Display Area
-        self.conversation_display = QTextEdit()
-        self.conversation_display.setReadOnly(True)
+        # Conversation Display Area; keeps a bounded number of messages and pages older ones back from the checkpoint
+        self.conversation_display = TranscriptView(COLOR_ACCENT, COLOR_TEXT, load_history=self.loadHistory)
         main_layout.addWidget(self.conversation_display, 1)
 
         # Input Area Layout
@@ -205,72 +237,107 @@ class JarvisWindow(QMainWindow):
         self.send_button.clicked.connect(self.sendMessage)
         input_layout.addWidget(self.send_button)
 
+        self.stop_button = QPushButton("STOP")
+        self.stop_button.setCursor(Qt.PointingHandCursor)
+        self.stop_button.clicked.connect(self.stopAgent)
+        self.stop_button.setEnabled(False)
+        input_layout.addWidget(self.stop_button)
+
         main_layout.addLayout(input_layout)
 
         # Apply Futuristic Stylesheet
         self.setStyleSheet(FUTURISTIC_STYLESHEET)
 
-        # Worker thread instance (reused)
-        self.worker = None
+        # Agent events arrive here from the service's worker threads
+        self.events = AgentEvents()
+        self.events.requestStarted.connect(self.handleRequestStarted)
+        self.events.tokenReceived.connect(self.appendStreamingText)
+        self.events.toolCallStarted.connect(self.handleToolCall)
+        self.events.toolProgress.connect(self.handleToolProgress)
+        self.events.responseReady.connect(self.handleAgentResponse)
+        self.events.errorOccurred.connect(self.handleAgentError)
+        self.events.requestFinished.connect(self.onRequestFinished)
 
         # Initial welcome message
         self.appendMessage("JARVIS", "System online. How may I assist you?")
 
-    def appendMessage(self, sender, message):
+    def appendMessage(self, sender, message, from_history=False):
         if not message:
             return
+        self.conversation_display.appendMessage(sender, message, from_history)
 
-        # Replace newlines with HTML line breaks *before* the f-string
-        processed_message = message.replace('\n', '<br>')
+    def appendStreamingText(self, text):
+        """Appends a streamed text delta to the current JARVIS message, starting one if needed."""
+        self.conversation_display.appendStreamingText(text)
 
-        formatted_message = f"""
-            <div style='margin-bottom: 12px; border-left: 3px solid {COLOR_ACCENT}; padding-left: 10px;'>
-                <span style='font-weight: bold; color: {COLOR_ACCENT};'>{sender}:</span>
-                <div style='color: {COLOR_TEXT}; margin-top: 4px;'>{processed_message}</div>
-            </div>
-        """
-        self.conversation_display.append(formatted_message)
-        self.conversation_display.moveCursor(QTextCursor.End)
+    def loadHistory(self):
+        """Returns the messages of this conversation saved by the agent, for paging back trimmed ones."""
+        state = jarvis.get_graph().get_state({"configurable": {"thread_id": self.thread_id}})
+        return history_entries(state.values.get("messages", []))
 
     def sendMessage(self):
         user_text = self.input_field.text().strip()
         if not user_text:
             return
 
-        if self.worker and self.worker.isRunning():
-            QMessageBox.warning(self, "Busy", "Processing previous request. Please wait.")
-            return
-
-        self.appendMessage("User", user_text)
         self.input_field.clear()
-        self.setInteractionEnabled(False) # Disable input while processing
 
-        # Start worker thread
-        self.worker = AgentWorker(user_text, self.thread_id, graph)
-        self.worker.responseReady.connect(self.handleAgentResponse)
-        self.worker.errorOccurred.connect(self.handleAgentError)
-        self.worker.finished.connect(self.onWorkerFinished) # Re-enable input on finish
-        self.worker.start()
+        # Follow-ups are accepted right away and run once the current answer is finished. The message
+        # is shown when its request starts (handleRequestStarted), so it comes after the answer
+        # before it, in the order the conversation is saved in.
+        request = service.submit(self.thread_id, user_text, on_event=self.events.handleEvent)
+        request.future.add_done_callback(lambda future: self.events.handleDone(request))
+        self.updateBusyState()
+
+    def handleRequestStarted(self, user_text):
+        self.appendMessage("User", user_text, from_history=True)
+        self.updateBusyState()
+
+    def stopAgent(self):
+        if service.cancel(self.thread_id):
+            logger.info("Cancelled agent requests for thread %s", self.thread_id)
+
+    def handleToolCall(self, tool_name):
+        # Text streamed after the tool runs belongs to a new message
+        self.conversation_display.endStreaming()
+        self.input_field.setPlaceholderText(f"JARVIS is running {tool_name}...")
+
+    def handleToolProgress(self, tool_name, last_line):
+        self.input_field.setPlaceholderText(f"JARVIS is running {tool_name}: {last_line}")
 
     def handleAgentResponse(self, response):
-        self.appendMessage("JARVIS", response)
+        # The final answer has already been rendered if it was streamed
+        if not self.conversation_display.streaming:
+            self.appendMessage("JARVIS", response, from_history=True)
+        self.conversation_display.endStreaming()
 
     def handleAgentError(self, error_message):
+        self.conversation_display.endStreaming(from_history=False)
         self.appendMessage("System Error", f"An error occurred: {error_message}")
         # Optionally show a pop-up as well
         # QMessageBox.critical(self, "Agent Error", error_message)
 
-    def onWorkerFinished(self):
-        self.setInteractionEnabled(True) # Re-enable input
-        print("[UI] Worker thread finished.")
-
-    def setInteractionEnabled(self, enabled):
-        self.input_field.setEnabled(enabled)
-        self.send_button.setEnabled(enabled)
-        self.input_field.setPlaceholderText("Enter command or query..." if enabled else "JARVIS is processing...")
+    def onRequestFinished(self, status, started):
+        # A message cancelled while it was queued was never shown
+        if status == "cancelled" and started:
+            # A partly streamed answer is not saved in the conversation
+            self.conversation_display.endStreaming(from_history=False)
+            self.appendMessage("JARVIS", "Stopped.")
+        self.updateBusyState()
+
+    def updateBusyState(self):
+        pending = service.pending(self.thread_id)
+        self.stop_button.setEnabled(pending > 0)
+        if pending > 1:
+            self.input_field.setPlaceholderText(f"JARVIS is processing ({pending - 1} queued)...")
+        elif pending == 1:
+            self.input_field.setPlaceholderText("JARVIS is processing...")
+        else:
+            self.input_field.setPlaceholderText("Enter command or query...")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("JARVIS_LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     app = QApplication(sys.argv)
     # Ensure fonts look okay
     # QApplication.setStyle("Fusion")
@@ -0,0 +1,197 @@
+# response_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Tools whose results don't depend on the state of this computer and that change nothing.
+# A turn is only cached if every tool it called is in this set; anything touching the terminal,
+# the screen, the mouse or the keyboard makes the turn uncacheable.
+CACHEABLE_TOOLS = frozenset({"get_weather", "search_on_web_tool", "search_web_multi", "read_url"})
+
+def normalize_turn(text):
+    """Normalizes a user message for embedding: case, spacing and trailing punctuation are ignored."""
+    text = " ".join(text.casefold().split())
+    return re.sub(r"[\s?!.]+$", "", text)
+
+def context_fingerprint(*parts):
+    """Hashes everything besides the user message that the answer depends on (prompt, model, context)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class SemanticResponseCache:
+    """
+    Caches final answers by the meaning of the user's message.
+
+    Messages are embedded and compared by cosine similarity against earlier messages with the same
+    context fingerprint (brute force over a normalized numpy matrix, which is fast for the few
+    thousand entries kept). The stored answer is returned for the best match above threshold.
+    Entries expire after ttl seconds and the least recently used are evicted beyond max_entries.
+    Entries are also stored in SQLite so answers carry over between sessions.
+
+    Args:
+        embed: Function mapping a list of texts to a list of embedding vectors.
+        path: SQLite file for the cache, or None to keep it in memory only.
+        threshold: Minimum cosine similarity for a hit.
+        ttl: Seconds an answer may be reused.
+        max_entries: Maximum number of cached answers.
+    """
+
+    def __init__(self, embed, path=None, threshold=0.92, ttl=24 * 3600, max_entries=2000):
+        self.embed = embed
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = None
+        self._loaded = False
+        self._ids = []
+        self._fingerprints = []
+        self._answers = []
+        self._created = np.zeros(0)
+        self._last_used = np.zeros(0)
+        self._vectors = None # (entries, dimensions) float32, rows normalized to unit length
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "uncacheable": 0, "evictions": 0}
+
+    def lookup(self, text, fingerprint):
+        """
+        Returns (answer, embedding) for a user message. answer is None on a miss; the embedding can
+        be passed to store() afterwards so the message isn't embedded twice.
+        """
+        vector = self._embed(text)
+        with self._lock:
+            self._load()
+            self._check_dimensions(vector)
+            now = time.time()
+            self._drop(np.flatnonzero(now - self._created > self.ttl))
+            if self._vectors is not None and len(self._ids):
+                scores = self._vectors @ vector
+                scores[np.array(self._fingerprints) != fingerprint] = -1.0
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.stats["hits"] += 1
+                    self._last_used[best] = now
+                    return self._answers[best], vector
+            self.stats["misses"] += 1
+            return None, vector
+
+    def store(self, text, fingerprint, answer, tools_used=(), embedding=None):
+        """
+        Caches the answer to a user message, unless the turn called a tool outside CACHEABLE_TOOLS.
+
+        Returns:
+            True if the answer was stored.
+        """
+        if not answer or any(name not in CACHEABLE_TOOLS for name in tools_used):
+            with self._lock:
+                self.stats["uncacheable"] += 1
+            return False
+        vector = embedding if embedding is not None else self._embed(text)
+        now = time.time()
+        with self._lock:
+            self._load()
+            self._check_dimensions(vector)
+            entry_id = self._insert(normalize_turn(text), fingerprint, answer, vector, now)
+            self._append(entry_id, fingerprint, answer, vector, now, now)
+            self.stats["stores"] += 1
+            if len(self._ids) > self.max_entries:
+                excess = len(self._ids) - self.max_entries
+                self._drop(np.argsort(self._last_used)[:excess])
+                self.stats["evictions"] += excess
+        return True
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._ids)
+
+    def _embed(self, text):
+        vector = np.asarray(self.embed([normalize_turn(text)])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_dimensions(self, vector):
+        # Entries embedded by a different model can't be compared; start over
+        if self._vectors is not None and len(self._ids) and self._vectors.shape[1] != len(vector):
+            self._drop(np.arange(len(self._ids)))
+            self._vectors = None
+
+    def _append(self, entry_id, fingerprint, answer, vector, created, last_used):
+        self._ids.append(entry_id)
+        self._fingerprints.append(fingerprint)
+        self._answers.append(answer)
+        self._created = np.append(self._created, created)
+        self._last_used = np.append(self._last_used, last_used)
+        row = vector[np.newaxis, :]
+        self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+
+    def _drop(self, positions):
+        """Removes entries by position from memory and disk. Must be called with the lock held."""
+        if len(positions) == 0:
+            return
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[positions] = False
+        dropped = [self._ids[i] for i in positions]
+        self._ids = [value for value, kept in zip(self._ids, keep) if kept]
+        self._fingerprints = [value for value, kept in zip(self._fingerprints, keep) if kept]
+        self._answers = [value for value, kept in zip(self._answers, keep) if kept]
+        self._created = self._created[keep]
+        self._last_used = self._last_used[keep]
+        self._vectors = self._vectors[keep]
+        db = self._connect()
+        if db is not None:
+            db.executemany("DELETE FROM responses WHERE id = ?", [(entry_id,) for entry_id in dropped])
+            db.commit()
+
+    def _insert(self, text, fingerprint, answer, vector, now):
+        db = self._connect()
+        if db is None:
+            return f"memory-{self.stats['stores']}-{now}"
+        cursor = db.execute(
+            "INSERT INTO responses (fingerprint, text, answer, embedding, created_at) VALUES (?, ?, ?, ?, ?)",
+            (fingerprint, text, answer, vector.astype(np.float32).tobytes(), now),
+        )
+        db.commit()
+        return cursor.lastrowid
+
+    def _load(self):
+        """Reads the entries saved by earlier sessions, once. Must be called with the lock held."""
+        if self._loaded:
+            return
+        self._loaded = True
+        db = self._connect()
+        if db is None:
+            return
+        oldest = time.time() - self.ttl
+        db.execute("DELETE FROM responses WHERE created_at < ?", (oldest,))
+        db.commit()
+        rows = db.execute(
+            "SELECT id, fingerprint, answer, embedding, created_at FROM responses ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for entry_id, fingerprint, answer, embedding, created_at in reversed(rows):
+            self._append(entry_id, fingerprint, answer, np.frombuffer(embedding, dtype=np.float32), created_at, created_at)
+
+    def _connect(self):
+        if not self.path:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (id INTEGER PRIMARY KEY, fingerprint TEXT NOT NULL, text TEXT NOT NULL, "
+                "answer TEXT NOT NULL, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
@@ -0,0 +1,148 @@
+# tests/test_checkpointer.py
+import operator
+import sqlite3
+from typing import Annotated, TypedDict
+import pytest
+from langgraph.graph import END, START, StateGraph
+from checkpointer import BoundedMemorySaver, _blob_size, _entry_size, _writes_size
+
+class State(TypedDict):
+    values: Annotated[list, operator.add]
+
+def _graph(saver):
+    graph = StateGraph(State)
+    graph.add_node("step", lambda state: {"values": [len(state["values"])]})
+    graph.add_edge(START, "step")
+    graph.add_edge("step", END)
+    return graph.compile(checkpointer=saver)
+
+def _config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+def _run(graph, thread_id, turns=1):
+    for _ in range(turns):
+        graph.invoke({"values": ["x" * 100]}, _config(thread_id))
+
+def _snapshot(saver, thread_id):
+    """The checkpoints (newest first) and pending writes of a thread, as the saver returns them."""
+    checkpoints = list(saver.list(_config(thread_id)))
+    writes = {key: value for key, value in saver.writes.items() if key[0] == thread_id}
+    return checkpoints, writes
+
+def _actual_bytes(saver):
+    # What the byte accounting should add up to: everything resident in the MemorySaver dicts
+    size = sum(_entry_size(entry) for namespaces in saver.storage.values() for checkpoints in namespaces.values()
+               for entry in checkpoints.values())
+    size += sum(_blob_size(blob) for blob in saver.blobs.values())
+    return size + sum(_writes_size(writes) for writes in saver.writes.values())
+
+def _spill_rows(path):
+    with sqlite3.connect(path) as db:
+        return [row[0] for row in db.execute("SELECT thread_id FROM threads ORDER BY evicted_at")]
+
+def test_keeps_the_newest_checkpoints_per_thread():
+    saver = BoundedMemorySaver(max_checkpoints_per_thread=3)
+    graph = _graph(saver)
+    _run(graph, "a")
+    all_ids = [item.config["configurable"]["checkpoint_id"] for item in saver.list(_config("a"))]
+    _run(graph, "a", turns=4)
+    kept = [item.config["configurable"]["checkpoint_id"] for item in saver.list(_config("a"))]
+    assert len(kept) == 3 and not set(kept) & set(all_ids)
+    assert saver.metrics()["pruned_checkpoints"] > 0
+    # The latest state is complete, with every channel value it references
+    assert len(graph.get_state(_config("a")).values["values"]) == 10
+    assert saver.metrics()["resident_bytes"] == _actual_bytes(saver)
+
+def test_evicts_least_recently_used_threads_beyond_max_threads():
+    saver = BoundedMemorySaver(max_threads=2)
+    graph = _graph(saver)
+    _run(graph, "a")
+    _run(graph, "b")
+    graph.get_state(_config("a")) # a is now used more recently than b
+    _run(graph, "c")
+    assert set(saver.storage) == {"a", "c"}
+    assert saver.get_tuple(_config("b")) is None
+    assert saver.metrics()["evictions"] == 1
+    assert saver.metrics()["resident_bytes"] == _actual_bytes(saver)
+
+def test_evicts_threads_beyond_max_bytes():
+    measure = BoundedMemorySaver()
+    _run(_graph(measure), "a")
+    one_thread = measure.metrics()["resident_bytes"]
+
+    saver = BoundedMemorySaver(max_bytes=int(one_thread * 1.5))
+    graph = _graph(saver)
+    _run(graph, "a")
+    _run(graph, "b")
+    assert set(saver.storage) == {"b"}
+    metrics = saver.metrics()
+    assert metrics["resident_bytes"] == _actual_bytes(saver) <= saver.max_bytes
+
+def test_spilled_thread_reloads_with_its_checkpoints_and_writes(tmp_path):
+    spill_path = str(tmp_path / "spill.db")
+    saver = BoundedMemorySaver(max_threads=1, spill_path=spill_path)
+    graph = _graph(saver)
+    _run(graph, "a", turns=2)
+    before = _snapshot(saver, "a")
+    assert len(before[0]) > 1 and before[1]
+    resident_bytes = saver.metrics()["resident_bytes"]
+
+    _run(graph, "b")
+    assert "a" not in saver.storage and _spill_rows(spill_path) == ["a"]
+
+    assert _snapshot(saver, "a") == before
+    assert saver.metrics()["reloads"] == 1
+    assert "a" in saver.storage and _spill_rows(spill_path) == ["b"]
+    assert saver._thread_bytes["a"] == resident_bytes
+    # The reloaded thread carries on where it left off
+    _run(graph, "a")
+    assert len(graph.get_state(_config("a")).values["values"]) == 6
+
+def test_delete_thread_removes_it_from_memory_and_the_spill_file(tmp_path):
+    spill_path = str(tmp_path / "spill.db")
+    saver = BoundedMemorySaver(max_threads=1, spill_path=spill_path)
+    graph = _graph(saver)
+    _run(graph, "spilled")
+    _run(graph, "resident")
+    assert _spill_rows(spill_path) == ["spilled"]
+
+    saver.delete_thread("spilled")
+    saver.delete_thread("resident")
+    for thread_id in ("spilled", "resident"):
+        assert saver.get_tuple(_config(thread_id)) is None
+        assert not [key for key in [*saver.writes, *saver.blobs] if key[0] == thread_id]
+    assert not saver.storage and _spill_rows(spill_path) == []
+    assert saver.metrics()["resident_bytes"] == 0
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("checkpointer.time.time", lambda: now[0])
+    return now
+
+def test_spill_file_keeps_at_most_spill_max_threads(tmp_path, clock):
+    spill_path = str(tmp_path / "spill.db")
+    saver = BoundedMemorySaver(max_threads=1, spill_path=spill_path, spill_max_threads=2)
+    graph = _graph(saver)
+    for thread_id in "abcde":
+        clock[0] += 1
+        _run(graph, thread_id)
+    # a to d were evicted in that order; only the two most recent stay spilled
+    assert _spill_rows(spill_path) == ["c", "d"]
+    assert saver.metrics()["expired_threads"] == 2
+    assert saver.get_tuple(_config("a")) is None
+
+def test_spilled_threads_expire_after_spill_max_age(tmp_path, clock):
+    spill_path = str(tmp_path / "spill.db")
+    saver = BoundedMemorySaver(max_threads=1, spill_path=spill_path, spill_max_age=100)
+    graph = _graph(saver)
+    _run(graph, "a")
+    _run(graph, "b")
+    clock[0] += 101
+    _run(graph, "c")
+    assert _spill_rows(spill_path) == ["b"]
+
+    clock[0] += 101
+    # Threads left in the file by an earlier run expire when it is opened again
+    reopened = BoundedMemorySaver(spill_path=spill_path, spill_max_age=100)
+    assert reopened.metrics()["spilled_threads"] == 0
@@ -0,0 +1,59 @@
+# tests/test_page_reader.py
+import asyncio
+import pytest
+from tools import page_reader
+from tools.page_reader import TextExtractor, _aread_body, _read_body
+
+def _extract(html):
+    extractor = TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+@pytest.mark.parametrize("html", [
+    "<html><head><title>T</title><meta charset='utf-8'><p>Body text</p></html>",
+    "<html><head><title>T</title><div>Body text</div>",
+    "<head><title>T</title><link rel=stylesheet href=x.css>Body text",
+    "<html><head><title>T</title></head><body><p>Body text</p></body></html>",
+])
+def test_body_text_is_kept_with_or_without_closing_head(html):
+    assert _extract(html) == "Body text"
+
+def test_head_contents_are_dropped():
+    extractor = TextExtractor()
+    extractor.feed("<head><title>T</title><style>p {}</style><script>x = 1</script></head><p>Body</p>")
+    extractor.close()
+    assert extractor.text() == "Body" and extractor.title == "T"
+
+def test_form_contents_are_kept_without_controls():
+    assert _extract("<form><p>Article</p><button>Go</button><select><option>A</option></select></form>") == "Article"
+
+class FakeResponse:
+    def __init__(self, chunks, content_type="text/html; charset=utf-8"):
+        self.chunks = chunks
+        self.headers = {"content-type": content_type}
+        self.charset_encoding = "utf-8"
+
+    def iter_bytes(self):
+        return iter(self.chunks)
+
+    async def aiter_bytes(self):
+        for chunk in self.chunks:
+            yield chunk
+
+CUT_OFF_BODY = [b"<p>Fish &amp", b"; chips</p><p>Tail text &amp", b" more</p>", b"<p>never read</p>"]
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_text_before_the_download_cap_is_kept(monkeypatch, use_async):
+    monkeypatch.setattr(page_reader, "MAX_DOWNLOAD_BYTES", sum(map(len, CUT_OFF_BODY[:2])))
+    response = FakeResponse(CUT_OFF_BODY)
+    title, text, truncated = asyncio.run(_aread_body(response)) if use_async else _read_body(response)
+    assert truncated
+    assert text == "Fish & chips\nTail text &"
+
+def test_cut_off_tag_and_character_are_dropped(monkeypatch):
+    body = [b"<p>Caf\xc3\xa9</p><div class=", b"'x'>more \xc3"]
+    monkeypatch.setattr(page_reader, "MAX_DOWNLOAD_BYTES", len(body[0]))
+    assert _read_body(FakeResponse(body))[1] == "Café"
+    monkeypatch.setattr(page_reader, "MAX_DOWNLOAD_BYTES", sum(map(len, body)))
+    assert _read_body(FakeResponse(body))[1] == "Café\nmore"
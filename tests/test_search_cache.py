@@ -0,0 +1,72 @@
+# tests/test_search_cache.py
+import pytest
+from tools.search_cache import SearchCache, normalize_query
+
+@pytest.mark.parametrize("first, second", [
+    ("when was Einstein born", "where was Einstein born"),
+    ("flights from London to Paris", "flights from Paris to London"),
+    ("who is the CEO of Apple", "why is the CEO of Apple"),
+    ("python sort list", "list sort python"),
+])
+def test_different_questions_get_different_keys(first, second):
+    assert normalize_query(first) != normalize_query(second)
+
+@pytest.mark.parametrize("first, second", [
+    ("When was Einstein born?", "when  was einstein born"),
+    ("the capital of France", "capital of france"),
+    ("an apple a day", "Apple day"),
+])
+def test_trivial_differences_share_a_key(first, second):
+    assert normalize_query(first) == normalize_query(second)
+
+def test_only_articles_keep_their_words():
+    assert normalize_query("The") == "the"
+
+def test_get_or_fetch_uses_the_normalized_key():
+    cache = SearchCache()
+    fetched = []
+    fetch = lambda query: fetched.append(query) or [query]
+    assert cache.get_or_fetch("When was Einstein born?", fetch) == ["When was Einstein born?"]
+    assert cache.get_or_fetch("when was einstein born", fetch) == ["When was Einstein born?"]
+    assert cache.get_or_fetch("where was Einstein born", fetch) == ["where was Einstein born"]
+    assert len(fetched) == 2
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("tools.search_cache.time.time", lambda: now[0])
+    return now
+
+def test_each_lookup_counts_once(tmp_path, clock):
+    cache = SearchCache(str(tmp_path / "cache.sqlite"), ttl=10, stale_ttl=100)
+    fetch = lambda query: [query]
+    cache.get_or_fetch("q", fetch) # miss
+    cache.get_or_fetch("q", fetch) # memory hit
+    cache._memory.clear()
+    cache.get_or_fetch("q", fetch) # disk hit
+    assert (cache.stats["misses"], cache.stats["memory_hits"], cache.stats["disk_hits"]) == (1, 1, 1)
+    assert cache.hit_rate() == pytest.approx(2 / 3)
+
+def test_expired_entries_are_evicted(tmp_path, clock):
+    cache = SearchCache(str(tmp_path / "cache.sqlite"), ttl=10, stale_ttl=100, max_memory_entries=2)
+    cache.put("old", ["old"])
+    clock[0] += 101
+    assert cache._fresh_or_stale("old") is None
+    assert "old" not in cache._memory
+    assert cache._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+
+    cache.put("expired", ["x"])
+    clock[0] += 101
+    cache.put("a", ["a"])
+    cache.put("b", ["b"])
+    # The expired entry is dropped to make room, not the least recently used live one
+    assert list(cache._memory) == ["a", "b"]
+
+def test_expired_rows_are_pruned(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr("tools.search_cache.PRUNE_INTERVAL", 50)
+    cache = SearchCache(str(tmp_path / "cache.sqlite"), ttl=10, stale_ttl=100)
+    for number in range(5):
+        cache.put(f"q{number}", [number])
+    clock[0] += 101
+    cache.put("new", ["new"])
+    assert [row[0] for row in cache._connect().execute("SELECT key FROM results")] == ["new"]
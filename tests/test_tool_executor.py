@@ -0,0 +1,121 @@
+# tests/test_tool_executor.py
+import asyncio
+import threading
+import time
+import pytest
+from uuid import uuid4
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.tools import tool
+from langgraph.graph import END, START, MessagesState, StateGraph
+from tool_executor import ParallelToolNode, ToolCallPrefetcher, read_only
+
+@pytest.fixture
+def events():
+    log = []
+    lock = threading.Lock()
+
+    def record(event):
+        with lock:
+            log.append(event)
+    record.log = log
+    return record
+
+@pytest.fixture
+def node(events):
+    @tool
+    def click_coordinates(x: int, y: int):
+        """Clicks at (x, y)."""
+        events(("start", "click"))
+        time.sleep(0.2)
+        events(("end", "click"))
+        return "clicked"
+
+    @tool
+    def type_text(text: str):
+        """Types text."""
+        events(("start", "type"))
+        events(("end", "type"))
+        return "typed"
+
+    @read_only
+    @tool
+    def describe_screen_content(question: str):
+        """Describes the screen."""
+        events(("start", question))
+        time.sleep(0.2)
+        events(("end", question))
+        return "a screen"
+
+    return ParallelToolNode([click_coordinates, type_text, describe_screen_content])
+
+def _message(*calls):
+    return {"messages": [AIMessage(content="", tool_calls=[
+        {"name": name, "args": args, "id": f"call_{index}", "type": "tool_call"} for index, (name, args) in enumerate(calls)
+    ])]}
+
+def _invoke(node, message, use_async):
+    graph = StateGraph(MessagesState)
+    graph.add_node("tools", node)
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    graph = graph.compile()
+    config = {"configurable": {"thread_id": "test"}}
+    if use_async:
+        result = asyncio.run(graph.ainvoke(message, config))
+    else:
+        result = graph.invoke(message, config)
+    return {"messages": result["messages"][1:]}
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_typing_waits_for_the_click(node, events, use_async):
+    result = _invoke(node, _message(("click_coordinates", {"x": 1, "y": 2}), ("type_text", {"text": "hello"})), use_async)
+    assert events.log == [("start", "click"), ("end", "click"), ("start", "type"), ("end", "type")]
+    assert [message.content for message in result["messages"]] == ["clicked", "typed"]
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_screen_read_after_a_click_sees_it(node, events, use_async):
+    _invoke(node, _message(("describe_screen_content", {"question": "before"}), ("click_coordinates", {"x": 1, "y": 2}),
+                           ("describe_screen_content", {"question": "after"})), use_async)
+    assert events.log == [("start", "before"), ("end", "before"), ("start", "click"), ("end", "click"),
+                          ("start", "after"), ("end", "after")]
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_read_only_calls_run_together(node, events, use_async):
+    started = time.monotonic()
+    result = _invoke(node, _message(("describe_screen_content", {"question": "one"}), ("describe_screen_content", {"question": "two"})), use_async)
+    assert time.monotonic() - started < 0.35
+    assert len(result["messages"]) == 2
+
+def test_calls_after_a_cancel_do_not_start(node, events):
+    node.cancel("test")
+    result = _invoke(node, _message(("click_coordinates", {"x": 1, "y": 2}), ("type_text", {"text": "hello"})), False)
+    assert events.log == []
+    assert all(message.status == "error" for message in result["messages"])
+
+def _stream(prefetcher, *calls):
+    # Streams each call as the model does: name and ID first, then the arguments in two pieces
+    run_id = uuid4()
+    for index, (name, args) in enumerate(calls):
+        pieces = [{"name": name, "id": f"call_{index}", "args": args[:len(args) // 2]}, {"args": args[len(args) // 2:]}]
+        for piece in pieces:
+            message = AIMessageChunk(content="", tool_call_chunks=[{"index": index, "type": "tool_call_chunk", **piece}])
+            prefetcher.on_llm_new_token("", chunk=ChatGenerationChunk(message=message), run_id=run_id)
+    prefetcher.on_llm_end(None, run_id=run_id)
+
+def _prefetched_ids(node):
+    return sorted(call_id for _, call_id in node._prefetched)
+
+def test_screen_reads_are_prefetched(node):
+    prefetcher = ToolCallPrefetcher(node, {"configurable": {"thread_id": "test"}})
+    _stream(prefetcher, ("describe_screen_content", '{"question": "one"}'), ("describe_screen_content", '{"question": "two"}'))
+    assert _prefetched_ids(node) == ["call_0", "call_1"]
+    prefetcher.finish()
+
+def test_screen_read_after_a_click_is_not_prefetched(node, events):
+    prefetcher = ToolCallPrefetcher(node, {"configurable": {"thread_id": "test"}})
+    _stream(prefetcher, ("describe_screen_content", '{"question": "before"}'), ("click_coordinates", '{"x": 1, "y": 2}'),
+            ("describe_screen_content", '{"question": "after"}'))
+    assert _prefetched_ids(node) == ["call_0"]
+    prefetcher.finish()
+    assert ("start", "after") not in events.log
@@ -0,0 +1,371 @@
+# tool_executor.py
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import Context, ContextVar, copy_context
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables.config import get_config_list
+from langgraph.prebuilt import ToolNode
+from tools.tool_results import fit_to_budget
+
+logger = logging.getLogger(__name__)
+
+# How often a waiting tool call checks whether its run has been cancelled
+CANCEL_POLL_INTERVAL = 0.1
+
+def _thread_id(config):
+    return (config or {}).get("configurable", {}).get("thread_id")
+
+# Effects held back by the prefetched tool call running in this context (see after_use)
+_held_effects = ContextVar("held_effects", default=None)
+
+def after_use(effect):
+    """
+    Runs effect() once the result of the current tool call is used. A read_only tool calls this for
+    state it updates for later calls (e.g. the last screen looked at): when the call was prefetched,
+    the effect is held back until the tool node takes its result, and dropped if the model ended up
+    making a different call. Outside of prefetched calls, effect() runs right away.
+    """
+    effects = _held_effects.get()
+    if effects is None:
+        effect()
+    else:
+        effects.append(effect)
+
+def _apply_effects(effects):
+    for effect in effects:
+        try:
+            effect()
+        except Exception as e:
+            logger.warning("Deferred effect of a prefetched tool call failed: %s", e)
+
+def read_only(tool):
+    """
+    Marks a tool as read-only and idempotent: it changes nothing and running it twice gives the same
+    result. Only such tools are started speculatively while the model is still writing its message
+    (see ToolCallPrefetcher). State a tool keeps for later calls must be updated through after_use.
+    Use it above @tool.
+    """
+    tool.metadata = {**(tool.metadata or {}), "read_only": True}
+    return tool
+
+class ParallelToolNode(ToolNode):
+    """
+    Tool-execution stage for the agent graph that runs the read-only tool calls of an AIMessage concurrently.
+
+    Calls of tools that change state (clicking, typing, running commands) run one at a time in the
+    order the model requested them, after every earlier call has finished; read-only calls run
+    together with the read-only calls next to them, once the state-changing calls before them are
+    done. So a screen read requested after a click sees the result of the click.
+
+    The name -> tool index is built once when the node is created. Synchronous tools run on a
+    bounded thread pool that is shared across turns; async tools run under asyncio when the graph
+    is driven with ainvoke/astream. Results come back as ToolMessages in the order the model
+    requested them.
+
+    Args:
+        tools: The tools available to the agent.
+        max_workers: Maximum number of tool calls executing at the same time.
+        default_timeout: Seconds to wait for a tool call before giving up on it.
+        timeouts: Optional per-tool overrides of default_timeout, keyed by tool name.
+        prefetch: Whether calls of read_only tools may be started before the model's message is complete.
+        default_token_budget: Maximum size of a tool result in tokens; longer results are cut in the
+            middle (see tools.tool_results.fit_to_budget). None for no limit.
+        token_budgets: Optional per-tool overrides of default_token_budget, keyed by tool name.
+        **kwargs: Passed through to ToolNode (e.g. handle_tool_errors).
+    """
+
+    def __init__(self, tools, *, max_workers=8, default_timeout=60.0, timeouts=None, prefetch=True,
+                 default_token_budget=None, token_budgets=None, **kwargs):
+        super().__init__(tools, **kwargs)
+        self.default_timeout = default_timeout
+        self.timeouts = dict(timeouts or {})
+        self.default_token_budget = default_token_budget
+        self.token_budgets = dict(token_budgets or {})
+        self.prefetch_enabled = prefetch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jarvis-tool")
+        self._cancel_events = {}
+        self._cancel_lock = threading.Lock()
+        self._prefetched = {} # (thread_id, tool call ID) -> (tool call, future)
+        self._prefetch_lock = threading.Lock()
+        self.stats = {"prefetched": 0, "prefetch_hits": 0, "prefetch_discarded": 0, "results_cut": 0, "result_tokens_cut": 0}
+
+    def timeout_for(self, tool_name):
+        return self.timeouts.get(tool_name, self.default_timeout)
+
+    def token_budget_for(self, tool_name):
+        return self.token_budgets.get(tool_name, self.default_token_budget)
+
+    def _run_one(self, call, input_type, config):
+        return self._fit_to_budget(super()._run_one(call, input_type, config))
+
+    async def _arun_one(self, call, input_type, config):
+        return self._fit_to_budget(await super()._arun_one(call, input_type, config))
+
+    def _fit_to_budget(self, message):
+        # Results are cut here, before they are stored in the conversation and sent with every later model call
+        budget = self.token_budget_for(getattr(message, "name", None))
+        if budget is None or not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+            return message
+        content, cut = fit_to_budget(message.content, budget)
+        if cut:
+            logger.debug("Cut %d tokens from the result of %s to fit its %d-token budget", cut, message.name, budget)
+            self.stats["results_cut"] += 1
+            self.stats["result_tokens_cut"] += cut
+            message.content = content
+        return message
+
+    def _cancel_event(self, thread_id):
+        with self._cancel_lock:
+            return self._cancel_events.setdefault(thread_id, threading.Event())
+
+    def cancel(self, thread_id):
+        """Abandons the in-flight and pending tool calls of a conversation thread."""
+        self._cancel_event(thread_id).set()
+
+    def reset_cancel(self, thread_id):
+        """Clears a previous cancellation so the thread's next run executes tools normally."""
+        self._cancel_event(thread_id).clear()
+
+    def is_read_only(self, tool_name):
+        """Whether a tool is marked read_only, so its calls may run concurrently with other read-only calls."""
+        tool = self.tools_by_name.get(tool_name)
+        return tool is not None and (tool.metadata or {}).get("read_only", False)
+
+    def is_prefetchable(self, tool_name):
+        """Whether calls of a tool may start early: it must be marked read_only and take no injected graph state."""
+        return (self.prefetch_enabled and self.is_read_only(tool_name)
+                and not self.tool_to_state_args.get(tool_name) and not self.tool_to_store_arg.get(tool_name))
+
+    def _batches(self, tool_calls):
+        """
+        Splits the calls of a message into batches that run one after the other: each state-changing
+        call is a batch of its own, and consecutive read-only calls share one. Yields lists of indexes.
+        """
+        batch = []
+        for index, call in enumerate(tool_calls):
+            if self.is_read_only(call["name"]):
+                batch.append(index)
+                continue
+            if batch:
+                yield batch
+                batch = []
+            yield [index]
+        if batch:
+            yield batch
+
+    def prefetch(self, call, config):
+        """
+        Starts a tool call before the tool node runs, e.g. while the model is still streaming the rest
+        of its message. When the node then runs the same call (same ID, name and arguments), it waits
+        for this result instead of starting the tool again.
+
+        Returns:
+            True if the call was started.
+        """
+        thread_id = _thread_id(config)
+        if not self.is_prefetchable(call["name"]) or self._cancel_event(thread_id).is_set():
+            return False
+        key = (thread_id, call["id"])
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        with self._prefetch_lock:
+            if key in self._prefetched:
+                return False
+            # A fresh context, so the call doesn't run as part of the model call that is still streaming.
+            # When the graph runs under asyncio, the call runs as a task on its loop (async tools stay async).
+            context = Context()
+            effects = []
+            context.run(_held_effects.set, effects)
+            if loop is not None:
+                future = context.run(asyncio.run_coroutine_threadsafe, self._arun_one(call, "dict", config), loop)
+            else:
+                future = self._executor.submit(context.run, self._run_one, call, "dict", config)
+            self._prefetched[key] = (call, future, effects)
+            self.stats["prefetched"] += 1
+        return True
+
+    def _take_prefetched(self, call, thread_id):
+        """Returns the future of a matching prefetched call, or None."""
+        with self._prefetch_lock:
+            prefetched = self._prefetched.pop((thread_id, call["id"]), None)
+            if prefetched is None:
+                return None
+            early_call, future, effects = prefetched
+            if early_call["name"] == call["name"] and early_call["args"] == call["args"]:
+                self.stats["prefetch_hits"] += 1
+                # The call counts as made now; its held-back effects apply once it has finished
+                future.add_done_callback(lambda done: done.cancelled() or _apply_effects(effects))
+                return future
+            self.stats["prefetch_discarded"] += 1
+        future.cancel()
+        return None
+
+    def discard_prefetched(self, thread_id):
+        """Drops the prefetched calls of a thread that the node didn't use, e.g. after a cancelled turn."""
+        with self._prefetch_lock:
+            keys = [key for key in self._prefetched if key[0] == thread_id]
+            futures = [self._prefetched.pop(key)[1] for key in keys]
+            self.stats["prefetch_discarded"] += len(futures)
+        for future in futures:
+            # Calls already running finish in the background; their results are ignored
+            future.cancel()
+
+    def _error_message(self, call, content):
+        return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"], status="error")
+
+    def _timeout_message(self, call):
+        return self._error_message(call, f"Error: Tool {call['name']} timed out after {self.timeout_for(call['name'])} seconds.")
+
+    def _cancelled_message(self, call):
+        return self._error_message(call, f"Error: Tool {call['name']} was cancelled.")
+
+    def _wait(self, future, call, deadline, cancel_event):
+        while True:
+            if cancel_event.is_set():
+                future.cancel()
+                return self._cancelled_message(call)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # A running thread cannot be interrupted; it is abandoned and its result discarded
+                future.cancel()
+                logger.warning("Tool %s (ID: %s) timed out.", call["name"], call["id"])
+                return self._timeout_message(call)
+            try:
+                return future.result(timeout=min(remaining, CANCEL_POLL_INTERVAL))
+            except FutureTimeoutError:
+                continue
+
+    def _func(self, input, config, *, store):
+        tool_calls, input_type = self._parse_input(input, store)
+        config_list = get_config_list(config, len(tool_calls))
+        thread_id = _thread_id(config)
+        cancel_event = self._cancel_event(thread_id)
+
+        outputs = [None] * len(tool_calls)
+        for batch in self._batches(tool_calls):
+            if cancel_event.is_set():
+                # Later calls may depend on the abandoned ones, so they don't start at all
+                for index in batch:
+                    outputs[index] = self._cancelled_message(tool_calls[index])
+                continue
+            started = time.monotonic()
+            futures = [
+                self._take_prefetched(tool_calls[index], thread_id)
+                # Copy the context so callbacks and tracing follow the call into the worker thread
+                or self._executor.submit(copy_context().run, self._run_one, tool_calls[index], input_type, config_list[index])
+                for index in batch
+            ]
+            for index, future in zip(batch, futures):
+                call = tool_calls[index]
+                outputs[index] = self._wait(future, call, started + self.timeout_for(call["name"]), cancel_event)
+        return self._combine_tool_outputs(outputs, input_type)
+
+    async def _arun_with_timeout(self, call, input_type, config, cancel_event):
+        prefetched = self._take_prefetched(call, _thread_id(config))
+        if prefetched is not None:
+            task = asyncio.wrap_future(prefetched)
+        else:
+            task = asyncio.ensure_future(self._arun_one(call, input_type, config))
+        deadline = time.monotonic() + self.timeout_for(call["name"])
+        while not task.done():
+            if cancel_event.is_set():
+                task.cancel()
+                return self._cancelled_message(call)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                task.cancel()
+                logger.warning("Tool %s (ID: %s) timed out.", call["name"], call["id"])
+                return self._timeout_message(call)
+            await asyncio.wait([task], timeout=min(remaining, CANCEL_POLL_INTERVAL))
+        return task.result()
+
+    async def _afunc(self, input, config, *, store):
+        tool_calls, input_type = self._parse_input(input, store)
+        cancel_event = self._cancel_event(_thread_id(config))
+        outputs = [None] * len(tool_calls)
+        for batch in self._batches(tool_calls):
+            if cancel_event.is_set():
+                for index in batch:
+                    outputs[index] = self._cancelled_message(tool_calls[index])
+                continue
+            results = await asyncio.gather(
+                *(self._arun_with_timeout(tool_calls[index], input_type, config, cancel_event) for index in batch)
+            )
+            for index, result in zip(batch, results):
+                outputs[index] = result
+        return self._combine_tool_outputs(outputs, input_type)
+
+class ToolCallPrefetcher(BaseCallbackHandler):
+    """
+    Callback handler that starts read-only tool calls while the model is still generating.
+
+    It follows the tool-call chunks streamed by the model and, as soon as a call's arguments form a
+    complete JSON object, hands the call to ParallelToolNode.prefetch. The tool's latency then
+    overlaps with the rest of the model's message (e.g. further tool calls). Tools not marked
+    read_only are never started early, nor are calls that come after one of them in the message,
+    since they must see its effect. Call finish() when the turn ends to drop unused results.
+
+    Args:
+        tool_node: The ParallelToolNode of the graph.
+        config: Config for the early tool calls; must contain the thread ID under "configurable".
+    """
+
+    run_inline = True
+
+    def __init__(self, tool_node, config):
+        self.tool_node = tool_node
+        self.config = config
+        self._calls = {} # model run ID -> {tool call index -> call being streamed}
+        self._lock = threading.Lock()
+
+    def on_llm_new_token(self, token, *, chunk=None, run_id, **kwargs):
+        parts = [part for part in getattr(getattr(chunk, "message", None), "tool_call_chunks", None) or ()
+                 if part.get("index") is not None]
+        if not parts:
+            return
+        with self._lock:
+            calls = self._calls.setdefault(run_id, {})
+            for part in parts:
+                call = calls.setdefault(part["index"], {"name": None, "id": None, "args": "", "started": False})
+                call["name"] = call["name"] or part.get("name")
+                call["id"] = call["id"] or part.get("id")
+                call["args"] += part.get("args") or ""
+            ready = self._ready_calls(calls)
+        for call in ready:
+            self.tool_node.prefetch(call, self.config)
+
+    def _ready_calls(self, calls):
+        """Returns the calls of a message that can start now and marks them as started."""
+        ready = []
+        for index in sorted(calls):
+            call = calls[index]
+            # A call after one that changes state (a click, typing, ...) must see its effect, so it waits for the tool node
+            if not call["name"] or not self.tool_node.is_read_only(call["name"]):
+                break
+            # Only complete JSON objects parse, so this waits until the arguments are finished
+            if call["started"] or not call["id"] or not call["args"].rstrip().endswith("}"):
+                continue
+            if not self.tool_node.is_prefetchable(call["name"]):
+                continue
+            try:
+                args = json.loads(call["args"])
+            except ValueError:
+                continue
+            call["started"] = True
+            if isinstance(args, dict):
+                ready.append({"name": call["name"], "args": args, "id": call["id"], "type": "tool_call"})
+        return ready
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            self._calls.pop(run_id, None)
+
+    def finish(self):
+        self.tool_node.discard_prefetched(_thread_id(self.config))
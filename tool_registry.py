@@ -0,0 +1,71 @@
+# tool_registry.py
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def _resolve(reference):
+    """Returns the object named by a 'package.module:attribute' reference."""
+    module_name, attribute = reference.split(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+class ToolRegistry:
+    """
+    The agent's tools, registered by reference so nothing is imported until the agent is built.
+
+    Tool modules keep their heavy dependencies (pyautogui, PIL, numpy, the OpenAI client, Tavily)
+    behind lazy imports, so loading a tool only creates its schema for the model; the dependencies
+    are initialized on the tool's first call. warm_up() does that ahead of time, e.g. in a
+    background thread while the UI is already on screen.
+    """
+
+    def __init__(self):
+        self._references = []
+        self._warm_ups = []
+        self._tools = None
+        self._lock = threading.Lock()
+
+    def register(self, reference, warm_up=None):
+        """
+        Registers a tool.
+
+        Args:
+            reference: 'package.module:attribute' of the tool object.
+            warm_up: Optional 'package.module:function' that initializes the tool's dependencies.
+        """
+        self._references.append(reference)
+        if warm_up and warm_up not in self._warm_ups:
+            self._warm_ups.append(warm_up)
+
+    def tools(self):
+        """Imports and returns the registered tools, in registration order."""
+        with self._lock:
+            if self._tools is None:
+                self._tools = [_resolve(reference) for reference in self._references]
+            return list(self._tools)
+
+    def warm_up(self):
+        """Initializes the heavy dependencies of all tools. Failures are reported, not raised."""
+        for reference in self._warm_ups:
+            start = time.perf_counter()
+            try:
+                _resolve(reference)()
+                logger.info("Warmed up %s in %.2fs", reference, time.perf_counter() - start)
+            except Exception as e:
+                logger.warning("Warm-up of %s failed: %s", reference, e)
+
+registry = ToolRegistry()
+registry.register("tools.web_search:search_on_web_tool", warm_up="tools.web_search:warm_up")
+registry.register("tools.web_search:search_web_multi")
+registry.register("tools.page_reader:read_url")
+registry.register("tools.open_terminal:run_windows_command")
+registry.register("tools.command_output:read_command_output")
+registry.register("tools.ui_automation:click_coordinates", warm_up="tools.ui_automation:warm_up")
+registry.register("tools.screen_reader:describe_screen_content", warm_up="tools.screen_reader:warm_up")
+registry.register("tools.screen_index:find_on_screen", warm_up="tools.screen_index:warm_up")
+registry.register("tools.ui_automation:type_text")
+registry.register("tools.ui_automation:press_key")
+registry.register("tools.ui_automation:execute_ui_actions")
+registry.register("tools.screen_watcher:wait_for_screen_change", warm_up="tools.screen_watcher:warm_up")
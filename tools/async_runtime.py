@@ -0,0 +1,57 @@
+# tools/async_runtime.py
+import asyncio
+import threading
+from tools.lazy_import import lazy_import
+
+# Imported when the first client is created, so importing the tools that use them stays cheap
+httpx = lazy_import("httpx")
+openai = lazy_import("openai")
+
+# Shared event loop for async agent runs and tool work. Pooled async clients are bound to the loop
+# they were created on, so they all live on this one loop, which runs for the lifetime of the process.
+_loop = None
+_loop_lock = threading.Lock()
+_http_client = None
+_openai_client = None
+
+def get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="jarvis-async-runtime", daemon=True).start()
+        return _loop
+
+def run_coroutine(coro, timeout=None):
+    """Runs a coroutine on the shared loop from synchronous code and returns its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
+
+async def run_in_runtime(coro):
+    """Awaits a coroutine on the shared loop from any other event loop."""
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+def get_async_http_client():
+    """Returns the pooled keep-alive HTTP client. Must be called from the shared loop."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60),
+            timeout=httpx.Timeout(20.0, connect=5.0),
+            follow_redirects=True,
+        )
+    return _http_client
+
+def get_async_openai_client():
+    """
+    Returns the pooled AsyncOpenAI client, which keeps its connections to the API alive between
+    calls. Must be called from the shared loop. Raises openai.OpenAIError if no API key is set.
+    """
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = openai.AsyncOpenAI(http_client=openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60),
+        ))
+    return _openai_client
@@ -0,0 +1,139 @@
+# tools/command_output.py
+import os
+import re
+import tempfile
+import uuid
+from collections import deque
+from langchain_core.tools import tool
+
+# Full output of commands that exceed the in-memory windows is kept here
+OUTPUT_DIR = os.path.join(tempfile.gettempdir(), "jarvis-command-output")
+MAX_OUTPUT_FILES = 50
+
+HEAD_BYTES = 8 * 1024
+TAIL_BYTES = 8 * 1024
+MAX_READ_BYTES = 32 * 1024
+
+_OUTPUT_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+def _prune_output_files():
+    try:
+        files = sorted((entry for entry in os.scandir(OUTPUT_DIR) if entry.is_file()), key=lambda entry: entry.stat().st_mtime)
+    except FileNotFoundError:
+        return
+    for entry in files[:-MAX_OUTPUT_FILES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+class OutputCapture:
+    """
+    Captures one output stream of a command with bounded memory.
+
+    The first head_bytes and the last tail_bytes (in a ring buffer) are kept in memory. As soon as
+    the output outgrows both, everything is also streamed to a temp file so the full output can be
+    read back later by byte range with read_command_output.
+    """
+
+    def __init__(self, label, head_bytes=HEAD_BYTES, tail_bytes=TAIL_BYTES):
+        self.label = label
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_size = 0
+        self.total_bytes = 0
+        self.line_count = 0
+        self.output_id = None
+        self._file = None
+
+    @property
+    def truncated(self):
+        return self.total_bytes > len(self.head) + self.tail_size
+
+    @property
+    def path(self):
+        return os.path.join(OUTPUT_DIR, f"{self.output_id}.log") if self.output_id else None
+
+    def write(self, text):
+        data = text.encode("utf-8", errors="replace")
+        self.total_bytes += len(data)
+        self.line_count += text.count("\n")
+
+        if self._file is None and self.total_bytes > self.head_bytes + self.tail_bytes:
+            self._open_file()
+        if self._file is not None:
+            self._file.write(data)
+
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail.append(data)
+            self.tail_size += len(data)
+            while self.tail_size > self.tail_bytes:
+                excess = self.tail_size - self.tail_bytes
+                oldest = self.tail[0]
+                if len(oldest) <= excess:
+                    self.tail.popleft()
+                    self.tail_size -= len(oldest)
+                else:
+                    self.tail[0] = oldest[excess:]
+                    self.tail_size -= excess
+
+    def _open_file(self):
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        _prune_output_files()
+        self.output_id = f"{self.label}-{uuid.uuid4().hex[:12]}"
+        self._file = open(self.path, "wb")
+        # Nothing has been dropped yet, so head + tail is everything so far
+        self._file.write(bytes(self.head))
+        for chunk in self.tail:
+            self._file.write(chunk)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def text(self):
+        """Returns the captured output, with a marker where the middle was left out."""
+        head = bytes(self.head).decode("utf-8", errors="replace")
+        tail = b"".join(self.tail).decode("utf-8", errors="replace")
+        if not self.truncated:
+            return head + tail
+        omitted = self.total_bytes - len(self.head) - self.tail_size
+        return (f"{head}\n[... {omitted} bytes omitted ({self.total_bytes} total). "
+                f"Use read_command_output with output_id='{self.output_id}' to read more ...]\n{tail}")
+
+@tool
+def read_command_output(output_id: str, start: int = 0, length: int = 8192):
+    """Reads part of the full output of an earlier run_windows_command whose output was truncated.
+
+    Args:
+        output_id: The output_id given in the truncation marker of the command output.
+        start: Byte offset to start reading from (negative values count from the end).
+        length: Number of bytes to read (at most 32768).
+
+    Returns:
+        The requested part of the output, or an error message.
+    """
+    if not _OUTPUT_ID.match(output_id):
+        return f"Error: Invalid output_id '{output_id}'."
+    path = os.path.join(OUTPUT_DIR, f"{output_id}.log")
+    try:
+        size = os.path.getsize(path)
+        if start < 0:
+            start = max(0, size + start)
+        length = max(0, min(length, MAX_READ_BYTES))
+        with open(path, "rb") as output_file:
+            output_file.seek(start)
+            data = output_file.read(length)
+        end = start + len(data)
+        return f"Bytes {start}-{end} of {size}:\n{data.decode('utf-8', errors='replace')}"
+    except FileNotFoundError:
+        return f"Error: No saved output with id '{output_id}' (it may have been cleaned up)."
+    except Exception as e:
+        return f"Error reading command output '{output_id}': {e}"
@@ -0,0 +1,571 @@
+# tools/command_policy.py
+"""
+Classifies the commands run_windows_command is asked to run, before anything is started.
+
+A command line is split into its simple commands (at &&, ||, |, & and ;, outside quotes), and each
+one is looked up by program name:
+
+- read_only: every part is on the allowlist below with arguments that only read, and nothing is
+  redirected into a file. The result may be cached for the shell session.
+- dangerous: some part matches the denylist (formatting disks, recursively deleting system
+  folders, shutting down, piping a download into a shell, ...). It is refused without running it.
+- mutating: everything else, including anything that can't be analyzed. It runs normally and
+  invalidates the session's cached results.
+
+Commands run through a shell ("bash -c ...", "cmd /c ...", "powershell -Command ...") or a wrapper
+(sudo, env, xargs, eval, ...) and command substitutions ($(...), `...`) are classified by the
+commands they run, so wrapping a denylisted command doesn't get it past the check.
+"""
+import os
+import re
+import time
+from collections import OrderedDict
+
+# Seconds a read-only command's result is reused; 0 turns reuse off
+CACHE_TTL = float(os.getenv("JARVIS_COMMAND_CACHE_TTL", "30"))
+
+READ_ONLY = "read_only"
+MUTATING = "mutating"
+DANGEROUS = "dangerous"
+
+# Programs that only read, whatever their arguments (cmd.exe and POSIX). Programs whose arguments
+# decide whether they write (git, find, sed, ...) are handled in _read_only.
+READ_ONLY_PROGRAMS = frozenset("""
+dir type more tree where whoami hostname ver vol systeminfo findstr fc comp driverquery getmac
+ls cat head tail wc grep egrep fgrep rg pwd stat file du df uname id which whereis printenv
+diff cmp md5sum sha1sum sha256sum realpath readlink basename dirname lsblk uniq cut tr nl echo
+""".split())
+
+# Read-only programs whose output changes from moment to moment, so it is never reused
+VOLATILE_PROGRAMS = frozenset("tasklist netstat ps uptime free date time".split())
+
+# Files a command may be redirected into without writing anything
+NULL_DEVICES = frozenset(["nul", "/dev/null"])
+
+# POSIX find actions that delete or run a command on each file found
+FIND_ACTIONS = frozenset(["-delete", "-exec", "-execdir", "-ok", "-okdir"])
+
+GIT_READ_ONLY = frozenset("""
+status log diff show rev-parse ls-files ls-tree blame describe shortlog grep cat-file show-ref
+""".split())
+# git subcommands that only list when given no names
+GIT_LISTING = {
+    "branch": {"-a", "-r", "-v", "-vv", "-l", "--list", "--all", "--remotes", "--show-current", "--no-color"},
+    "tag": {"-l", "--list", "-n"},
+    "remote": {"-v", "--verbose"},
+    "stash": {"list"},
+}
+# git options that come before the subcommand and take a value
+GIT_VALUE_OPTIONS = frozenset(["-C", "--git-dir", "--work-tree"])
+# git options that set configuration, which can make any subcommand run a program (core.fsmonitor, core.pager, ...)
+GIT_CONFIG_OPTIONS = ("-c", "--config-env")
+
+# Folders whose recursive deletion or permission change is refused: drive and file system roots,
+# home folders and system folders (the folders themselves or all of their contents, not subfolders).
+# The root is never empty: a bare "*" or "" is the current folder, which isn't known to be protected.
+PROTECTED_PATH = re.compile(
+    r"""^(
+        [a-z]:\\? | \\ | / | ~ | \$home | \$env:userprofile | %userprofile% | %systemroot% | %systemdrive%\\? | %programfiles%
+        | [a-z]:\\(windows|users|users\\[^\\]+|program\ files|program\ files\ \(x86\)|programdata)
+        | /(bin|boot|dev|etc|home|home/[^/]+|lib|lib64|opt|proc|root|sbin|srv|sys|usr|var)
+    )([\\/]\*?|\*)?$""",
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Always refused, with the reason given to the agent
+DANGEROUS_PROGRAMS = {
+    "format": "formats a disk",
+    "diskpart": "repartitions disks",
+    "fdisk": "repartitions disks",
+    "sfdisk": "repartitions disks",
+    "parted": "repartitions disks",
+    "wipefs": "erases disk signatures",
+    "bcdedit": "changes the boot configuration",
+    "bootrec": "changes the boot configuration",
+    "shutdown": "shuts down or restarts the computer",
+    "reboot": "restarts the computer",
+    "poweroff": "shuts down the computer",
+    "halt": "shuts down the computer",
+    "logoff": "signs the user out",
+    "sdelete": "securely wipes files",
+    # PowerShell cmdlets
+    "format-volume": "formats a disk",
+    "clear-disk": "erases a disk",
+    "initialize-disk": "repartitions disks",
+    "remove-partition": "repartitions disks",
+    "stop-computer": "shuts down the computer",
+    "restart-computer": "restarts the computer",
+}
+
+DOWNLOADERS = frozenset(["curl", "wget", "iwr", "irm", "invoke-webrequest", "invoke-restmethod"])
+SHELLS = frozenset(["sh", "bash", "zsh", "dash", "cmd", "powershell", "pwsh", "iex", "invoke-expression", "python", "python3"])
+
+# Programs that run the command given as their arguments
+WRAPPERS = frozenset(["sudo", "runas", "doas", "start", "call", "nohup", "xargs", "timeout", "watch", "env", "nice", "ionice",
+                      "exec", "command", "time", "stdbuf", "eval"])
+# Wrapper options that take a value, so the word after them isn't the command
+WRAPPER_VALUE_OPTIONS = {
+    "sudo": frozenset(["-u", "-g", "-h", "-p", "-C", "-D", "-r", "-t", "-T", "-U", "--user", "--group", "--host", "--prompt",
+                       "--close-from", "--chdir", "--role", "--type", "--command-timeout", "--other-user"]),
+    "doas": frozenset(["-u", "-C"]),
+    "timeout": frozenset(["-s", "-k", "--signal", "--kill-after"]),
+    "env": frozenset(["-u", "-C", "--unset", "--chdir"]),
+    "nice": frozenset(["-n", "--adjustment"]),
+    "ionice": frozenset(["-c", "-n", "--class", "--classdata"]),
+    "exec": frozenset(["-a"]),
+    "time": frozenset(["-f", "-o", "--format", "--output"]),
+    "stdbuf": frozenset(["-i", "-o", "-e", "--input", "--output", "--error"]),
+    "xargs": frozenset(["-a", "-d", "-E", "-I", "-L", "-n", "-P", "-s", "--arg-file", "--delimiter", "--max-lines",
+                        "--max-args", "--max-procs", "--max-chars", "--process-slot-var"]),
+    "watch": frozenset(["-n", "-q", "--interval", "--equexit"]),
+}
+# Windows wrappers, whose options start with a slash ("runas /user:Administrator ...")
+WINDOWS_WRAPPERS = frozenset(["runas", "start", "call"])
+# Shells that run the command line given as an argument, and the option introducing it
+POSIX_SHELLS = frozenset(["sh", "bash", "zsh", "dash", "ksh"])
+POWERSHELLS = frozenset(["powershell", "pwsh"])
+# PowerShell options that take a value, so the word after them isn't the command
+POWERSHELL_VALUE_OPTIONS = frozenset(["-executionpolicy", "-ep", "-ex", "-windowstyle", "-w", "-workingdirectory", "-wd",
+                                      "-configurationname", "-inputformat", "-outputformat", "-of", "-if", "-psconsolefile"])
+# Raw disk devices, which redirecting into overwrites
+DISK_DEVICE = re.compile(r"^(/dev/(sd|hd|vd|nvme|disk|mmcblk)|\\\\\.\\physicaldrive)", re.IGNORECASE)
+
+_OPERATOR = re.compile(r"&&|\|\||[|&;\n]")
+# A redirection such as ">", ">>", "2>" or "2>&1", at the start of a word
+_REDIRECT = re.compile(r"^(\d?)(>>?|<)(.*)$")
+_REDIRECT_OPERATOR = re.compile(r">>?(&\d)?|<")
+# A shell variable assignment ("NAME=value")
+_ASSIGNMENT = re.compile(r"^[A-Za-z_]\w*=")
+# Start of a command substitution: $(...) in POSIX shells and PowerShell, <(...) and >(...) in bash
+_SUBSTITUTION = re.compile(r"\$\(|[<>]\(")
+
+class Classification:
+    """
+    The verdict on a command line.
+
+    Args:
+        kind: READ_ONLY, MUTATING or DANGEROUS.
+        reason: Why, for logs and for the refusal message.
+        cacheable: Whether a read-only result may be reused.
+    """
+
+    def __init__(self, kind, reason, cacheable=False):
+        self.kind = kind
+        self.reason = reason
+        self.cacheable = cacheable
+
+    def __repr__(self):
+        return f"Classification({self.kind!r}, {self.reason!r}, cacheable={self.cacheable})"
+
+def split_command(command):
+    """
+    Splits a command line into its simple commands.
+
+    Returns:
+        A list of (operator before it, list of words) tuples, or None if the line uses syntax that
+        isn't analyzed (command substitution, unbalanced quotes).
+    """
+    if "`" in command or "$(" in command or "<(" in command:
+        return None
+    segments = []
+    words = []
+    word = ""
+    in_word = False
+    quote = None
+    operator = None
+    position = 0
+    while position < len(command):
+        character = command[position]
+        if quote:
+            if character == quote:
+                quote = None
+            else:
+                word += character
+            position += 1
+            continue
+        if character in "\"'":
+            quote = character
+            in_word = True
+            position += 1
+            continue
+        if character in "<>":
+            # A redirection ends the word before it, unless that is its stream number ("2>")
+            redirect = _REDIRECT_OPERATOR.match(command, position)
+            prefix = word if in_word and word.isdigit() else ""
+            if in_word and not prefix:
+                words.append(word)
+            words.append(prefix + redirect.group())
+            word, in_word = "", False
+            position = redirect.end()
+            continue
+        match = _OPERATOR.match(command, position)
+        if match:
+            if in_word:
+                words.append(word)
+            if words:
+                segments.append((operator, words))
+            operator, words, word, in_word = match.group(), [], "", False
+            position = match.end()
+            continue
+        if character.isspace():
+            if in_word:
+                words.append(word)
+            word, in_word = "", False
+        else:
+            word += character
+            in_word = True
+        position += 1
+    if quote:
+        return None
+    if in_word:
+        words.append(word)
+    if words:
+        segments.append((operator, words))
+    return segments
+
+def _program(word):
+    # "C:\Windows\System32\ipconfig.exe" and "/usr/bin/ls" are ipconfig and ls; cmd.exe ignores case and a leading @
+    name = re.split(r"[\\/]", word.lstrip("@"))[-1].lower()
+    return name[:-4] if name.endswith((".exe", ".com")) else name
+
+def _shell_command(program, arguments):
+    """
+    Returns the command line a shell is asked to run ("bash -c ...", "cmd /c ...", "powershell
+    -Command ..."), '' if the shell runs a script or reads commands from its input, or None if
+    program isn't a shell.
+    """
+    lowered = [argument.lower() for argument in arguments]
+    if program in POSIX_SHELLS:
+        # -c may be combined with other single-letter options ("-lc", "-ec"); only the next word is the command
+        for position, argument in enumerate(lowered):
+            if not argument.startswith("-"):
+                return ""
+            if not argument.startswith("--") and "c" in argument[1:]:
+                return arguments[position + 1] if position + 1 < len(arguments) else ""
+        return ""
+    if program == "cmd":
+        for position, argument in enumerate(lowered):
+            if argument in ("/c", "/k", "/r"):
+                return _join(arguments[position + 1:])
+        return ""
+    if program in POWERSHELLS:
+        position = 0
+        while position < len(lowered):
+            argument = lowered[position]
+            if argument == "-c" or (len(argument) > 2 and "-command".startswith(argument)):
+                return _join(arguments[position + 1:])
+            if argument in ("-f", "-file") or (len(argument) > 2 and "-file".startswith(argument)):
+                return ""
+            if not argument.startswith("-"):
+                # Windows PowerShell runs the words after its options as a command; pwsh runs them as a script
+                return _join(arguments[position:]) if program == "powershell" else ""
+            position += 2 if argument in POWERSHELL_VALUE_OPTIONS else 1
+        return ""
+    return None
+
+def _wrapped_command(program, arguments):
+    """
+    Returns the command line a wrapper (sudo, env, xargs, eval, ...) runs, '' if it runs none, or
+    None if program isn't a wrapper.
+    """
+    if program not in WRAPPERS or (program == "time" and arguments[:1] and arguments[0].startswith("/")):
+        # cmd.exe's "time /t" prints the time
+        return None
+    if program == "eval":
+        # eval joins its arguments and runs them as a command line
+        return " ".join(arguments)
+    value_options = WRAPPER_VALUE_OPTIONS.get(program, frozenset())
+    position = 0
+    while position < len(arguments):
+        argument = arguments[position]
+        if argument == "--":
+            position += 1
+            break
+        if program == "env" and (argument in ("-S", "--split-string") or argument.startswith(("-S", "--split-string="))):
+            # env -S splits its value into the command and its first arguments
+            value = argument.split("=", 1)[1] if argument.startswith("--") else argument[2:]
+            return " ".join(([value] if value else []) + arguments[position + 1:])
+        if argument.startswith("-") and len(argument) > 1:
+            position += 2 if argument in value_options else 1
+        elif program in WINDOWS_WRAPPERS and argument.startswith("/"):
+            position += 1
+        elif program == "env" and _ASSIGNMENT.match(argument):
+            position += 1
+        elif program in ("timeout", "watch") and re.fullmatch(r"\d+(\.\d+)?[smhd]?", argument):
+            position += 1
+        else:
+            break
+    return _join(arguments[position:])
+
+def _join(words):
+    """Joins words back into a command line, quoting those that split_command would split."""
+    if len(words) == 1:
+        # A single (quoted) word is the whole command line, as in cmd /c "del /s x"
+        return words[0]
+    return " ".join(f'"{word}"' if re.search(r"[\s&|;<>]", word) and '"' not in word else word for word in words)
+
+def _substitutions(command):
+    """
+    Takes the command substitutions ($(...), `...`, <(...)) out of a command line.
+
+    Returns:
+        (the command line with each substitution replaced by a placeholder word, list of the
+        command lines substituted), or None if a substitution isn't closed.
+    """
+    outer, inner = "", []
+    position = 0
+    while position < len(command):
+        if command[position] == "`":
+            end = command.find("`", position + 1)
+            if end < 0:
+                return None
+            inner.append(command[position + 1:end])
+            outer += " _ "
+            position = end + 1
+            continue
+        match = _SUBSTITUTION.match(command, position)
+        if not match:
+            outer += command[position]
+            position += 1
+            continue
+        depth, end = 1, match.end()
+        while end < len(command) and depth:
+            depth += {"(": 1, ")": -1}.get(command[end], 0)
+            end += 1
+        if depth:
+            return None
+        inner.append(command[match.end():end - 1])
+        outer += " _ "
+        position = end
+    return outer, inner
+
+def _mentions_dangerous_program(command):
+    """Returns a denylisted program named anywhere in a command line that can't be split, or None."""
+    for word in re.split(r"[\s;&|()`'\"$<>{}]+", command):
+        program = _program(word) if word else ""
+        if program in DANGEROUS_PROGRAMS or program.startswith("mkfs"):
+            return program
+    return None
+
+def _redirections(words):
+    """Splits redirections off a simple command's words. Returns (arguments, files written to)."""
+    arguments, targets = [], []
+    words = iter(words)
+    for word in words:
+        match = _REDIRECT.match(word)
+        if not match:
+            arguments.append(word)
+            continue
+        target = match.group(3) or next(words, "")
+        if match.group(2) != "<" and not target.startswith("&"):
+            targets.append(target)
+    return arguments, targets
+
+def _dangerous_reason(program, arguments, previous_program, operator):
+    """Returns why a simple command is dangerous, or None."""
+    lowered = [argument.lower() for argument in arguments]
+    if program in DANGEROUS_PROGRAMS:
+        return DANGEROUS_PROGRAMS[program]
+    if program.startswith("mkfs"):
+        return "formats a disk"
+    if program == "init" and lowered[:1] in (["0"], ["6"]):
+        return "shuts down or restarts the computer"
+    if operator == "|" and previous_program in DOWNLOADERS and program in SHELLS:
+        return "runs a script downloaded from the internet"
+    if program in ("powershell", "pwsh") and any(argument in ("-e", "-ec", "-enc", "-encodedcommand") for argument in lowered):
+        return "runs an encoded (hidden) PowerShell command"
+    if program == "dd" and any(argument.startswith("of=/dev/") for argument in lowered):
+        return "overwrites a disk device"
+    if program == "cipher" and any(argument.startswith("/w") for argument in lowered):
+        return "wipes free disk space"
+    if program in ("vssadmin", "wbadmin") and "delete" in lowered:
+        return "deletes system backups"
+    if program == "wmic" and "shadowcopy" in lowered and "delete" in lowered:
+        return "deletes system backups"
+    if program == "reg" and lowered[:1] in (["delete"], ["add"], ["import"]) and any(
+            argument.startswith(("hklm", "hkey_local_machine")) for argument in lowered):
+        return "changes the system registry"
+    if program == "sc" and lowered[:1] == ["delete"]:
+        return "deletes a system service"
+    if program == "net" and "/add" in lowered and lowered[:1] in (["user"], ["localgroup"]):
+        return "creates user accounts or grants group membership"
+    recursive = any(argument in ("--recursive", "/s") or re.fullmatch(r"-[a-z]*r[a-z]*", argument) for argument in lowered)
+    if recursive and program in ("rm", "rd", "rmdir", "del", "erase", "remove-item", "ri", "chmod", "chown", "icacls", "takeown") \
+            and any(PROTECTED_PATH.match(argument) for argument in arguments):
+        return "recursively deletes or changes permissions of a system, home or root folder"
+    if program in ("rm", "del", "erase") and any(PROTECTED_PATH.match(argument) and argument.endswith("*") for argument in arguments):
+        return "deletes the contents of a system, home or root folder"
+    if program == "find" and any(argument in FIND_ACTIONS for argument in lowered) \
+            and any(PROTECTED_PATH.match(path) for path in _find_start_paths(arguments)):
+        return "deletes or runs a command on everything in a system, home or root folder"
+    return None
+
+def _find_start_paths(arguments):
+    """Returns the folders a POSIX find command searches: the words before its first expression."""
+    paths = []
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument in ("-H", "-L", "-P") or argument.startswith("-O"):
+            continue
+        if argument == "-D":
+            next(arguments, None)
+            continue
+        if argument.startswith(("-", "(", "!", ")")):
+            break
+        paths.append(argument)
+    return paths
+
+def _read_only(program, arguments):
+    """Returns (whether a simple command only reads, whether its output is stable enough to reuse)."""
+    lowered = [argument.lower() for argument in arguments]
+    if program in ("cd", "chdir"):
+        return not arguments, True
+    if program == "set":
+        # Without arguments, or in cmd.exe with a name prefix ("set PATH"), it only lists variables
+        return not arguments or (len(arguments) == 1 and re.fullmatch(r"\w+", arguments[0]) is not None), True
+    if program in ("env", "export", "path"):
+        return not arguments, True
+    if program == "ipconfig":
+        return all(argument in ("/all", "-all", "/displaydns") for argument in lowered), True
+    if program in ("date", "time"):
+        # Without /t, cmd.exe's date and time ask for a new value; POSIX date may only format the time
+        return all(argument in ("/t", "-u", "--utc") or argument.startswith("+") for argument in lowered), False
+    if program in VOLATILE_PROGRAMS:
+        return True, False
+    if program == "find":
+        # cmd.exe's find searches text; POSIX find can delete or run commands
+        return not any(argument in FIND_ACTIONS or argument in ("-fprint", "-fprint0", "-fprintf", "-fls")
+                       for argument in lowered), True
+    if program == "sort":
+        return not any(argument == "-o" or argument.startswith("--output") or argument == "/o" for argument in lowered), True
+    if program == "sed":
+        return not any(argument.startswith("-i") or argument == "--in-place" for argument in lowered), True
+    if program == "git":
+        return _git_read_only(arguments), True
+    if program in ("pip", "pip3"):
+        return lowered[:1] in (["list"], ["show"], ["freeze"], ["--version"], ["-v"]), True
+    if program in ("python", "python3", "py", "node", "java", "npm", "go", "rustc", "cargo", "dotnet", "gcc"):
+        return lowered in (["--version"], ["-v"], ["-version"]), True
+    return program in READ_ONLY_PROGRAMS, True
+
+def _git_read_only(arguments):
+    arguments = list(arguments)
+    while arguments and arguments[0].startswith("-"):
+        option = arguments.pop(0)
+        if option.startswith(GIT_CONFIG_OPTIONS):
+            return False
+        if option in GIT_VALUE_OPTIONS and arguments:
+            arguments.pop(0)
+    if not arguments:
+        return False
+    subcommand, rest = arguments[0].lower(), arguments[1:]
+    if any(argument.startswith("--output") for argument in rest):
+        return False
+    if subcommand in GIT_READ_ONLY:
+        return True
+    if subcommand == "config":
+        return any(argument in ("--get", "--get-all", "--get-regexp", "--list", "-l") for argument in rest)
+    listing = GIT_LISTING.get(subcommand)
+    return listing is not None and all(argument in listing for argument in rest)
+
+def classify_command(command):
+    """
+    Classifies a command line as READ_ONLY, MUTATING or DANGEROUS.
+
+    Returns:
+        A Classification.
+    """
+    if ":(){" in command.replace(" ", ""):
+        return Classification(DANGEROUS, "is a fork bomb")
+    segments = split_command(command)
+    if segments is None:
+        return _classify_unsplit(command)
+    if not segments:
+        return Classification(MUTATING, "is empty")
+
+    kind, reason, cacheable = READ_ONLY, "only reads", True
+    previous_program = None
+    for operator, words in segments:
+        arguments, targets = _redirections(words)
+        # Variables assigned for one command ("FOO=1 make") come before its name and may change what it does
+        assignments = 0
+        while assignments < len(arguments) - 1 and _ASSIGNMENT.match(arguments[assignments]):
+            assignments += 1
+        if assignments:
+            arguments = arguments[assignments:]
+            kind, reason = MUTATING, "sets environment variables for a command"
+        program, arguments = (_program(arguments[0]), arguments[1:]) if arguments else ("", [])
+        if any(DISK_DEVICE.match(target) for target in targets):
+            return Classification(DANGEROUS, "writes directly to a disk device")
+        danger = _dangerous_reason(program, arguments, previous_program, operator)
+        if danger:
+            return Classification(DANGEROUS, f"'{program}' {danger}")
+        nested_command = _shell_command(program, arguments) or _wrapped_command(program, arguments)
+        if nested_command:
+            # Judge the command they run; the shell or wrapper itself counts as mutating at least
+            nested = classify_command(nested_command)
+            if nested.kind == DANGEROUS:
+                return nested
+            kind, reason = MUTATING, f"'{program}' runs another command"
+        elif kind == READ_ONLY and any(target.lower() not in NULL_DEVICES for target in targets):
+            kind, reason = MUTATING, "writes output to a file"
+        elif kind == READ_ONLY and program:
+            only_reads, stable = _read_only(program, arguments)
+            if not only_reads:
+                kind, reason = MUTATING, f"'{program}' isn't known to only read"
+            cacheable = cacheable and stable
+        previous_program = program or None
+    return Classification(kind, reason, cacheable=kind == READ_ONLY and cacheable)
+
+def _classify_unsplit(command):
+    """Classifies a command line split_command can't analyze (command substitution, unbalanced quotes)."""
+    taken_apart = _substitutions(command)
+    if taken_apart is not None and taken_apart[1]:
+        outer, inner = taken_apart
+        # The substituted commands run first, wherever they appear (even inside double quotes)
+        for nested in [*inner, outer]:
+            classification = classify_command(nested)
+            if classification.kind == DANGEROUS:
+                return classification
+        return Classification(MUTATING, "uses command substitution")
+    program = _mentions_dangerous_program(command)
+    if program:
+        return Classification(DANGEROUS, f"mentions '{program}' in syntax that isn't analyzed")
+    return Classification(MUTATING, "uses syntax that isn't analyzed")
+
+class CommandResultCache:
+    """
+    Results of read-only commands in one shell session, reused for ttl seconds or until a command
+    that may change something runs in the session.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # command -> (result, time stored)
+
+    def get(self, command):
+        """Returns (result, age in seconds) for a command, or None."""
+        entry = self._entries.get(command.strip())
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[1]
+        if age > self.ttl:
+            del self._entries[command.strip()]
+            return None
+        self._entries.move_to_end(command.strip())
+        return entry[0], age
+
+    def put(self, command, result):
+        if self.ttl <= 0:
+            return
+        self._entries[command.strip()] = (result, time.monotonic())
+        self._entries.move_to_end(command.strip())
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
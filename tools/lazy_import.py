@@ -0,0 +1,34 @@
+# tools/lazy_import.py
+import importlib
+import threading
+
+class LazyModule:
+    """
+    Stands in for a module that is imported on first attribute access.
+
+    Tool modules use it for heavy dependencies (pyautogui, PIL, numpy, ...) so that importing a tool
+    only defines its schema, and the dependency is loaded when the tool first runs.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Imports the module (once) and returns it."""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy_import(name):
+    return LazyModule(name)
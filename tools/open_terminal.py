@@ -1,43 +1,167 @@
-import subprocess
+import asyncio
+import logging
+import time
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
-import shlex # For safer command splitting if needed, though shell=True bypasses this here
+from langgraph.config import get_stream_writer
+from tools.command_policy import classify_command, DANGEROUS, READ_ONLY
+from tools.shell_sessions import shell_pool, IS_WINDOWS
+from tools.tool_results import key_values
+from tracing import record_step_metric
+
+logger = logging.getLogger(__name__)
+
+COMMAND_TIMEOUT = 60
+# Minimum seconds between progress updates sent to the UI
+PROGRESS_INTERVAL = 0.5
+# How often an async call checks whether the conversation's shell is free
+LOCK_POLL_INTERVAL = 0.05
+
+def _progress_reporter(command):
+    """Returns an on_output callback that streams throttled progress of a running command to the UI."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        # Not running inside the agent graph
+        return None
+    state = {"lines": 0, "last_sent": 0.0}
+
+    def on_output(stream, line):
+        state["lines"] += 1
+        now = time.monotonic()
+        if now - state["last_sent"] >= PROGRESS_INTERVAL:
+            state["last_sent"] = now
+            writer({"tool": "run_windows_command", "command": command, "lines": state["lines"], "last_line": line.rstrip()[-200:]})
+    return on_output
+
 @tool
-def run_windows_command(command: str):
-    """Executes a given command in the Windows terminal (cmd.exe).
+def run_windows_command(command: str, config: RunnableConfig, fresh: bool = False):
+    """Executes a given command in the terminal (cmd.exe on Windows, bash elsewhere).
 
     🚨 SECURITY WARNING: This tool allows the execution of arbitrary commands
     on the system where the agent is running. This is potentially VERY DANGEROUS.
     Enable and use with extreme caution.
     It can be used for tasks like changing directories (cd), listing files (dir),
     creating directories (mkdir), deleting files (del), etc.
+    Commands run in a persistent shell for this conversation, so the current directory
+    and environment variables set by earlier commands are kept (no need to repeat 'cd ... &&').
+    Commands that could destroy the system (formatting disks, deleting system or home folders,
+    shutting down, ...) are refused. Results of read-only commands (dir, ipconfig, git status, ...)
+    are reused for a short time while no other command has run in the shell.
 
     Args:
-        command: The command string to execute (e.g., 'dir C:\\Users', 'cd D:\\projects && dir', 'del temp.txt').
+        command: The command string to execute (e.g., 'dir C:\\Users', 'cd D:\\projects', 'del temp.txt').
+        fresh: Run a read-only command again even if its result could be reused, e.g. because
+               files were changed outside the terminal.
 
     Returns:
-        A string containing the standard output and standard error from the command execution.
+        'exit=<code>' followed by the command's standard output and, if any, its standard error.
+        Very long output is shortened to its beginning and end; use read_command_output to read the rest.
     """
     if not command:
         return "Error: No command provided."
 
-    print(f"Executing Windows command: {command}")
+    # Each conversation thread gets its own long-lived shell
+    session_key = config.get("configurable", {}).get("thread_id", "default")
+
+    classification = classify_command(command)
+    if classification.kind == DANGEROUS:
+        return _refuse(command, classification)
+
+    logger.info("Executing %s command (%s): %s", "Windows" if IS_WINDOWS else "shell", classification.kind, command)
     try:
-        # Using shell=True is necessary for commands like 'cd' to work across a single logical execution,
-        # but it carries security risks if the command string is constructed from untrusted input.
-        # Ensure the commands generated by the LLM are carefully reviewed or constrained.
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, check=False, timeout=60)
-
-        output = f"Command: {command}\nExit Code: {result.returncode}\n"
-        if result.stdout:
-            output += f"--- stdout ---\n{result.stdout.strip()}\n"
-        if result.stderr:
-            output += f"--- stderr ---\n{result.stderr.strip()}\n"
-
-        return output.strip()
-
-    except FileNotFoundError:
-        return f"Error: Command not found or invalid command structure: {command}"
-    except subprocess.TimeoutExpired:
-        return f"Error: Command '{command}' timed out after 60 seconds."
+        # The command runs through a shell, which carries security risks if the command string is
+        # constructed from untrusted input. Ensure the commands generated by the LLM are carefully reviewed or constrained.
+        session = shell_pool.get(session_key)
+        with session.lock:
+            cached = _reuse_result(session, command, classification, fresh)
+            if cached is not None:
+                return cached
+            exit_code, stdout, stderr = session.run(command, timeout=COMMAND_TIMEOUT, on_output=_progress_reporter(command))
+            return _finish(command, classification, session, session_key, exit_code, stdout, stderr)
+
     except Exception as e:
         return f"Error executing command '{command}': {e}"
+
+async def _arun_windows_command(command: str, config: RunnableConfig, fresh: bool = False):
+    if not command:
+        return "Error: No command provided."
+
+    session_key = config.get("configurable", {}).get("thread_id", "default")
+
+    classification = classify_command(command)
+    if classification.kind == DANGEROUS:
+        return _refuse(command, classification)
+
+    logger.info("Executing %s command (%s): %s", "Windows" if IS_WINDOWS else "shell", classification.kind, command)
+    try:
+        # Starting a new shell waits for its banner, so that happens off the event loop
+        session = await asyncio.to_thread(shell_pool.get, session_key)
+        while not session.lock.acquire(blocking=False):
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            cached = _reuse_result(session, command, classification, fresh)
+            if cached is not None:
+                return cached
+            exit_code, stdout, stderr = await session.arun(command, timeout=COMMAND_TIMEOUT, on_output=_progress_reporter(command))
+            return _finish(command, classification, session, session_key, exit_code, stdout, stderr)
+        except asyncio.CancelledError:
+            # The command is still running; a fresh shell keeps its output out of the next command
+            shell_pool.discard(session_key)
+            raise
+        finally:
+            session.lock.release()
+
+    except Exception as e:
+        return f"Error executing command '{command}': {e}"
+
+# Async callers (ainvoke) wait for the command's output without holding a worker thread
+run_windows_command.coroutine = _arun_windows_command
+
+def _refuse(command, classification):
+    logger.warning("Refused dangerous command (%s): %s", classification.reason, command)
+    record_step_metric("commands_refused", 1)
+    return (f"Error: Refused to run '{command}': {classification.reason}. Commands like this are blocked; "
+            "if it is really needed, ask the user to run it themselves.")
+
+def _reuse_result(session, command, classification, fresh):
+    """Returns the session's recent result of a read-only command, or None if it has to run. Call with session.lock held."""
+    if fresh or not classification.cacheable:
+        return None
+    cached = session.results.get(command)
+    if cached is None:
+        return None
+    result, age = cached
+    logger.debug("Reusing the result of %r from %.1fs ago", command, age)
+    record_step_metric("command_cache_hits", 1)
+    return f"{result}\n(cached {age:.0f}s ago, nothing changed since; fresh=True reruns it)"
+
+def _finish(command, classification, session, session_key, exit_code, stdout, stderr):
+    """Formats a finished command's result, and caches it or invalidates the cache. Call with session.lock held."""
+    if classification.kind != READ_ONLY:
+        # Anything it changed may change what the cached commands would print
+        session.results.clear()
+    result = _format_result(command, session, session_key, exit_code, stdout, stderr)
+    if classification.cacheable and exit_code == 0:
+        session.results.put(command, result)
+    return result
+
+def _format_result(command, session, session_key, exit_code, stdout, stderr):
+    """Builds the tool's result for a finished (or timed out) command."""
+    if exit_code is None:
+        # The shell is stuck on (or was killed by) the command; the next command gets a fresh shell
+        shell_pool.discard(session_key)
+        if session.is_alive():
+            return f"Error: Command '{command}' timed out after {COMMAND_TIMEOUT} seconds. The shell was restarted, so earlier 'cd' and variables are lost."
+        return "The shell exited. A new shell will be started for the next command."
+
+    # The model knows the command it sent, so only the exit code and the output are returned.
+    # Large outputs are cut to their head and tail; the full text stays readable via read_command_output
+    output = key_values(exit=exit_code) + "\n"
+    if stdout.text().strip():
+        output += f"{stdout.text().strip()}\n"
+    if stderr.text().strip():
+        output += f"--- stderr ---\n{stderr.text().strip()}\n"
+
+    return output.strip()
+
@@ -0,0 +1,351 @@
+# tools/page_reader.py
+import asyncio
+import codecs
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from langchain_core.tools import tool
+from tools.async_runtime import get_async_http_client, run_in_runtime
+from tools.lazy_import import lazy_import
+from tool_executor import read_only
+
+# Imported when the first page is read
+httpx = lazy_import("httpx")
+
+CACHE_DIR = os.getenv("JARVIS_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".jarvis_cache"))
+PAGE_CACHE_DIR = os.path.join(CACHE_DIR, "pages")
+MAX_CACHED_PAGES = 200
+
+MAX_DOWNLOAD_BYTES = 2 * 1024 * 1024 # Stop reading a response after this many bytes
+MAX_TEXT_CHARS = 200_000 # Stop extracting once this much text was found
+FRESH_SECONDS = 300 # Cached pages younger than this are served without revalidating
+DEFAULT_READ_CHARS = 8000
+EXTRACTOR_VERSION = 3 # Bump when TextExtractor changes so pages cached with the old rules are fetched again
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Jarvis/1.0"
+REQUEST_HEADERS = {"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5"}
+
+# One keep-alive connection pool for every page read
+_client = None
+_client_lock = threading.Lock()
+
+def _get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                headers=REQUEST_HEADERS,
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=8, keepalive_expiry=60),
+                timeout=httpx.Timeout(15.0, connect=5.0),
+                follow_redirects=True,
+            )
+        return _client
+
+class TextExtractor(HTMLParser):
+    """
+    Incremental HTML to text converter. Feed it chunks as they arrive; markup, scripts, styles and
+    page chrome (navigation, headers, footers) are dropped and block elements become line breaks.
+    Form controls are dropped but the contents of <form> are kept, since some sites wrap the whole body in one.
+    """
+
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "nav", "footer",
+                 "button", "select", "textarea", "datalist"}
+    # Tags that may appear in <head>; any other tag starts the body, as pages may leave out </head>
+    HEAD_TAGS = {"title", "meta", "link", "style", "script", "noscript", "base", "template"}
+    BLOCK_TAGS = {"p", "div", "section", "article", "main", "aside", "header", "br", "hr", "li", "ul", "ol", "table", "tr",
+                  "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "dd", "dt", "figcaption"}
+    VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "area", "base", "col", "embed", "source", "track", "wbr"}
+
+    def __init__(self, max_chars=MAX_TEXT_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+        self.title = ""
+        self._skip_depth = 0
+        self._in_head = False
+        self._in_title = False
+
+    @property
+    def full(self):
+        return self.size >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "head":
+            self._in_head = True
+            return
+        if self._in_head and tag not in self.HEAD_TAGS:
+            self._in_head = False
+        if tag == "title":
+            self._in_title = True
+        if tag in self.VOID_TAGS:
+            if tag in self.BLOCK_TAGS:
+                self._append("\n")
+            return
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self._in_head = False
+            return
+        if tag == "title":
+            self._in_title = False
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self.BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            if self._in_head:
+                # Text can't be in the head either, so it starts the body
+                if not data.strip():
+                    return
+                self._in_head = False
+            self._append(data)
+
+    def close(self):
+        if self.rawdata.startswith("<") and ">" not in self.rawdata:
+            # A tag cut off at the end of a truncated body isn't text
+            self.rawdata = ""
+        super().close()
+
+    def _append(self, text):
+        if not self.full:
+            self.parts.append(text)
+            self.size += len(text)
+
+    def text(self):
+        text = "".join(self.parts)
+        text = re.sub(r"[ \t\r\f\v]+", " ", text)
+        text = re.sub(r" *\n[ \n]*", "\n", text)
+        # Keep paragraph breaks but collapse runs of blank lines
+        return re.sub(r"\n{3,}", "\n\n", text).strip()[:self.max_chars]
+
+def _cache_path(url):
+    return os.path.join(PAGE_CACHE_DIR, hashlib.sha256(url.encode("utf-8")).hexdigest()[:32] + ".json")
+
+def _load_cached(url):
+    try:
+        with open(_cache_path(url), "r", encoding="utf-8") as cache_file:
+            page = json.load(cache_file)
+        if page.get("url") != url or page.get("extractor_version") != EXTRACTOR_VERSION:
+            return None
+        return page
+    except (OSError, ValueError):
+        return None
+
+def _store_cached(page):
+    os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+    path = _cache_path(page["url"])
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as cache_file:
+        json.dump(page, cache_file)
+    os.replace(temp_path, path)
+    _prune_cache()
+
+def _prune_cache():
+    try:
+        files = sorted((entry for entry in os.scandir(PAGE_CACHE_DIR) if entry.name.endswith(".json")), key=lambda entry: entry.stat().st_mtime)
+    except FileNotFoundError:
+        return
+    for entry in files[:-MAX_CACHED_PAGES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+class BodyReader:
+    """
+    Turns the chunks of a response body into text as they arrive, stopping at the download and
+    text caps. Feed it chunks until feed() returns True or the body ends, then call close().
+    """
+
+    def __init__(self, response):
+        content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+        is_html = content_type in ("text/html", "application/xhtml+xml") or not content_type
+        if not (is_html or content_type.startswith("text/") or content_type in ("application/json", "application/xml")):
+            raise ValueError(f"Unsupported content type '{content_type}'")
+        self.decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+        self.extractor = TextExtractor() if is_html else None
+        self.chunks = []
+        self.received = 0
+        self.truncated = False
+
+    def feed(self, chunk):
+        """Adds a chunk of the body. Returns True once no more is needed."""
+        self.received += len(chunk)
+        text = self.decoder.decode(chunk)
+        if self.extractor is not None:
+            self.extractor.feed(text)
+            if self.extractor.full:
+                self.truncated = True
+                return True
+        else:
+            self.chunks.append(text)
+        if self.received >= MAX_DOWNLOAD_BYTES:
+            self.truncated = True
+            return True
+        return False
+
+    def close(self):
+        """Flushes the decoder and the extractor at the end of the body, or once feed() returned True."""
+        # A body cut off at the download cap may end in part of a character
+        tail = "" if self.truncated else self.decoder.decode(b"", final=True)
+        if self.extractor is not None:
+            self.extractor.feed(tail)
+            self.extractor.close()
+        else:
+            self.chunks.append(tail)
+
+    def result(self):
+        """Returns (title, text, truncated)."""
+        if self.extractor is not None:
+            return " ".join(self.extractor.title.split()), self.extractor.text(), self.truncated
+        return "", "".join(self.chunks)[:MAX_TEXT_CHARS], self.truncated
+
+def _read_body(response):
+    """Streams a response into text, stopping at the download and text caps. Returns (title, text, truncated)."""
+    reader = BodyReader(response)
+    for chunk in response.iter_bytes():
+        if reader.feed(chunk):
+            break
+    reader.close()
+    return reader.result()
+
+async def _aread_body(response):
+    reader = BodyReader(response)
+    async for chunk in response.aiter_bytes():
+        if reader.feed(chunk):
+            break
+    reader.close()
+    return reader.result()
+
+def _conditional_headers(cached):
+    # Lets the server answer 304 Not Modified instead of sending the page again
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+def _page(url, response, body):
+    title, text, truncated = body
+    return {
+        "url": url,
+        "final_url": str(response.url),
+        "title": title,
+        "text": text,
+        "truncated": truncated,
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+        "fetched_at": time.time(),
+        "extractor_version": EXTRACTOR_VERSION,
+    }
+
+def fetch_page(url):
+    """
+    Returns the extracted text of a page as a dict, using the disk cache and conditional GETs.
+
+    Args:
+        url: The http(s) URL to read.
+
+    Returns:
+        A dict with url, final_url, title, text, truncated, etag, last_modified and fetched_at.
+    """
+    cached = _load_cached(url)
+    if cached and time.time() - cached["fetched_at"] < FRESH_SECONDS:
+        return cached
+
+    with _get_client().stream("GET", url, headers=_conditional_headers(cached)) as response:
+        if response.status_code == 304 and cached:
+            cached["fetched_at"] = time.time()
+            _store_cached(cached)
+            return cached
+        response.raise_for_status()
+        page = _page(url, response, _read_body(response))
+    _store_cached(page)
+    return page
+
+async def _afetch_page(url):
+    # Must run on the shared loop, which owns the pooled async client
+    cached = await asyncio.to_thread(_load_cached, url)
+    if cached and time.time() - cached["fetched_at"] < FRESH_SECONDS:
+        return cached
+
+    async with get_async_http_client().stream("GET", url, headers={**REQUEST_HEADERS, **_conditional_headers(cached)}) as response:
+        if response.status_code == 304 and cached:
+            cached["fetched_at"] = time.time()
+            await asyncio.to_thread(_store_cached, cached)
+            return cached
+        response.raise_for_status()
+        page = _page(url, response, await _aread_body(response))
+    await asyncio.to_thread(_store_cached, page)
+    return page
+
+async def afetch_page(url):
+    """Async version of fetch_page, over the pooled client of the shared loop."""
+    return await run_in_runtime(_afetch_page(url))
+
+@read_only
+@tool
+def read_url(url: str, start: int = 0, max_chars: int = DEFAULT_READ_CHARS) -> str:
+    """
+    Read the text content of a web page directly over HTTP, without opening a browser.
+    Use this to get the full text of a page found with a web search.
+
+    Args:
+        url: The full URL of the page (http or https).
+        start: Character offset to start reading from, to continue reading a long page.
+        max_chars: Maximum number of characters to return.
+
+    Returns:
+        The page title and extracted text, or an error message.
+    """
+    if not re.match(r"^https?://", url, re.IGNORECASE):
+        return f"Error: '{url}' is not an http(s) URL."
+    try:
+        page = fetch_page(url)
+    except httpx.HTTPStatusError as e:
+        return f"Error reading {url}: HTTP {e.response.status_code}"
+    except Exception as e:
+        return f"Error reading {url}: {str(e)}"
+    return _format_page(page, start, max_chars)
+
+async def _aread_url(url: str, start: int = 0, max_chars: int = DEFAULT_READ_CHARS) -> str:
+    if not re.match(r"^https?://", url, re.IGNORECASE):
+        return f"Error: '{url}' is not an http(s) URL."
+    try:
+        page = await afetch_page(url)
+    except httpx.HTTPStatusError as e:
+        return f"Error reading {url}: HTTP {e.response.status_code}"
+    except Exception as e:
+        return f"Error reading {url}: {str(e)}"
+    return _format_page(page, start, max_chars)
+
+# Async callers (ainvoke) read the page on the pooled async client instead of blocking a worker thread
+read_url.coroutine = _aread_url
+
+def _format_page(page, start, max_chars):
+    """Formats the part of a fetched page that read_url returns."""
+    text = page["text"]
+    start = min(max(0, start), len(text))
+    end = min(len(text), start + max(0, max_chars))
+    result = f"Title: {page['title'] or '(none)'}\nURL: {page['final_url']}\nCharacters {start}-{end} of {len(text)}"
+    if page["truncated"]:
+        result += " (page was cut off at the size limit)"
+    result += f":\n{text[start:end]}"
+    if end < len(text):
+        result += f"\n[... {len(text) - end} more characters. Call read_url with start={end} to continue ...]"
+    return result
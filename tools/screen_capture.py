@@ -0,0 +1,194 @@
+# tools/screen_capture.py
+import base64
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from tools.lazy_import import lazy_import
+
+# PIL is imported on first use
+Image = lazy_import("PIL.Image")
+ImageChops = lazy_import("PIL.ImageChops")
+ImageGrab = lazy_import("PIL.ImageGrab")
+
+# Largest image the vision model looks at for each detail level. 'low' is a fixed 512x512 view;
+# 'high' is fit into 2048x2048 and then scaled so the shortest side is 768px.
+LOW_DETAIL_SIZE = 512
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+
+JPEG_QUALITY = {"low": 60, "high": 80}
+
+# Size of the grayscale thumbnail used to fingerprint frames, and how many gray levels are kept.
+# Changes smaller than roughly one thumbnail pixel, or subtle color shifts, don't alter the hash.
+SIGNATURE_SIZE = (96, 54)
+SIGNATURE_LEVELS_SHIFT = 4 # 256 -> 16 gray levels
+
+# Frames whose shorter side is at least this are averaged over 2x2 pixel blocks before exact hashing
+# (finer than the vision model sees them, and several times cheaper than hashing every pixel)
+EXACT_HASH_REDUCE_MIN_SIDE = 1024
+
+# Per-pixel gray-level difference below which a pixel counts as unchanged (filters JPEG-like noise, cursor blink)
+CHANGE_THRESHOLD = 24
+# Padding added around a changed region so the model sees its surroundings
+CHANGE_MARGIN = 16
+
+# The most recent frame sent for description, and the last point clicked by the UI automation tools
+_last_frame = None
+_last_click = None
+_state_lock = threading.Lock()
+
+def warm_up():
+    for module in (Image, ImageChops, ImageGrab):
+        module.load()
+
+def capture_screen():
+    """Captures the primary screen as an RGB image."""
+    return ImageGrab.grab().convert("RGB")
+
+def target_size(size, detail_level):
+    """Returns the size an image should be downscaled to before being sent at the given detail level."""
+    width, height = size
+    if detail_level == "low":
+        scale = min(1.0, LOW_DETAIL_SIZE / max(width, height))
+    else:
+        scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height), HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def encode_image(image, detail_level):
+    """
+    Downscales an image to what the vision model will actually use and encodes it as JPEG.
+
+    Returns:
+        A (base64 string, encoded byte count, encoded (width, height)) tuple.
+    """
+    size = target_size(image.size, detail_level)
+    if size != image.size:
+        image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=JPEG_QUALITY[detail_level], optimize=True)
+    data = buffered.getvalue()
+    return base64.b64encode(data).decode("utf-8"), len(data), size
+
+def frame_signature(image):
+    """Returns a small quantized grayscale thumbnail of the frame, used as a cheap perceptual fingerprint."""
+    thumbnail = image.convert("L").resize(SIGNATURE_SIZE, Image.BILINEAR, reducing_gap=2.0)
+    return thumbnail.point(lambda value: value >> SIGNATURE_LEVELS_SHIFT).tobytes()
+
+def frame_hash(image):
+    """
+    Returns a coarse hash that only changes when the screen content changes noticeably. Typing a
+    character or toggling a checkbox may leave it unchanged, so use it to tell whether the screen
+    changed enough to look again, never as a cache key for what is on the screen (see exact_frame_hash).
+    """
+    return hashlib.blake2b(frame_signature(image), digest_size=16).hexdigest()
+
+def exact_frame_hash(image):
+    """Returns a hash of the frame's pixels, averaged over 2x2 blocks for large frames; any visible change alters it."""
+    if min(image.size) >= EXACT_HASH_REDUCE_MIN_SIDE:
+        image = image.reduce(2)
+    return hashlib.blake2b(image.tobytes(), digest_size=16).hexdigest()
+
+def wait_for_screen_settle(timeout=3.0, interval=0.1, stable_frames=2):
+    """
+    Waits until the screen stops changing, i.e. the frame signature stays the same for
+    stable_frames consecutive captures, or until the timeout expires.
+
+    Returns:
+        True if the screen settled, False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    previous = frame_signature(capture_screen())
+    stable = 0
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        current = frame_signature(capture_screen())
+        stable = stable + 1 if current == previous else 0
+        if stable >= stable_frames:
+            return True
+        previous = current
+    return False
+
+def remember_frame(image):
+    """Records a frame as the latest capture and returns the previously recorded one (or None)."""
+    global _last_frame
+    with _state_lock:
+        previous, _last_frame = _last_frame, image
+    return previous
+
+def last_frame():
+    """Returns the most recently recorded frame (or None) without replacing it."""
+    return _last_frame
+
+def record_click(x, y):
+    global _last_click
+    with _state_lock:
+        _last_click = (x, y)
+
+def last_click():
+    """Returns the (x, y) of the most recent click_coordinates call, or None."""
+    return _last_click
+
+def clamp_box(box, size):
+    """Clips a (left, top, right, bottom) box to an image of the given size. Returns None if nothing is left."""
+    left, top, right, bottom = box
+    left, top = max(0, int(left)), max(0, int(top))
+    right, bottom = min(size[0], int(right)), min(size[1], int(bottom))
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+def box_around(point, radius, size):
+    """Returns a square box of the given radius centered on a point, clipped to the image."""
+    x, y = point
+    return clamp_box((x - radius, y - radius, x + radius, y + radius), size)
+
+def changed_box(previous, current):
+    """
+    Returns the bounding box of the pixels that differ between two frames, padded by CHANGE_MARGIN,
+    or None if nothing changed meaningfully.
+    """
+    difference = ImageChops.difference(previous.convert("L"), current.convert("L"))
+    mask = difference.point(lambda value: 255 if value > CHANGE_THRESHOLD else 0)
+    box = mask.getbbox()
+    if box is None:
+        return None
+    left, top, right, bottom = box
+    return clamp_box((left - CHANGE_MARGIN, top - CHANGE_MARGIN, right + CHANGE_MARGIN, bottom + CHANGE_MARGIN), current.size)
+
+class LRUCache:
+    """A small thread-safe least-recently-used cache."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+# Vision-model descriptions keyed by (exact frame hash, prompt, detail level)
+description_cache = LRUCache(max_entries=64)
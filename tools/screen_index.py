@@ -0,0 +1,251 @@
+# tools/screen_index.py
+import difflib
+import logging
+import time
+import threading
+from langchain_core.tools import tool
+from tools.lazy_import import lazy_import
+from tools.screen_capture import exact_frame_hash, LRUCache
+from tools.screen_watcher import add_input_listener, current_frame
+from tool_executor import read_only
+
+logger = logging.getLogger(__name__)
+
+np = lazy_import("numpy")
+
+# The OCR engine is looked up on first use, since checking for the tesseract binary runs a process
+_pytesseract = None
+_ocr_checked = False
+_ocr_lock = threading.Lock()
+
+def get_pytesseract():
+    """Returns the pytesseract module, or None if local OCR is unavailable."""
+    global _pytesseract, _ocr_checked
+    with _ocr_lock:
+        if not _ocr_checked:
+            _ocr_checked = True
+            try:
+                import pytesseract
+                pytesseract.get_tesseract_version() # Fails if the tesseract binary is not installed
+                _pytesseract = pytesseract
+            except Exception as e:
+                logger.warning("Local OCR unavailable (%s). find_on_screen is disabled; install tesseract and pytesseract to enable it.", e)
+        return _pytesseract
+
+def warm_up():
+    np.load()
+    get_pytesseract()
+
+# Elements are detected on a grid of CELL x CELL pixel cells
+CELL = 4
+# Minimum gray-level step between neighbouring pixels that counts as an edge
+EDGE_THRESHOLD = 40
+# Cells merged horizontally so the letters of a label form one element
+MERGE_CELLS = 2
+# An element counts as the container of a text match only if it is at most this many times larger
+MAX_ELEMENT_GROWTH = 16
+# OCR words below this confidence (0-100) are ignored
+MIN_OCR_CONFIDENCE = 40
+# Minimum similarity (0-1) between the query and on-screen text to count as a match
+MIN_MATCH_SCORE = 0.75
+
+# Screen indexes keyed by exact frame hash, so repeated lookups on an unchanged screen are instant.
+# Dropped on every UI action, so no click is aimed using an index of the screen from before it.
+index_cache = LRUCache(max_entries=8)
+add_input_listener(index_cache.clear)
+
+def _grayscale(image):
+    pixels = np.asarray(image, dtype=np.uint16)
+    gray = (pixels[..., 0] * 77 + pixels[..., 1] * 150 + pixels[..., 2] * 29) >> 8
+    return gray.astype(np.uint8)
+
+def _edge_cells(gray):
+    """Marks the grid cells that contain an edge, merging neighbouring cells horizontally."""
+    signed = gray.astype(np.int16)
+    edges = np.zeros(gray.shape, dtype=bool)
+    edges[:, 1:] |= np.abs(np.diff(signed, axis=1)) > EDGE_THRESHOLD
+    edges[1:, :] |= np.abs(np.diff(signed, axis=0)) > EDGE_THRESHOLD
+
+    height, width = gray.shape[0] // CELL, gray.shape[1] // CELL
+    cells = edges[: height * CELL, : width * CELL].reshape(height, CELL, width, CELL).any(axis=(1, 3))
+
+    merged = cells.copy()
+    for shift in range(1, MERGE_CELLS + 1):
+        merged[:, shift:] |= cells[:, :-shift]
+        merged[:, :-shift] |= cells[:, shift:]
+    return merged
+
+def _connected_components(mask):
+    """Labels 4-connected regions of a boolean grid using row runs and union-find. Returns cell bounding boxes."""
+    runs = [] # (row, start, end) with end exclusive
+    row_runs = []
+    for row in range(mask.shape[0]):
+        steps = np.diff(np.concatenate(([0], mask[row].view(np.int8), [0])))
+        starts, ends = np.flatnonzero(steps == 1), np.flatnonzero(steps == -1)
+        first = len(runs)
+        runs.extend((row, start, end) for start, end in zip(starts.tolist(), ends.tolist()))
+        row_runs.append((first, len(runs)))
+
+    parent = list(range(len(runs)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for row in range(1, mask.shape[0]):
+        a, a_end = row_runs[row - 1]
+        b, b_end = row_runs[row]
+        # Two-pointer sweep over the runs of neighbouring rows
+        while a < a_end and b < b_end:
+            if runs[a][1] < runs[b][2] and runs[b][1] < runs[a][2]:
+                parent[find(a)] = find(b)
+            if runs[a][2] < runs[b][2]:
+                a += 1
+            else:
+                b += 1
+
+    boxes = {}
+    for i, (row, start, end) in enumerate(runs):
+        root = find(i)
+        left, top, right, bottom = boxes.get(root, (start, row, end, row + 1))
+        boxes[root] = (min(left, start), min(top, row), max(right, end), max(bottom, row + 1))
+    return list(boxes.values())
+
+class ScreenIndex:
+    """
+    Text and element index of one screenshot, built locally on the CPU.
+
+    Words come from OCR (if tesseract is available); elements are connected regions of edge
+    pixels, which roughly correspond to buttons, fields, icons and text labels.
+    """
+
+    def __init__(self, image):
+        started = time.perf_counter()
+        gray = _grayscale(image)
+        self.size = image.size
+
+        max_area = 0.25 * image.size[0] * image.size[1]
+        self.elements = []
+        for left, top, right, bottom in _connected_components(_edge_cells(gray)):
+            box = (left * CELL, top * CELL, right * CELL, bottom * CELL)
+            area = (box[2] - box[0]) * (box[3] - box[1])
+            if (right - left) * (bottom - top) >= 2 and area <= max_area:
+                self.elements.append(box)
+
+        # Lines of (text, confidence, box) words in reading order
+        self.lines = []
+        pytesseract = get_pytesseract()
+        if pytesseract is not None:
+            # Tesseract reads dark text on a light background best
+            ocr_input = 255 - gray if gray.mean() < 128 else gray
+            data = pytesseract.image_to_data(ocr_input, output_type=pytesseract.Output.DICT)
+            lines = {}
+            for i, text in enumerate(data["text"]):
+                confidence = float(data["conf"][i])
+                if not text.strip() or confidence < MIN_OCR_CONFIDENCE:
+                    continue
+                box = (data["left"][i], data["top"][i], data["left"][i] + data["width"][i], data["top"][i] + data["height"][i])
+                line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+                lines.setdefault(line_key, []).append((text.strip(), confidence, box))
+            self.lines = list(lines.values())
+
+        self.build_seconds = time.perf_counter() - started
+
+    def find_text(self, query, max_results=5):
+        """
+        Finds on-screen text similar to the query, matching whole phrases across neighbouring words.
+
+        Returns:
+            A list of (score, text, box) tuples, best match first.
+        """
+        query = " ".join(query.casefold().split())
+        if not query:
+            return []
+        query_words = len(query.split())
+
+        matches = []
+        for words in self.lines:
+            for size in {max(1, query_words - 1), query_words, query_words + 1}:
+                for start in range(0, max(1, len(words) - size + 1)):
+                    window = words[start:start + size]
+                    text = " ".join(word[0] for word in window)
+                    candidate = text.casefold()
+                    score = 1.0 if candidate == query else difflib.SequenceMatcher(None, query, candidate).ratio()
+                    if score >= MIN_MATCH_SCORE:
+                        box = (min(w[2][0] for w in window), min(w[2][1] for w in window),
+                               max(w[2][2] for w in window), max(w[2][3] for w in window))
+                        matches.append((score, text, box))
+
+        matches.sort(key=lambda match: -match[0])
+        results = []
+        for match in matches:
+            # Overlapping windows of the same words produce duplicates
+            if not any(_overlaps(match[2], kept[2]) for kept in results):
+                results.append(match)
+            if len(results) >= max_results:
+                break
+        return results
+
+    def element_containing(self, box):
+        """Returns the smallest detected element that tightly encloses the box, e.g. the button around a label."""
+        box_area = (box[2] - box[0]) * (box[3] - box[1])
+        enclosing = [e for e in self.elements if e[0] <= box[0] and e[1] <= box[1] and e[2] >= box[2] and e[3] >= box[3]
+                     and (e[2] - e[0]) * (e[3] - e[1]) <= MAX_ELEMENT_GROWTH * box_area]
+        return min(enclosing, key=lambda e: (e[2] - e[0]) * (e[3] - e[1]), default=None)
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def _center(box):
+    return (box[0] + box[2]) // 2, (box[1] + box[3]) // 2
+
+def get_screen_index(image=None):
+    """Returns the index for the current screen (or the given image), reusing it while the screen is unchanged."""
+    image = image if image is not None else current_frame()
+    key = exact_frame_hash(image)
+    index = index_cache.get(key)
+    if index is None:
+        index = ScreenIndex(image)
+        index_cache.put(key, index)
+        logger.debug("Built local screen index in %.0f ms (%d words, %d elements)", index.build_seconds * 1000,
+                     sum(len(line) for line in index.lines), len(index.elements))
+    return index
+
+@read_only
+@tool
+def find_on_screen(text: str, max_results: int = 3):
+    """
+    Finds visible text on the screen (e.g. a button label like 'Submit') and returns its screen coordinates.
+    Runs locally with OCR, so it is much faster and cheaper than describe_screen_content.
+    Try this first to locate an element before click_coordinates; fall back to describe_screen_content
+    when it finds no match or the target has no text (e.g. an icon).
+
+    Args:
+        text: The text to look for. Matching ignores case and tolerates small OCR errors.
+        max_results: Maximum number of matches to return.
+
+    Returns:
+        The matches with their click coordinates and bounding boxes, or a message saying nothing was found.
+    """
+    if get_pytesseract() is None:
+        return "Error: Local OCR is unavailable (install tesseract and pytesseract). Use describe_screen_content instead."
+
+    try:
+        index = get_screen_index()
+        matches = index.find_text(text, max_results=max_results)
+        if not matches:
+            return f"No match for '{text}' on screen. Use describe_screen_content to locate it with the vision model."
+
+        lines = []
+        for score, found, box in matches:
+            element = index.element_containing(box)
+            x, y = _center(box)
+            line = f"'{found}' at ({x}, {y}), text box {list(box)}, match {score:.2f}"
+            if element:
+                line += f", inside element {list(element)}"
+            lines.append(line)
+        return "\n".join(lines)
+    except Exception as e:
+        logger.error("Error searching the screen index: %s", e)
+        return f"Error searching the screen for '{text}': {e}"
@@ -1,33 +1,84 @@
 # tools/screen_reader.py
-import base64
-import io
-from PIL import ImageGrab
-from openai import OpenAI, OpenAIError
+import asyncio
+import logging
+import threading
+import time
+from typing import List, Optional
 from langchain_core.tools import tool
 from dotenv import load_dotenv
+from tools.lazy_import import lazy_import
+from tools import screen_capture
+from tools.async_runtime import get_async_openai_client, run_in_runtime
+from tools.screen_capture import (encode_image, exact_frame_hash, description_cache, remember_frame, last_frame,
+                                  last_click, clamp_box, box_around, changed_box)
+from tools.screen_watcher import current_frame
+from tools.vision_routing import CONFIDENCE_INSTRUCTION, VisionRoute
+from tool_executor import after_use, read_only
+from tracing import record_step_metric
 
 load_dotenv()
 
-try:
-    client = OpenAI()
-    # Perform a simple test call or check key existence if needed
-    # Although the actual call in the tool will reveal issues
-except OpenAIError as e:
-    print(f"Error initializing OpenAI client: {e}")
-    print("Please ensure the OPENAI_API_KEY environment variable is set correctly.")
-    client = None # Set client to None to indicate initialization failure
+logger = logging.getLogger(__name__)
 
+# The OpenAI client is created on first use, which keeps the openai import off the startup path
+openai = lazy_import("openai")
+client = None
+_client_initialized = False
+_client_lock = threading.Lock()
+
+def get_client():
+    global client, _client_initialized
+    with _client_lock:
+        if not _client_initialized:
+            _client_initialized = True
+            try:
+                client = openai.OpenAI()
+                # Perform a simple test call or check key existence if needed
+                # Although the actual call in the tool will reveal issues
+            except openai.OpenAIError as e:
+                logger.error("Error initializing OpenAI client: %s. Please ensure the OPENAI_API_KEY environment variable is set correctly.", e)
+                client = None # Set client to None to indicate initialization failure
+        return client
+
+# Async callers use the pooled AsyncOpenAI client of tools.async_runtime; replaceable like client
+async_client = None
+
+def get_async_client():
+    """Returns the async vision client. Must be called from the shared loop."""
+    return async_client or get_async_openai_client()
+
+def warm_up():
+    screen_capture.warm_up()
+    get_client()
+
+# Half the side of the square region sent when focus is 'last_click'
+LAST_CLICK_RADIUS = 200
+# A changed region covering more than this fraction of the screen is sent as a full capture
+MAX_CHANGED_FRACTION = 0.5
+
+@read_only
 @tool
-def describe_screen_content(user_prompt: str = "Describe the current screen content in detail.", detail_level: str = "low"):
+def describe_screen_content(user_prompt: str = "Describe the current screen content in detail.", detail_level: str = "auto",
+                            region: Optional[List[int]] = None, focus: str = "full"):
     """
-    Captures the primary screen, sends it to a vision model (GPT-4o) for analysis,
+    Captures the primary screen, sends it to a vision model for analysis,
     and returns the model's description.
 
     Args:
         user_prompt (str): The prompt to ask the vision model about the screen content.
                            Defaults to "Describe the current screen content in detail.".
-        detail_level (str): The level of detail for image analysis ('low' or 'high').
-                            'low' saves costs but provides less detail. Defaults to 'low'.
+        detail_level (str): How closely to look: 'auto' (default) first asks a fast model at low
+                            detail and only uses GPT-4o at high detail when that answer is unsure,
+                            or when the prompt asks for exact text or positions. 'low' or 'high'
+                            always use GPT-4o at that detail; only use them when 'auto' fell short.
+        region (list[int], optional): Only analyze this screen rectangle, given as
+                            [left, top, right, bottom] in screen coordinates.
+        focus (str): Which part of the screen to send when no region is given:
+                     'full' - the whole screen (default).
+                     'last_click' - the area around the most recent click_coordinates call;
+                                    useful to check the result of a click.
+                     'changes' - only the area that changed since the previous screen capture,
+                                 plus a small thumbnail of the whole screen for context.
 
     Returns:
         A string containing the vision model's description of the screen,
@@ -36,66 +87,209 @@ def describe_screen_content(user_prompt: str = "Describe the current screen cont
     Note: This tool uses the OpenAI API and requires the OPENAI_API_KEY environment
           variable to be set. Sending images incurs token costs.
     """
+    client = get_client()
     if not client:
         return "Error: OpenAI client failed to initialize. Check API key."
 
-    if detail_level not in ["low", "high"]:
-        return "Error: Invalid detail_level. Must be 'low' or 'high'."
+    error = _check_arguments(detail_level, region, focus)
+    if error:
+        return error
 
     try:
-        print("Capturing screen for vision analysis...")
-        # Capture the primary screen
-        screenshot = ImageGrab.grab()
-        print("Screen captured.")
-
-        # Convert the image to Base64
-        buffered = io.BytesIO()
-        # Determine format based on Pillow object type or save as JPEG/PNG
-        image_format = "JPEG" # Or PNG
-        screenshot.save(buffered, format=image_format)
-        base64_image = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        print("Image encoded to Base64.")
+        screen = _prepare_request(user_prompt, detail_level, region, focus)
+        if isinstance(screen, str):
+            return screen
 
-        # Prepare the payload for OpenAI API
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": user_prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/{image_format.lower()};base64,{base64_image}",
-                            "detail": detail_level,
-                        },
-                    },
-                ],
-            }
-        ]
+        # Cheapest tier first; stronger tiers only if its answer isn't good enough
+        route = VisionRoute(user_prompt, detail_level)
+        for tier in route.tiers:
+            messages = screen.messages(tier)
+            logger.debug("Sending screen image to %s (detail: %s)", tier.model, tier.detail)
+            started = time.perf_counter()
+            completion = client.chat.completions.create(model=tier.model, messages=messages, max_tokens=tier.max_tokens)
+            if route.accept(tier, completion, time.perf_counter() - started):
+                break
+        return screen.finish(route.answer, tier)
+
+    except ImportError:
+         return "Error: Required library (Pillow or openai) not installed."
+    except openai.OpenAIError as e:
+        return f"Error calling OpenAI API: {e}"
+    except Exception as e:
+        # Catch other potential errors (e.g., screen grab issues, encoding issues)
+        logger.exception("Unexpected error describing the screen: %s", e)
+        return f"Error during screen description generation: {e}"
 
-        print(f"Sending screen image to GPT-4o (detail: {detail_level})...")
-        # Call the OpenAI API
-        completion = client.chat.completions.create(
-            model="gpt-4o", # Ensure this model supports vision
-            messages=messages,
-            max_tokens=500 # Adjust max tokens as needed for description length
-        )
-        print("Received response from GPT-4o.")
+async def _acreate_completion(tier, messages):
+    return await get_async_client().chat.completions.create(model=tier.model, messages=messages, max_tokens=tier.max_tokens)
 
-        description = completion.choices[0].message.content
-        return f"Screen Description (from GPT-4o):\n{description}"
+async def _adescribe_screen_content(user_prompt: str = "Describe the current screen content in detail.", detail_level: str = "auto",
+                                    region: Optional[List[int]] = None, focus: str = "full"):
+    error = _check_arguments(detail_level, region, focus)
+    if error:
+        return error
+
+    try:
+        # Capturing and encoding the screen is CPU work, so it runs off the event loop
+        screen = await asyncio.to_thread(_prepare_request, user_prompt, detail_level, region, focus)
+        if isinstance(screen, str):
+            return screen
+
+        route = VisionRoute(user_prompt, detail_level)
+        for tier in route.tiers:
+            messages = await asyncio.to_thread(screen.messages, tier)
+            logger.debug("Sending screen image to %s (detail: %s)", tier.model, tier.detail)
+            started = time.perf_counter()
+            completion = await run_in_runtime(_acreate_completion(tier, messages))
+            if route.accept(tier, completion, time.perf_counter() - started):
+                break
+        return screen.finish(route.answer, tier)
 
     except ImportError:
          return "Error: Required library (Pillow or openai) not installed."
-    except OpenAIError as e:
+    except openai.OpenAIError as e:
         return f"Error calling OpenAI API: {e}"
     except Exception as e:
-        # Catch other potential errors (e.g., screen grab issues, encoding issues)
-        print(f"An unexpected error occurred: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unexpected error describing the screen: %s", e)
         return f"Error during screen description generation: {e}"
 
+# Async callers (ainvoke) await the vision call on the pooled client instead of blocking a worker thread
+describe_screen_content.coroutine = _adescribe_screen_content
+
+def _check_arguments(detail_level, region, focus):
+    """Returns an error message for invalid describe_screen_content arguments, or None."""
+    if detail_level not in ["auto", "low", "high"]:
+        return "Error: Invalid detail_level. Must be 'auto', 'low' or 'high'."
+
+    if focus not in ["full", "last_click", "changes"]:
+        return "Error: Invalid focus. Must be 'full', 'last_click' or 'changes'."
+
+    if region is not None and len(region) != 4:
+        return "Error: Invalid region. Must be [left, top, right, bottom]."
+    return None
+
+class ScreenRequest:
+    """
+    The captured part of the screen for one describe_screen_content call. Builds the vision request
+    for each tier tried, encoding the image once per detail level.
+    """
+
+    def __init__(self, user_prompt, screenshot, image, box, include_thumbnail, cache_key):
+        self.user_prompt = user_prompt
+        self.screenshot = screenshot
+        self.image = image
+        self.box = box
+        self.include_thumbnail = include_thumbnail
+        self.cache_key = cache_key
+        self._encoded = {} # detail level -> (base64 image, encoded size)
+
+    def _encode(self, detail_level):
+        if detail_level not in self._encoded:
+            # Downscale to the size the model uses for this detail level and encode as JPEG
+            base64_image, image_bytes, image_size = encode_image(self.image, detail_level)
+            logger.debug("Image encoded (%dx%d, %d bytes)", image_size[0], image_size[1], image_bytes)
+            record_step_metric("image_bytes", image_bytes)
+            self._encoded[detail_level] = (base64_image, image_size)
+        return self._encoded[detail_level]
+
+    def messages(self, tier):
+        """Returns the chat messages asking the tier's model about the image."""
+        base64_image, _ = self._encode(tier.detail)
+        prompt = self.user_prompt + (CONFIDENCE_INSTRUCTION if tier.ask_confidence else "")
+        content = [{"type": "text", "text": prompt}]
+        if self.include_thumbnail:
+            base64_thumbnail, _ = self._thumbnail()
+            content.append({"type": "text", "text": "The first image is a thumbnail of the whole screen for context. "
+                                                    f"The second image is the region {list(self.box)} that changed since the last look; focus on it."})
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{base64_thumbnail}", "detail": "low"},
+            })
+        elif self.box:
+            content.append({"type": "text", "text": f"The image shows only the screen region {list(self.box)}."})
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{base64_image}",
+                "detail": tier.detail,
+            },
+        })
+
+        # Prepare the payload for OpenAI API
+        return [
+            {
+                "role": "user",
+                "content": content,
+            }
+        ]
+
+    def _thumbnail(self):
+        if "thumbnail" not in self._encoded:
+            base64_thumbnail, thumbnail_bytes, thumbnail_size = encode_image(self.screenshot, "low")
+            logger.debug("Context thumbnail encoded (%d bytes)", thumbnail_bytes)
+            record_step_metric("image_bytes", thumbnail_bytes)
+            self._encoded["thumbnail"] = (base64_thumbnail, thumbnail_size)
+        return self._encoded["thumbnail"]
+
+    def finish(self, description, tier):
+        """Turns the final answer (given by tier) into the tool's result and caches it."""
+        _, image_size = self._encode(tier.detail)
+        region_size = self.image.size
+        if self.box or image_size != region_size:
+            # Coordinates the model reports are relative to the image it saw, not the screen
+            left, top = self.box[:2] if self.box else (0, 0)
+            scale = region_size[0] / image_size[0]
+            description += (f"\n(Note: the image analyzed was {image_size[0]}x{image_size[1]} and covers screen region "
+                            f"{[left, top, left + region_size[0], top + region_size[1]]}; for click_coordinates use "
+                            f"x = {left} + x * {scale:.2f}, y = {top} + y * {scale:.2f}.)")
+        description_cache.put(self.cache_key, description)
+        return f"Screen Description:\n{description}"
+
+def _prepare_request(user_prompt, detail_level, region, focus):
+    """
+    Captures the screen for describe_screen_content.
+
+    Returns:
+        A ScreenRequest, or the tool's result as a string if no vision call is needed
+        (cached description, unchanged screen or invalid region).
+    """
+    logger.debug("Capturing screen for vision analysis")
+    # The watcher's latest frame of the primary screen if it is current, otherwise a new capture
+    screenshot = current_frame()
+    # The baseline of focus='changes' only moves once the call is really used, not when it was prefetched
+    previous_frame = last_frame()
+    after_use(lambda: remember_frame(screenshot))
+
+    # Work out which part of the screen to send
+    box = None
+    include_thumbnail = False
+    if region is not None:
+        box = clamp_box(region, screenshot.size)
+        if box is None:
+            return f"Error: Region {region} is outside the {screenshot.size[0]}x{screenshot.size[1]} screen."
+    elif focus == "last_click" and last_click() is not None:
+        box = box_around(last_click(), LAST_CLICK_RADIUS, screenshot.size)
+    elif focus == "changes" and previous_frame is not None and previous_frame.size == screenshot.size:
+        box = changed_box(previous_frame, screenshot)
+        if box is None:
+            return "Screen Description:\nNo visible change since the previous screen capture."
+        box_area = (box[2] - box[0]) * (box[3] - box[1])
+        if box_area > MAX_CHANGED_FRACTION * screenshot.size[0] * screenshot.size[1]:
+            box = None
+        else:
+            include_thumbnail = True
+    image = screenshot.crop(box) if box else screenshot
+
+    # Skip the vision call if this prompt was already answered for an unchanged screen
+    cache_key = (exact_frame_hash(image), box, include_thumbnail, user_prompt.strip(), detail_level)
+    cached_description = description_cache.get(cache_key)
+    if cached_description is not None:
+        logger.debug("Screen unchanged since last description; using cached result")
+        record_step_metric("description_cache_hits", 1)
+        return f"Screen Description:\n{cached_description}"
+
+    return ScreenRequest(user_prompt, screenshot, image, box, include_thumbnail, cache_key)
+
 # # Example usage (uncomment to test directly)
 # if __name__ == '__main__':
 #     # Ensure OPENAI_API_KEY is set in your environment before running
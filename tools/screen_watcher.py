@@ -0,0 +1,469 @@
+# tools/screen_watcher.py
+"""
+Background screen watcher.
+
+While Jarvis works with the screen, a daemon thread captures it FPS times a second and compares
+each frame with the previous one block by block, on a downsampled grayscale copy. Every frame in
+which blocks changed is published as a ScreenChange (the changed region in screen coordinates).
+The recent downsampled frames are kept in a preallocated ring buffer, and the latest full frame
+is kept so the screen tools can use it instead of capturing the screen again.
+
+This lets the agent wait for the UI to react to an action (wait_for_screen_change) instead of
+sleeping blindly or describing the screen over and over. The watcher starts on the first UI action
+or wait and stops again after IDLE_SECONDS without use.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Optional
+from langchain_core.tools import tool
+from tools import screen_capture
+from tools.lazy_import import lazy_import
+from tools.screen_capture import clamp_box
+
+logger = logging.getLogger(__name__)
+
+np = lazy_import("numpy")
+
+# Captures per second; 0 turns the watcher off (screen tools then always capture on demand)
+WATCH_FPS = float(os.getenv("JARVIS_SCREEN_WATCH_FPS", "2"))
+# Seconds without a UI action, wait or screen read after which the watcher stops capturing
+IDLE_SECONDS = 120
+# Frames are compared at 1/DOWNSCALE of the screen resolution, in BLOCK x BLOCK blocks of that
+DOWNSCALE = 4
+BLOCK = 8
+# Mean gray-level difference over a block above which the block counts as changed. A blinking
+# caret changes a block by less than this.
+BLOCK_THRESHOLD = 8
+# Downsampled frames kept in the ring buffer (16 seconds at 2 FPS), and change events kept
+RING_FRAMES = 32
+EVENT_HISTORY = 256
+# Frames without a change after which a changing screen counts as settled
+SETTLE_FRAMES = 2
+# The watcher turns itself off after this many failed captures in a row, or if the first one fails (e.g. no display)
+MAX_CAPTURE_ERRORS = 5
+
+class ScreenChange:
+    """
+    A change between two consecutive frames.
+
+    Args:
+        frame: Number of the frame in which the change was seen.
+        timestamp: time.monotonic() when that frame's capture started.
+        box: Bounding box of the changed blocks in screen coordinates (left, top, right, bottom).
+        blocks: Boolean array marking the changed blocks.
+        fraction: Fraction of the screen's blocks that changed.
+    """
+
+    def __init__(self, frame, timestamp, box, blocks, fraction):
+        self.frame = frame
+        self.timestamp = timestamp
+        self.box = box
+        self.blocks = blocks
+        self.fraction = fraction
+
+    def touches(self, region):
+        """Whether any changed block overlaps region (a (left, top, right, bottom) screen box, or None for anywhere)."""
+        if region is None:
+            return True
+        size = DOWNSCALE * BLOCK
+        left, top, right, bottom = (max(0, int(value)) for value in region)
+        return bool(self.blocks[top // size:-(-bottom // size), left // size:-(-right // size)].any())
+
+    def __repr__(self):
+        return f"ScreenChange(frame={self.frame}, box={self.box}, fraction={self.fraction:.3f})"
+
+def _downsample(frame):
+    """Returns a frame as a grayscale array at 1/DOWNSCALE of its size."""
+    return np.asarray(frame.reduce(DOWNSCALE).convert("L"))
+
+def _changed_blocks(previous, current):
+    """Returns the boolean array of BLOCK x BLOCK blocks that differ between two downsampled frames."""
+    difference = np.abs(current.astype(np.int16) - previous)
+    height, width = difference.shape
+    # Pad the edges to whole blocks so changes along the right and bottom edge are not missed
+    difference = np.pad(difference, ((0, -height % BLOCK), (0, -width % BLOCK)))
+    rows, columns = difference.shape[0] // BLOCK, difference.shape[1] // BLOCK
+    totals = difference.reshape(rows, BLOCK, columns, BLOCK).sum(axis=(1, 3), dtype=np.int32)
+    return totals > BLOCK_THRESHOLD * BLOCK * BLOCK
+
+def _blocks_box(blocks, screen_size):
+    rows = np.flatnonzero(blocks.any(axis=1))
+    columns = np.flatnonzero(blocks.any(axis=0))
+    size = DOWNSCALE * BLOCK
+    return clamp_box((int(columns[0]) * size, int(rows[0]) * size, (int(columns[-1]) + 1) * size, (int(rows[-1]) + 1) * size),
+                     screen_size)
+
+class ScreenWatcher:
+    """
+    Captures the screen in the background and publishes what changed.
+
+    Args:
+        fps: Captures per second; 0 disables the watcher.
+        idle_seconds: Seconds without use (start() or latest()) after which the capture thread exits.
+    """
+
+    def __init__(self, fps=WATCH_FPS, idle_seconds=IDLE_SECONDS):
+        self.fps = fps
+        self.idle_seconds = idle_seconds
+        self._thread = None
+        self._stop = threading.Event()
+        self._condition = threading.Condition()
+        self._last_used = 0.0
+        self._latest = None # (full frame, capture time)
+        self._ring = None # RING_FRAMES downsampled frames, written in turn
+        self._ring_times = [None] * RING_FRAMES
+        self._events = deque(maxlen=EVENT_HISTORY)
+        self._subscribers = []
+        self._failed = False # Set when capturing doesn't work here; the watcher then stays off
+        self.stats = {"frames": 0, "changes": 0, "capture_seconds": 0.0, "errors": 0}
+
+    @property
+    def enabled(self):
+        return self.fps > 0 and not self._failed
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, timeout=2.0):
+        """
+        Starts capturing if the watcher is enabled and not running yet, and waits for the first frame.
+
+        Returns:
+            True if the watcher is running and has a frame.
+        """
+        with self._condition:
+            if not self.enabled:
+                return False
+            self._last_used = time.monotonic()
+            if self._thread is None:
+                self._stop.clear()
+                self._latest = None
+                self._thread = threading.Thread(target=self._run, name="jarvis-screen-watcher", daemon=True)
+                self._thread.start()
+            return self._condition.wait_for(lambda: self._latest is not None or self._thread is None, timeout) \
+                and self._thread is not None
+
+    def stop(self):
+        """Stops capturing and waits for the capture thread to exit."""
+        with self._condition:
+            thread = self._thread
+            self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def subscribe(self, callback):
+        """
+        Calls callback(change) on the capture thread after every frame; change is a ScreenChange,
+        or None if nothing changed. Returns a function that unsubscribes it.
+        """
+        with self._condition:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._condition:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def latest(self, max_age=None, since=None):
+        """
+        Returns the latest full frame, or None if the watcher isn't running or the frame is older
+        than max_age seconds or was captured before since (a time.monotonic() value).
+        """
+        with self._condition:
+            if self._thread is None or self._latest is None:
+                return None
+            self._last_used = time.monotonic()
+            frame, captured = self._latest
+        if max_age is not None and time.monotonic() - captured > max_age:
+            return None
+        if since is not None and captured < since:
+            return None
+        return frame
+
+    def changes_since(self, since, region=None):
+        """Returns the changes seen in frames captured after since, optionally only those touching region."""
+        with self._condition:
+            return self._changes_since(since, region)
+
+    def frame_before(self, timestamp):
+        """Returns the last downsampled frame captured before timestamp that is still in the ring buffer, or None."""
+        with self._condition:
+            candidates = [(captured, slot) for slot, captured in enumerate(self._ring_times)
+                          if captured is not None and captured < timestamp]
+            if not candidates:
+                return None
+            return self._ring[max(candidates)[1]].copy()
+
+    def wait_for_change(self, since, region=None, timeout=10.0, settle_frames=SETTLE_FRAMES):
+        """
+        Waits for a change captured after since (in region, if given), then until settle_frames
+        frames in a row show no change there.
+
+        Returns:
+            (changes seen, whether the screen settled); no changes means the wait timed out.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                changes, settled = self._progress(since, region, settle_frames)
+                remaining = deadline - time.monotonic()
+                if settled or remaining <= 0 or self._thread is None:
+                    return changes, settled
+                self._last_used = time.monotonic()
+                self._condition.wait(remaining)
+
+    async def await_change(self, since, region=None, timeout=10.0, settle_frames=SETTLE_FRAMES):
+        """Like wait_for_change, but waits on the running event loop instead of blocking a thread."""
+        loop = asyncio.get_running_loop()
+        new_frame = asyncio.Event()
+
+        def on_frame(change):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(new_frame.set)
+
+        unsubscribe = self.subscribe(on_frame)
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                new_frame.clear()
+                with self._condition:
+                    changes, settled = self._progress(since, region, settle_frames)
+                    self._last_used = time.monotonic()
+                    stopped = self._thread is None
+                remaining = deadline - loop.time()
+                if settled or remaining <= 0 or stopped:
+                    return changes, settled
+                try:
+                    await asyncio.wait_for(new_frame.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            unsubscribe()
+
+    def _changes_since(self, since, region):
+        return [change for change in self._events if change.timestamp >= since and change.touches(region)]
+
+    def _progress(self, since, region, settle_frames):
+        changes = self._changes_since(since, region)
+        if not changes:
+            return changes, False
+        quiet_frames = self.stats["frames"] - 1 - changes[-1].frame
+        return changes, quiet_frames >= settle_frames
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        previous = None
+        errors = 0
+        next_capture = time.monotonic()
+        while not self._stop.is_set():
+            started = time.monotonic()
+            with self._condition:
+                if started - self._last_used > self.idle_seconds:
+                    logger.debug("Screen watcher idle; stopping")
+                    break
+            try:
+                frame = screen_capture.capture_screen()
+                small = _downsample(frame)
+            except Exception as e:
+                errors += 1
+                self.stats["errors"] += 1
+                logger.debug("Screen watcher capture failed: %s", e)
+                if previous is None or errors >= MAX_CAPTURE_ERRORS:
+                    logger.warning("Screen watcher turned off after %d failed capture(s): %s", errors, e)
+                    self._failed = True
+                    break
+            else:
+                errors = 0
+                change = None
+                if previous is not None and previous.shape == small.shape:
+                    blocks = _changed_blocks(previous, small)
+                    if blocks.any():
+                        change = ScreenChange(self.stats["frames"], started, _blocks_box(blocks, frame.size), blocks, float(blocks.mean()))
+                self._publish(frame, small, started, change)
+                previous = small
+            self.stats["capture_seconds"] += time.monotonic() - started
+            # Skip frames rather than fall behind when a capture takes longer than the interval
+            next_capture = max(next_capture + interval, time.monotonic())
+            self._stop.wait(next_capture - time.monotonic())
+        with self._condition:
+            self._thread = None
+            self._condition.notify_all()
+
+    def _publish(self, frame, small, captured, change):
+        with self._condition:
+            self._latest = (frame, captured)
+            if self._ring is None or self._ring.shape[1:] != small.shape:
+                self._ring = np.empty((RING_FRAMES,) + small.shape, dtype=np.uint8)
+                self._ring_times = [None] * RING_FRAMES
+            slot = self.stats["frames"] % RING_FRAMES
+            self._ring[slot] = small
+            self._ring_times[slot] = captured
+            self.stats["frames"] += 1
+            if change is not None:
+                self._events.append(change)
+                self.stats["changes"] += 1
+            self._condition.notify_all()
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(change)
+            except Exception as e:
+                logger.warning("Screen change subscriber failed: %s", e)
+
+watcher = ScreenWatcher()
+
+# When the last UI action (click, typing, key press) started and finished, and when the last
+# wait_for_screen_change returned, as time.monotonic()
+_last_input = None
+_last_input_done = None
+_last_wait = None
+# Functions called when a UI action starts and finishes, e.g. to drop caches of what is on the screen
+_input_listeners = []
+
+def warm_up():
+    np.load()
+
+def note_input():
+    """
+    Called by the UI automation tools right before an action: makes sure the watcher has a frame
+    of the screen from before the action, and remembers when the action started.
+    """
+    global _last_input
+    watcher.start()
+    _last_input = time.monotonic()
+    _notify_input_listeners()
+
+def note_input_done():
+    """Called by the UI automation tools once an action has been sent (or failed)."""
+    global _last_input_done
+    _last_input_done = time.monotonic()
+    _notify_input_listeners()
+
+def add_input_listener(callback):
+    """Calls callback() whenever a UI action starts or finishes."""
+    _input_listeners.append(callback)
+
+def _notify_input_listeners():
+    for callback in list(_input_listeners):
+        try:
+            callback()
+        except Exception as e:
+            logger.warning("UI action listener failed: %s", e)
+
+@contextmanager
+def input_action():
+    """Wraps one UI action: note_input() before it, note_input_done() after it."""
+    note_input()
+    try:
+        yield
+    finally:
+        note_input_done()
+
+def current_frame():
+    """
+    Returns the screen as it is now: the watcher's latest frame if its capture started after the
+    last UI action had finished and within the last frame interval, otherwise a new capture.
+    """
+    frame = None
+    if watcher.enabled:
+        # A frame captured while an action was still being sent may show the screen from before it
+        if _last_input is not None and (_last_input_done is None or _last_input_done < _last_input):
+            since = float("inf")
+        else:
+            since = _last_input_done
+        frame = watcher.latest(max_age=1.5 / watcher.fps, since=since)
+    return frame if frame is not None else screen_capture.capture_screen()
+
+def _baseline():
+    # Changes since the last UI action count if it is recent enough for its frame to still be buffered,
+    # and no earlier wait has already reported them
+    now = time.monotonic()
+    if (_last_input is not None and now - _last_input < RING_FRAMES / watcher.fps
+            and (_last_wait is None or _last_wait < _last_input)):
+        return _last_input
+    return now
+
+def _finish_wait(changes, settled, since, region, timeout):
+    global _last_wait
+    _last_wait = time.monotonic()
+    return _format_wait(changes, settled, since, region, timeout)
+
+def _format_wait(changes, settled, since, region, timeout):
+    where = f" in region {list(region)}" if region else ""
+    if not changes:
+        return f"No screen change{where} within {timeout:g} seconds."
+    box = [min(change.box[0] for change in changes), min(change.box[1] for change in changes),
+           max(change.box[2] for change in changes), max(change.box[3] for change in changes)]
+    after = "the last UI action" if since == _last_input else "waiting started"
+    result = f"Screen changed in region {box} {changes[0].timestamp - since:.1f}s after {after}"
+    if not settled:
+        return result + f" and was still changing after {timeout:g} seconds."
+    result += f" and settled (last change at {changes[-1].timestamp - since:.1f}s)."
+    baseline = watcher.frame_before(since)
+    latest = watcher.frame_before(float("inf"))
+    if baseline is not None and latest is not None and baseline.shape == latest.shape:
+        net = _changed_blocks(baseline, latest)
+        if not net.any():
+            return result + " It now looks the same as before (e.g. a flash or a loading indicator that went away)."
+    return result + " Use describe_screen_content with this region to see what changed."
+
+def _check_arguments(timeout, region):
+    if not watcher.enabled:
+        return "Error: The screen watcher is turned off (JARVIS_SCREEN_WATCH_FPS=0)."
+    if timeout <= 0 or timeout > 60:
+        return "Error: Invalid timeout. Must be between 0 and 60 seconds."
+    if region is not None and len(region) != 4:
+        return "Error: Invalid region. Must be [left, top, right, bottom]."
+    return None
+
+@tool
+def wait_for_screen_change(timeout: float = 10.0, region: Optional[List[int]] = None, wait_for_settle: bool = True):
+    """
+    Waits until the screen changes, e.g. for a window to open or a page to load after a click,
+    instead of sleeping or describing the screen repeatedly. Changes since your last click, typing or
+    key press count, so call it right after the action. Much cheaper than describe_screen_content.
+
+    Args:
+        timeout: Maximum seconds to wait (at most 60).
+        region: Only wait for changes in this screen rectangle, given as [left, top, right, bottom].
+        wait_for_settle: After the change, also wait until the screen stops changing.
+
+    Returns:
+        Where the screen changed and whether it settled, or that nothing changed before the timeout.
+    """
+    error = _check_arguments(timeout, region)
+    if error:
+        return error
+    try:
+        since = _baseline()
+        if not watcher.start():
+            return "Error: Could not capture the screen."
+        changes, settled = watcher.wait_for_change(since, region, timeout, SETTLE_FRAMES if wait_for_settle else 0)
+        return _finish_wait(changes, settled, since, region, timeout)
+    except Exception as e:
+        logger.exception("Error waiting for a screen change: %s", e)
+        return f"Error waiting for a screen change: {e}"
+
+async def _await_screen_change(timeout: float = 10.0, region: Optional[List[int]] = None, wait_for_settle: bool = True):
+    error = _check_arguments(timeout, region)
+    if error:
+        return error
+    try:
+        since = _baseline()
+        if not await asyncio.to_thread(watcher.start):
+            return "Error: Could not capture the screen."
+        changes, settled = await watcher.await_change(since, region, timeout, SETTLE_FRAMES if wait_for_settle else 0)
+        return _finish_wait(changes, settled, since, region, timeout)
+    except Exception as e:
+        logger.exception("Error waiting for a screen change: %s", e)
+        return f"Error waiting for a screen change: {e}"
+
+# Async callers (ainvoke) wait on the event loop instead of holding a worker thread for the whole wait
+wait_for_screen_change.coroutine = _await_screen_change
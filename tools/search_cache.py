@@ -0,0 +1,220 @@
+# tools/search_cache.py
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Articles, the only words dropped from a query: question words, prepositions and word order all
+# change what a search returns ("when" vs "where was Einstein born", "from London to Paris" vs "from Paris to London")
+ARTICLES = frozenset(["a", "an", "the"])
+
+def normalize_query(query):
+    """
+    Normalizes a search query so trivially different spellings share a cache entry:
+    case, punctuation, whitespace and articles are ignored.
+    """
+    words = re.findall(r"\w+", query.casefold())
+    return " ".join([word for word in words if word not in ARTICLES] or words)
+
+# Seconds between deletions of expired rows from the SQLite file
+PRUNE_INTERVAL = 600
+
+class SearchCache:
+    """
+    Two-tier cache for web search results: an in-memory LRU in front of an SQLite file.
+
+    Entries are fresh for ttl seconds. Until stale_ttl they are still served immediately while a
+    background refresh fetches a new result (stale-while-revalidate); after that they count as misses
+    and are deleted (when looked up, when the memory tier is full, and every PRUNE_INTERVAL seconds on disk).
+    Every lookup counts once in stats, as a memory, disk or stale hit or as a miss.
+
+    Args:
+        path: SQLite file for the on-disk tier, or None for memory only.
+        ttl: Seconds an entry is fresh.
+        stale_ttl: Seconds an entry may be served stale while it is refreshed.
+        max_memory_entries: Size of the in-memory LRU.
+    """
+
+    def __init__(self, path=None, ttl=3600, stale_ttl=86400, max_memory_entries=256):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict() # key -> (value, fetched_at)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._db = None
+        self._pruned_at = 0.0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    def get_or_fetch(self, query, fetch, cacheable=lambda value: True, namespace=""):
+        """
+        Returns the cached result for a query, calling fetch(query) on a miss.
+
+        Args:
+            query: The search query.
+            fetch: Function that performs the actual search.
+            cacheable: Predicate deciding whether a fetched result may be stored (e.g. not errors).
+            namespace: Keeps results of different backends or result formats apart.
+        """
+        key = f"{namespace}:{normalize_query(query)}" if namespace else normalize_query(query)
+        entry = self._fresh_or_stale(key)
+        if entry is not None:
+            value, stale = entry
+            if stale:
+                self._refresh_in_background(key, query, fetch, cacheable)
+            return value
+
+        value = fetch(query)
+        if cacheable(value):
+            self.put(key, value)
+        return value
+
+    async def aget_or_fetch(self, query, fetch, cacheable=lambda value: True, namespace=""):
+        """Async version of get_or_fetch, where fetch is a coroutine function. Must run on a long-lived loop."""
+        key = f"{namespace}:{normalize_query(query)}" if namespace else normalize_query(query)
+        entry = self._fresh_or_stale(key)
+        if entry is not None:
+            value, stale = entry
+            if stale and self._start_refresh(key):
+                asyncio.ensure_future(self._arefresh(key, query, fetch, cacheable))
+            return value
+
+        value = await fetch(query)
+        if cacheable(value):
+            self.put(key, value)
+        return value
+
+    def _fresh_or_stale(self, key):
+        """Returns (value, is stale) for a servable entry, or None (counted as a miss)."""
+        with self._lock:
+            entry, tier = self._lookup(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            value, fetched_at = entry
+            if time.time() - fetched_at > self.ttl:
+                self.stats["stale_hits"] += 1
+                return value, True
+            self.stats[f"{tier}_hits"] += 1
+            return value, False
+
+    def put(self, key, value, fetched_at=None):
+        fetched_at = fetched_at or time.time()
+        with self._lock:
+            self._remember(key, value, fetched_at)
+            db = self._connect()
+            if db is not None:
+                db.execute("INSERT OR REPLACE INTO results (key, value, fetched_at) VALUES (?, ?, ?)",
+                           (key, json.dumps(value), fetched_at))
+                self._prune(db)
+                db.commit()
+
+    def hit_rate(self):
+        """Fraction of lookups served from the cache, fresh or stale."""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["stale_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def _lookup(self, key):
+        """Returns (servable entry or None, 'memory' or 'disk'). Call with the lock held."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            if not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                return entry, "memory"
+            del self._memory[key]
+        db = self._connect()
+        if db is None:
+            return None, None
+        row = db.execute("SELECT value, fetched_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, None
+        if self._expired(row[1]):
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            db.commit()
+            return None, None
+        entry = (json.loads(row[0]), row[1])
+        self._remember(key, *entry)
+        return entry, "disk"
+
+    def _expired(self, fetched_at):
+        return time.time() - fetched_at > self.stale_ttl
+
+    def _remember(self, key, value, fetched_at):
+        self._memory[key] = (value, fetched_at)
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_memory_entries:
+            # Expired entries go first, then the least recently used
+            for expired in [k for k, (_, at) in self._memory.items() if self._expired(at)]:
+                del self._memory[expired]
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self, db):
+        """Deletes expired rows from the SQLite file, at most every PRUNE_INTERVAL seconds. Call with the lock held."""
+        now = time.time()
+        if now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        deleted = db.execute("DELETE FROM results WHERE fetched_at < ?", (now - self.stale_ttl,)).rowcount
+        if deleted:
+            logger.debug("Deleted %d expired search results from %s", deleted, self.path)
+
+    def _start_refresh(self, key):
+        """Claims the refresh of a key. Returns False if one is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _finish_refresh(self, key, query, value, cacheable, error):
+        if error is None and cacheable(value):
+            self.put(key, value)
+        with self._lock:
+            self._refreshing.discard(key)
+            if error is None:
+                self.stats["refreshes"] += 1
+            else:
+                self.stats["errors"] += 1
+        if error is not None:
+            logger.warning("Error refreshing cached search for %r: %s", query, error)
+
+    def _refresh_in_background(self, key, query, fetch, cacheable):
+        if not self._start_refresh(key):
+            return
+
+        def refresh():
+            try:
+                value, error = fetch(query), None
+            except Exception as e:
+                value, error = None, e
+            self._finish_refresh(key, query, value, cacheable, error)
+
+        threading.Thread(target=refresh, name="jarvis-search-refresh", daemon=True).start()
+
+    async def _arefresh(self, key, query, fetch, cacheable):
+        try:
+            value, error = await fetch(query), None
+        except Exception as e:
+            value, error = None, e
+        self._finish_refresh(key, query, value, cacheable, error)
+
+    def _connect(self):
+        if not self.path:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, fetched_at REAL NOT NULL)")
+            self._prune(self._db)
+            self._db.commit()
+        return self._db
@@ -0,0 +1,257 @@
+# tools/shell_sessions.py
+import asyncio
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from tools.command_output import OutputCapture
+from tools.command_policy import CommandResultCache
+
+IS_WINDOWS = sys.platform == "win32"
+
+def _shell_command():
+    if IS_WINDOWS:
+        # /Q turns echo (and the prompt) off, /K keeps the shell reading commands from stdin
+        return ["cmd.exe", "/Q", "/K"]
+    bash = shutil.which("bash")
+    return [bash, "--noprofile", "--norc"] if bash else ["/bin/sh"]
+
+class _CommandRun:
+    """Collects the output of one command until the sentinel lines of both streams have been seen."""
+
+    def __init__(self, marker, on_output):
+        self.marker = marker
+        self.on_output = on_output
+        self.captures = {"stdout": OutputCapture("stdout"), "stderr": OutputCapture("stderr")}
+        self.exit_code = None
+        self.pending = {"stdout", "stderr"}
+
+    def add(self, name, line):
+        position = line.find(self.marker)
+        if position >= 0:
+            # Output that didn't end with a newline shares the line with the sentinel
+            if position > 0:
+                self.captures[name].write(line[:position])
+            if name == "stdout":
+                code = line[position + len(self.marker):].strip()
+                self.exit_code = int(code) if code.lstrip("-").isdigit() else None
+            self.pending.discard(name)
+            return
+        self.captures[name].write(line)
+        if self.on_output:
+            self.on_output(name, line)
+
+    def close(self):
+        for capture in self.captures.values():
+            capture.close()
+
+    def result(self, finished=True):
+        return (self.exit_code if finished else None), self.captures["stdout"], self.captures["stderr"]
+
+class ShellSession:
+    """
+    A long-lived shell process that runs commands one at a time.
+
+    Each command is followed by a sentinel line on stdout (carrying the exit code) and on stderr,
+    so the output of one command can be told apart from the next without restarting the shell.
+    State such as the working directory and environment variables carries over between commands.
+    """
+
+    def __init__(self, cwd=None):
+        self.process = subprocess.Popen(
+            _shell_command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            text=True,
+            errors="replace",
+            bufsize=1,
+        )
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # Results of read-only commands (see tools.command_policy); a restarted shell starts empty
+        self.results = CommandResultCache()
+        # Lines from both streams, as (stream name, line); line is None once the stream closes
+        self._lines = queue.Queue()
+        # (event loop, asyncio.Event) of a command waiting in arun(), woken up when a line arrives
+        self._waiter = None
+        for name, stream in (("stdout", self.process.stdout), ("stderr", self.process.stderr)):
+            threading.Thread(target=self._pump, args=(name, stream), daemon=True).start()
+
+        # Swallow the shell's startup banner (cmd.exe prints its version)
+        self.run("", timeout=10)
+
+    def _pump(self, name, stream):
+        for line in iter(stream.readline, ""):
+            self._put(name, line)
+        self._put(name, None) # The shell exited
+
+    def _put(self, name, line):
+        self._lines.put((name, line))
+        waiter = self._waiter
+        if waiter is not None:
+            try:
+                waiter[0].call_soon_threadsafe(waiter[1].set)
+            except RuntimeError:
+                pass # The waiting loop was closed
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def _frame(self, command, marker):
+        if IS_WINDOWS:
+            return f"{command}\r\necho {marker} %errorlevel%\r\necho {marker} 1>&2\r\n"
+        # Commands must not read the sentinel lines from the shell's stdin
+        body = f"{{ {command}\n}} < /dev/null\n" if command.strip() else ""
+        return f"{body}echo \"{marker} $?\"\necho \"{marker}\" >&2\n"
+
+    def run(self, command, timeout=60, on_output=None):
+        """
+        Runs a command in the session and waits for it to finish.
+
+        Args:
+            command: The command line to run.
+            timeout: Seconds to wait before giving up. The session must be discarded after a timeout.
+            on_output: Optional callback receiving (stream name, line) as output arrives.
+
+        Returns:
+            A (exit code, stdout capture, stderr capture) tuple of the exit code and OutputCapture
+            objects. exit code is None if the command timed out or the shell exited.
+        """
+        command_run = self._start(command, on_output)
+        deadline = time.monotonic() + timeout
+        try:
+            while command_run.pending:
+                remaining = deadline - time.monotonic()
+                try:
+                    name, line = self._lines.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    return command_run.result(finished=False)
+                if line is None:
+                    return command_run.result(finished=False)
+                command_run.add(name, line)
+        finally:
+            command_run.close()
+
+        self.last_used = time.monotonic()
+        return command_run.result()
+
+    async def arun(self, command, timeout=60, on_output=None):
+        """
+        Async version of run(): waits for the command's output on the running event loop instead of
+        blocking a thread. Takes the same arguments and returns the same tuple.
+        """
+        wakeup = asyncio.Event()
+        self._waiter = (asyncio.get_running_loop(), wakeup)
+        command_run = self._start(command, on_output)
+        deadline = time.monotonic() + timeout
+        try:
+            while command_run.pending:
+                # Cleared before looking at the queue, so a line arriving afterwards sets it again
+                wakeup.clear()
+                try:
+                    name, line = self._lines.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return command_run.result(finished=False)
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if line is None:
+                    return command_run.result(finished=False)
+                command_run.add(name, line)
+        finally:
+            self._waiter = None
+            command_run.close()
+
+        self.last_used = time.monotonic()
+        return command_run.result()
+
+    def _start(self, command, on_output):
+        marker = f"__JARVIS_DONE_{uuid.uuid4().hex}__"
+        self.last_used = time.monotonic()
+        self.process.stdin.write(self._frame(command, marker))
+        self.process.stdin.flush()
+        return _CommandRun(marker, on_output)
+
+    def close(self):
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+
+class ShellSessionPool:
+    """
+    Keeps one shell session per agent conversation thread.
+
+    Sessions idle for longer than idle_timeout are closed by a background reaper, and the least
+    recently used session is closed when more than max_sessions are open.
+    """
+
+    def __init__(self, max_sessions=8, idle_timeout=600, cwd=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.cwd = cwd
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def get(self, key):
+        """Returns the live session for a key, starting a new one if needed."""
+        with self._lock:
+            self._start_reaper()
+            session = self._sessions.get(key)
+            if session is not None and not session.is_alive():
+                del self._sessions[key]
+                session = None
+            if session is None:
+                idle = [k for k, other in self._sessions.items() if not other.lock.locked()]
+                while idle and len(self._sessions) >= self.max_sessions:
+                    oldest = min(idle, key=lambda k: self._sessions[k].last_used)
+                    idle.remove(oldest)
+                    self._sessions.pop(oldest).close()
+                session = ShellSession(cwd=self.cwd)
+                self._sessions[key] = session
+            session.last_used = time.monotonic()
+            return session
+
+    def discard(self, key):
+        with self._lock:
+            session = self._sessions.pop(key, None)
+        if session is not None:
+            session.close()
+
+    def reap_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, session in self._sessions.items()
+                    if now - session.last_used > self.idle_timeout and not session.lock.locked()]
+            for key in idle:
+                self._sessions.pop(key).close()
+        return len(idle)
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+        def reap_forever():
+            while True:
+                time.sleep(min(60, self.idle_timeout))
+                self.reap_idle()
+        self._reaper = threading.Thread(target=reap_forever, name="jarvis-shell-reaper", daemon=True)
+        self._reaper.start()
+
+    def close_all(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+shell_pool = ShellSessionPool(cwd=os.getcwd())
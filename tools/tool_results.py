@@ -0,0 +1,76 @@
+# tools/tool_results.py
+"""
+Compact encodings for tool results.
+
+Every tool result becomes a ToolMessage that is sent again with each later model call of the
+conversation, so results should carry the data and nothing else: no echo of the arguments the
+model just gave, no pretty-printing, no fields that are always empty. Structured results are
+encoded as minimal JSON with a fixed key order, short status results as key=value pairs.
+
+fit_to_budget() is applied to every result by ParallelToolNode (see tool_executor.py) with the
+tool's token budget, so one oversized result can't crowd out the rest of the prompt.
+"""
+import json
+import re
+from history import count_tokens
+
+def collapse_whitespace(text):
+    """Joins the lines of a snippet and squeezes runs of whitespace into single spaces."""
+    return " ".join((text or "").split())
+
+def _compact(value):
+    if isinstance(value, dict):
+        return {key: _compact(item) for key, item in value.items() if item not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in value]
+    if isinstance(value, float):
+        return round(value, 3)
+    return value
+
+def compact_json(value):
+    """Encodes a result as JSON without whitespace, empty fields or long float fractions."""
+    return json.dumps(_compact(value), ensure_ascii=False, separators=(",", ":"))
+
+def key_values(**fields):
+    """
+    Encodes fields as 'key=value' pairs on one line, in the order given. Values with spaces or
+    quotes are JSON-quoted and fields that are None are left out.
+    """
+    parts = []
+    for key, value in fields.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = str(value).lower()
+        value = str(value)
+        if not value or re.search(r"[\s\"'=]", value):
+            value = json.dumps(value, ensure_ascii=False)
+        parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+# Tokens set aside for the marker fit_to_budget puts in place of the cut text
+MARKER_TOKENS = 24
+
+def fit_to_budget(text, max_tokens, tail_share=0.25):
+    """
+    Cuts a result that is longer than max_tokens out of its middle, keeping the beginning and the
+    end (where tools put continuation hints), at line boundaries where possible. The same text and
+    budget always give the same result.
+
+    Returns:
+        (text, number of tokens cut)
+    """
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text, 0
+    # Characters per token of this text, so the kept parts are sized in tokens; the marker needs some too
+    keep_chars = int(len(text) * max(max_tokens - MARKER_TOKENS, 0) / tokens)
+    tail_chars = int(keep_chars * tail_share)
+    head = text[:keep_chars - tail_chars]
+    tail = text[len(text) - tail_chars:] if tail_chars else ""
+    if "\n" in head[len(head) // 2:]:
+        head = head[:head.rindex("\n")]
+    if "\n" in tail[:len(tail) // 2]:
+        tail = tail[tail.index("\n") + 1:]
+    cut = tokens - count_tokens(head) - count_tokens(tail)
+    return f"{head}\n[... {cut} tokens cut to fit the {max_tokens}-token result budget ...]\n{tail}".rstrip("\n"), cut
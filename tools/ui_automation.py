@@ -1,33 +1,154 @@
 # tools/ui_automation.py
-import pyautogui
+import logging
+import os
+import subprocess
+import sys
+import time
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
 from langchain_core.tools import tool
+from tools.lazy_import import lazy_import
+from tools.screen_capture import record_click, wait_for_screen_settle
+from tools.screen_watcher import input_action
+
+logger = logging.getLogger(__name__)
+
+# Imported on first use; loading pyautogui connects to the display and takes a while
+pyautogui = lazy_import("pyautogui")
+
+# Only needed when text is pasted
+pyperclip = lazy_import("pyperclip")
+
+def warm_up():
+    pyautogui.load()
+
+# Modifier used for the paste shortcut
+PASTE_MODIFIER = "command" if sys.platform == "darwin" else "ctrl"
+# Give the target application time to read the clipboard before it is restored. Some applications read the
+# paste asynchronously, so raise this if they receive the previous clipboard text instead.
+PASTE_DELAY = float(os.getenv("JARVIS_PASTE_DELAY", "0.5"))
+
+# Clipboard formats that hold plain text only; anything else (images, files, rich text) cannot be restored
+WINDOWS_TEXT_FORMATS = {1, 7, 13, 16} # CF_TEXT, CF_OEMTEXT, CF_UNICODETEXT, CF_LOCALE
+MAC_TEXT_TYPES = {"«class utf8»", "«class ut16»", "string", "Unicode text"}
+X11_TEXT_TARGETS = {"TARGETS", "TIMESTAMP", "MULTIPLE", "SAVE_TARGETS", "UTF8_STRING", "STRING", "TEXT", "COMPOUND_TEXT",
+                    "text/plain", "text/plain;charset=utf-8"}
+
+def _windows_clipboard_formats():
+    import ctypes
+    user32 = ctypes.windll.user32
+    if not user32.OpenClipboard(None):
+        return None
+    try:
+        formats = set()
+        clipboard_format = user32.EnumClipboardFormats(0)
+        while clipboard_format:
+            formats.add(clipboard_format)
+            clipboard_format = user32.EnumClipboardFormats(clipboard_format)
+        return formats
+    finally:
+        user32.CloseClipboard()
+
+def _clipboard_available():
+    try:
+        pyperclip.load()
+        return True
+    except ImportError:
+        return False
+
+def _clipboard_holds_only_text():
+    """
+    Checks whether the clipboard holds nothing but plain text, so it can be saved and restored as a string.
+
+    Returns:
+        True or False, or None when the platform gives no way to list the clipboard formats.
+    """
+    try:
+        if sys.platform == "win32":
+            formats = _windows_clipboard_formats()
+            return None if formats is None else formats <= WINDOWS_TEXT_FORMATS
+        if sys.platform == "darwin":
+            command = ["osascript", "-e", "clipboard info"]
+            text_types = MAC_TEXT_TYPES
+        elif os.getenv("WAYLAND_DISPLAY"):
+            command = ["wl-paste", "--list-types"]
+            text_types = X11_TEXT_TARGETS
+        else:
+            command = ["xclip", "-selection", "clipboard", "-t", "TARGETS", "-o"]
+            text_types = X11_TEXT_TARGETS
+        result = subprocess.run(command, capture_output=True, text=True, timeout=2)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.debug("Could not list clipboard formats: %s", e)
+        return None
+    if result.returncode != 0:
+        # An empty clipboard makes these tools exit with an error
+        return True if not result.stdout.strip() else None
+    if sys.platform == "darwin":
+        # "clipboard info" prints "type, size, type, size, ..."
+        types = {entry.strip() for entry in result.stdout.split(",")[::2] if entry.strip()}
+    else:
+        types = {line.strip() for line in result.stdout.splitlines() if line.strip()}
+    return types <= text_types
+
+def _enter_text(text, interval):
+    """
+    Enters text by pasting it from the clipboard when possible, falling back to typing it key by key.
+
+    The clipboard is restored after the paste. When it holds images, files or other non-text data, which
+    could not be restored, the text is typed instead so the clipboard is left untouched.
+    """
+    if len(text) > 1 and _clipboard_available():
+        try:
+            if _clipboard_holds_only_text() is False:
+                logger.debug("Clipboard holds non-text data; typing text instead of pasting.")
+            else:
+                try:
+                    previous_clipboard = pyperclip.paste()
+                except Exception:
+                    previous_clipboard = None
+                pyperclip.copy(text)
+                pyautogui.hotkey(PASTE_MODIFIER, "v")
+                time.sleep(PASTE_DELAY)
+                # Leave the clipboard alone if something else replaced it in the meantime
+                if previous_clipboard is not None and pyperclip.paste() == text:
+                    pyperclip.copy(previous_clipboard)
+                return
+        except Exception as e:
+            logger.warning("Clipboard paste failed (%s); typing text instead.", e)
+    pyautogui.write(text, interval=interval)
+
+def _is_valid_key(key):
+    return key.lower() in pyautogui.KEYBOARD_KEYS or len(key) == 1
 
 @tool
 def click_coordinates(x: int, y: int):
     """Clicks the mouse at the specified screen coordinates (x, y).
-    Use this tool *after* analyzing the screen to identify the correct coordinates for the target element.
+    Use this tool *after* analyzing the screen to identify the correct coordinates for the target element
+    (with find_on_screen for elements with visible text, otherwise describe_screen_content).
     Coordinates originate from the top-left corner of the primary screen (0,0).
-    Ensure the coordinates are accurate before calling this tool."""
+    Ensure the coordinates are accurate before calling this tool.
+    If the UI takes a moment to react, call wait_for_screen_change before looking at the screen again."""
     try:
-        print(f"Attempting to click at ({x}, {y})")
-        pyautogui.click(x, y)
-        print(f"Successfully clicked at ({x}, {y})")
-        return f"Successfully clicked at coordinates ({x}, {y})."
+        logger.debug("Clicking at (%d, %d)", x, y)
+        with input_action():
+            pyautogui.click(x, y)
+        record_click(x, y)
+        return f"clicked ({x}, {y})"
     except Exception as e:
-        print(f"Error clicking at ({x}, {y}): {e}")
+        logger.error("Error clicking at (%d, %d): %s", x, y, e)
         return f"Error clicking at coordinates ({x}, {y}): {e}"
 
 @tool
-def type_text(text: str, interval: float = 0.05):
-    """Types the given text using the keyboard.
+def type_text(text: str, interval: float = 0.01):
+    """Types the given text using the keyboard (pasted via the clipboard when possible, which is much faster).
     Make sure the correct input field is focused before calling this tool (e.g., by clicking it first)."""
     try:
-        print(f"Attempting to type text: '{text}'")
-        pyautogui.write(text, interval=interval)
-        print("Successfully typed text.")
-        return f"Successfully typed text: '{text}'"
+        logger.debug("Typing %d characters", len(text))
+        with input_action():
+            _enter_text(text, interval)
+        return f"typed {len(text)} characters"
     except Exception as e:
-        print(f"Error typing text: {e}")
+        logger.error("Error typing text: %s", e)
         return f"Error typing text: {e}"
 
 @tool
@@ -36,20 +157,100 @@ def press_key(key: str):
     For special keys like Enter, Tab, Esc, use their names. For key combinations, press them sequentially or investigate pyautogui's hotkey function if needed."""
     try:
         # Basic validation for common keys - can be expanded
-        valid_keys = pyautogui.KEYBOARD_KEYS
-        if key.lower() not in valid_keys and len(key) != 1: # Allow single characters
+        if not _is_valid_key(key): # Allow single characters
              return f"Error: Invalid key name '{key}'. Use standard key names like 'enter', 'esc', 'f1', or single characters."
 
-        print(f"Attempting to press key: '{key}'")
-        pyautogui.press(key.lower()) # pyautogui usually expects lowercase key names
-        print(f"Successfully pressed key: '{key}'")
-        return f"Successfully pressed key '{key}'."
+        logger.debug("Pressing key %r", key)
+        with input_action():
+            pyautogui.press(key.lower()) # pyautogui usually expects lowercase key names
+        return f"pressed {key}"
     except Exception as e:
-        print(f"Error pressing key '{key}': {e}")
+        logger.error("Error pressing key %r: %s", key, e)
         return f"Error pressing key '{key}': {e}"
 
+class UIAction(BaseModel):
+    """A single step of execute_ui_actions."""
+    action: Literal["click", "double_click", "right_click", "type", "press", "hotkey", "wait"] = Field(
+        description="click/double_click/right_click at (x, y); type text; press a key; hotkey a key combination; wait seconds.")
+    x: Optional[int] = Field(None, description="Screen x coordinate for click actions.")
+    y: Optional[int] = Field(None, description="Screen y coordinate for click actions.")
+    text: Optional[str] = Field(None, description="Text to enter for 'type'.")
+    key: Optional[str] = Field(None, description="Key name for 'press', e.g. 'enter', 'tab', 'esc'.")
+    keys: Optional[List[str]] = Field(None, description="Keys pressed together for 'hotkey', e.g. ['ctrl', 's'].")
+    seconds: Optional[float] = Field(None, description="Pause length for 'wait' (max 10).")
+
+def _run_ui_action(step):
+    if step.action == "wait":
+        seconds = min(max(step.seconds or 0.0, 0.0), 10.0)
+        time.sleep(seconds)
+        return f"waited {seconds}s"
+    with input_action():
+        return _send_ui_action(step)
+
+def _send_ui_action(step):
+    if step.action in ("click", "double_click", "right_click"):
+        if step.x is None or step.y is None:
+            raise ValueError(f"{step.action} needs x and y")
+        if step.action == "click":
+            pyautogui.click(step.x, step.y)
+        elif step.action == "double_click":
+            pyautogui.doubleClick(step.x, step.y)
+        else:
+            pyautogui.rightClick(step.x, step.y)
+        record_click(step.x, step.y)
+        return f"{step.action} ({step.x}, {step.y})"
+    if step.action == "type":
+        if step.text is None:
+            raise ValueError("type needs text")
+        _enter_text(step.text, interval=0.01)
+        return f"typed {len(step.text)} characters"
+    if step.action == "press":
+        if not step.key or not _is_valid_key(step.key):
+            raise ValueError(f"invalid key '{step.key}'")
+        pyautogui.press(step.key.lower())
+        return f"pressed {step.key}"
+    if step.action == "hotkey":
+        if not step.keys or not all(_is_valid_key(key) for key in step.keys):
+            raise ValueError(f"invalid hotkey {step.keys}")
+        pyautogui.hotkey(*[key.lower() for key in step.keys])
+        return f"hotkey {'+'.join(step.keys)}"
+    raise ValueError(f"unknown action '{step.action}'")
+
+@tool
+def execute_ui_actions(actions: List[UIAction], wait_for_settle: bool = True, settle_timeout: float = 3.0):
+    """Runs a sequence of UI actions (clicks, typing, key presses, hotkeys, short waits) in one call.
+    Prefer this over separate click_coordinates/type_text/press_key calls whenever you already know the steps,
+    e.g. filling a form: click field, type, press tab, type, click submit.
+    Steps run in order and stop at the first failure.
+
+    Args:
+        actions: The steps to perform.
+        wait_for_settle: After the last step, wait until the screen stops changing before returning,
+                         so a following describe_screen_content/find_on_screen sees the result.
+        settle_timeout: Maximum seconds to wait for the screen to settle.
+
+    Returns:
+        A summary of the steps performed, and the error if a step failed."""
+    results = []
+    for number, step in enumerate(actions, start=1):
+        try:
+            results.append(f"{number}. {_run_ui_action(step)}")
+        except Exception as e:
+            logger.error("Error in UI action %d (%s): %s", number, step.action, e)
+            results.append(f"{number}. Error in {step.action}: {e}. Remaining {len(actions) - number} step(s) skipped.")
+            break
+    else:
+        if wait_for_settle and actions:
+            try:
+                settled = wait_for_screen_settle(timeout=settle_timeout)
+                results.append("Screen settled." if settled else f"Screen still changing after {settle_timeout}s.")
+            except Exception as e:
+                logger.warning("Error waiting for the screen to settle: %s", e)
+    return "\n".join(results)
+
 # Example of how the agent might use these:
 # 1. User: "Describe my screen" -> Agent calls describe_screen_content()
 # 2. Agent gets description: "There is a button labeled 'Submit' at coordinates (500, 300)."
+#    (or calls find_on_screen(text='Submit') to get the coordinates locally, without a vision call)
 # 3. User: "Click the submit button" -> Agent calls click_coordinates(x=500, y=300)
 # 4. User: "Type 'hello world' into the text box" -> Agent might need to click the box first, then call type_text(text='hello world')
\ No newline at end of file
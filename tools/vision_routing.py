@@ -0,0 +1,168 @@
+# tools/vision_routing.py
+"""
+Chooses the model, image detail and answer length of describe_screen_content's vision calls.
+
+Most screen reads ("what is open?", "did the dialog close?") are answered well by a small model
+looking at a low-detail image, which is much faster than GPT-4o at high detail. So a read first
+goes to the fast tier, which also rates its own confidence, and is escalated to the strong tier
+only when that answer is unsure, cut off or says the image is unreadable. Prompts asking for exact
+text or positions, which the fast tier gets wrong, go to the strong tier right away.
+
+Every call records its tier, latency, tokens and estimated cost as metrics of the tool call (see
+tracing.py), and route_stats counts the decisions since startup.
+"""
+import logging
+import os
+import re
+import threading
+from tracing import record_step_metric
+
+logger = logging.getLogger(__name__)
+
+class VisionTier:
+    """
+    One way of asking the vision model.
+
+    Args:
+        name: Name used in metrics and logs.
+        model: The OpenAI model.
+        detail: Image detail level, 'low' or 'high'.
+        max_tokens: Maximum length of the answer.
+        ask_confidence: Whether the model is asked to rate its confidence, so an unsure answer can be escalated.
+    """
+
+    def __init__(self, name, model, detail, max_tokens, ask_confidence=False):
+        self.name = name
+        self.model = model
+        self.detail = detail
+        self.max_tokens = max_tokens
+        self.ask_confidence = ask_confidence
+
+    def __repr__(self):
+        return f"VisionTier({self.name!r}, {self.model!r}, {self.detail!r}, {self.max_tokens})"
+
+FAST_TIER = VisionTier("fast", os.getenv("JARVIS_VISION_FAST_MODEL", "gpt-4o-mini"), "low", 250, ask_confidence=True)
+STRONG_TIER = VisionTier("strong", os.getenv("JARVIS_VISION_MODEL", "gpt-4o"), "high", 500)
+
+# USD per million prompt and completion tokens, for the cost estimate recorded with each call.
+# Image tokens are included in the prompt tokens the API reports.
+PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# Prompts that need exact text, small details or screen positions
+FINE_DETAIL_PATTERN = re.compile(
+    r"\b(read|text|exact(ly)?|word(s|ing)?|spell(ed|ing)?|numbers?|digits?|values?|code|error messages?|url|"
+    r"coordinates?|positions?|locat(e|ion)|where|pixels?|click|tiny|small|fine)\b",
+    re.IGNORECASE,
+)
+# Answers admitting that the image wasn't good enough
+UNSURE_PATTERN = re.compile(
+    r"\b(can(no|')?t (see|read|make out|determine|tell)|unable to (see|read|make out|determine)|not (clear|legible|readable)|"
+    r"too (small|blurry|low[- ]resolution)|illegible|blurry|unclear)\b",
+    re.IGNORECASE,
+)
+CONFIDENCE_PATTERN = re.compile(r"\s*CONFIDENCE:\s*\**\s*(high|medium|low)\b\W*$", re.IGNORECASE)
+CONFIDENCE_INSTRUCTION = ("\n\nEnd your answer with a separate last line 'CONFIDENCE: high', 'CONFIDENCE: medium' or "
+                          "'CONFIDENCE: low', saying how sure you are that the image was detailed enough to answer.")
+
+# Routing decisions since startup
+route_stats = {"fast_first": 0, "fine_detail": 0, "requested": 0, "fast_accepted": 0, "escalated": 0}
+_stats_lock = threading.Lock()
+
+def plan_route(prompt, detail_level="auto"):
+    """
+    Returns the tiers to try for a screen read, in order, and why.
+
+    Args:
+        prompt: The question about the screen.
+        detail_level: 'auto' to route by the prompt, or 'low'/'high' for a single strong-model call at that detail.
+
+    Returns:
+        (list of VisionTier, reason), where reason is 'requested', 'fine_detail' or 'fast_first'.
+    """
+    if detail_level in ("low", "high"):
+        return [VisionTier(detail_level, STRONG_TIER.model, detail_level, STRONG_TIER.max_tokens)], "requested"
+    if FINE_DETAIL_PATTERN.search(prompt or ""):
+        return [STRONG_TIER], "fine_detail"
+    return [FAST_TIER, STRONG_TIER], "fast_first"
+
+def judge_answer(tier, text, finish_reason=None):
+    """
+    Strips the confidence line from an answer and decides whether it needs a stronger tier.
+
+    Returns:
+        (answer, reason to escalate or None)
+    """
+    text = text or ""
+    match = CONFIDENCE_PATTERN.search(text)
+    answer = text[:match.start()].rstrip() if match else text.strip()
+    if not tier.ask_confidence:
+        return answer, None
+    if finish_reason == "length":
+        return answer, "truncated"
+    if match and match.group(1).lower() == "low":
+        return answer, "low_confidence"
+    if not answer or UNSURE_PATTERN.search(answer):
+        return answer, "unsure"
+    return answer, None
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Returns the estimated USD cost of a call, or None for a model without a known price."""
+    price = next((PRICES[name] for name in sorted(PRICES, key=len, reverse=True) if model.startswith(name)), None)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+class VisionRoute:
+    """
+    The tiers tried for one screen read. Call accept() with each tier's completion until it returns True.
+
+    Args:
+        prompt: The question about the screen.
+        detail_level: 'auto', 'low' or 'high' (see plan_route).
+    """
+
+    def __init__(self, prompt, detail_level="auto"):
+        self.tiers, self.reason = plan_route(prompt, detail_level)
+        self.answer = None
+        self.attempts = [] # (tier name, seconds, reason it was escalated or None)
+
+    def accept(self, tier, completion, seconds):
+        """
+        Records a tier's call and judges its answer.
+
+        Returns:
+            True if the answer is final: good enough, or from the last tier.
+        """
+        usage = completion.usage
+        record_step_metric(f"vision_{tier.name}_calls", 1)
+        record_step_metric(f"vision_{tier.name}_seconds", round(seconds, 4))
+        if usage is not None:
+            record_step_metric("vision_prompt_tokens", usage.prompt_tokens)
+            record_step_metric("vision_completion_tokens", usage.completion_tokens)
+            cost = estimate_cost(tier.model, usage.prompt_tokens, usage.completion_tokens)
+            if cost is not None:
+                record_step_metric("vision_cost_usd", round(cost, 6))
+
+        choice = completion.choices[0]
+        answer, escalate = judge_answer(tier, choice.message.content, getattr(choice, "finish_reason", None))
+        last = tier is self.tiers[-1]
+        self.attempts.append((tier.name, seconds, None if last else escalate))
+        self.answer = answer
+        if escalate is None or last:
+            self._finish(escalated=len(self.attempts) > 1)
+            return True
+        logger.debug("Escalating screen read from %s tier: %s", tier.name, escalate)
+        return False
+
+    def _finish(self, escalated):
+        with _stats_lock:
+            route_stats[self.reason] += 1
+            if self.reason == "fast_first":
+                route_stats["escalated" if escalated else "fast_accepted"] += 1
+        if escalated:
+            record_step_metric("vision_escalations", 1)
+        logger.debug("Screen read routed %s: %s", self.reason,
+                     ", ".join(f"{name} {seconds:.2f}s" + (f" ({reason})" if reason else "") for name, seconds, reason in self.attempts))
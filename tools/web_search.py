@@ -1,7 +1,19 @@
-from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.tools import tool
 from dotenv import load_dotenv
+from typing import List
+from urllib.parse import urlsplit
+from tools.async_runtime import get_async_http_client, run_coroutine, run_in_runtime
+from tools.search_cache import SearchCache
+from tools.tool_results import collapse_whitespace, compact_json
+from tool_executor import read_only
+import asyncio
+import hashlib
+import logging
 import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -9,43 +21,276 @@ load_dotenv()
 # Check if TAVILY_API_KEY is set
 tavily_api_key = os.getenv("TAVILY_API_KEY")
 if not tavily_api_key:
-    print("Warning: TAVILY_API_KEY is not set. Web search functionality will not work.")
-
-try:
-    # Initialize the search tool with max_results set to 2
-    search_on_web = TavilySearchResults(max_results=2)
-    
-    @tool
-    def search_on_web_tool(query: str) -> str:
-        """
-        Search the web for information about a specific query.
-        
-        Args:
-            query: The search term to look up on the web. Be specific for better results.
-            
-        Returns:
-            Relevant information from web search results.
-        """
-        try:
-            return search_on_web.invoke(query)
-        except Exception as e:
-            return f"Error searching the web: {str(e)}"
-            
-except Exception as e:
-    print(f"Error initializing web search tool: {str(e)}")
-    
-    @tool
-    def search_on_web_tool(query: str) -> str:
-        """
-        Search the web for information about a specific query.
-        
-        Args:
-            query: The search term to look up on the web. Be specific for better results.
-            
-        Returns:
-            Relevant information from web search results.
-        """
+    logger.warning("TAVILY_API_KEY is not set. Web search functionality will not work.")
+
+# Results are cached on disk so repeated searches, within and across sessions, skip the network
+CACHE_DIR = os.getenv("JARVIS_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".jarvis_cache"))
+search_cache = SearchCache(
+    os.path.join(CACHE_DIR, "web_search.sqlite"),
+    ttl=int(os.getenv("JARVIS_SEARCH_CACHE_TTL", "3600")),
+    stale_ttl=int(os.getenv("JARVIS_SEARCH_CACHE_STALE_TTL", "86400")),
+)
+
+# Function taking a query and returning a list of results; replaceable (e.g. by a fake in tests).
+# The Tavily integration is created on first use, as importing langchain_community is slow.
+search_backend = None
+_backend_initialized = False
+_backend_replaced = False
+_backend_lock = threading.Lock()
+
+# Results returned by search_on_web_tool
+SEARCH_RESULTS = 2
+
+def get_search_backend():
+    global search_backend, _backend_initialized
+    with _backend_lock:
+        if not _backend_initialized:
+            _backend_initialized = True
+            try:
+                from langchain_community.tools.tavily_search import TavilySearchResults
+                # Initialize the search tool with max_results set to 2
+                search_on_web = TavilySearchResults(max_results=SEARCH_RESULTS)
+                search_backend = search_on_web.invoke
+            except Exception as e:
+                logger.error("Error initializing web search tool: %s", e)
+                search_backend = None
+        return search_backend
+
+def set_search_backend(backend):
+    """Replaces the function used to run searches, e.g. with a local fake backend."""
+    global search_backend, _backend_initialized, _backend_replaced
+    with _backend_lock:
+        search_backend = backend
+        _backend_initialized = True
+        _backend_replaced = True
+
+def warm_up():
+    get_search_backend()
+
+# Multi-query search calls the Tavily REST API directly over the pooled async client
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com")
+RESULTS_PER_QUERY = 5
+MAX_QUERIES = 5
+QUERY_TIMEOUT = 20
+DUPLICATE_SIMILARITY = 0.7 # Jaccard similarity of content shingles above which two results are the same
+SHINGLE_SIZE = 5
+RRF_K = 60 # Damping constant of reciprocal rank fusion
+
+async def tavily_search(query, max_results=RESULTS_PER_QUERY):
+    """Searches Tavily and returns a list of {"title", "url", "content", "score"} results."""
+    client = get_async_http_client()
+    response = await client.post(f"{TAVILY_API_URL}/search", json={
+        "api_key": tavily_api_key,
+        "query": query,
+        "max_results": max_results,
+        "search_depth": "basic",
+    })
+    response.raise_for_status()
+    return [
+        {"title": r.get("title", ""), "url": r.get("url", ""), "content": r.get("content", ""), "score": r.get("score", 0.0)}
+        for r in response.json().get("results", [])
+    ]
+
+# Coroutine function taking a query and returning a list of results; replaceable like search_backend
+multi_search_backend = tavily_search if tavily_api_key else None
+
+def set_multi_search_backend(backend):
+    """Replaces the coroutine function used by search_web_multi, e.g. with a local fake backend."""
+    global multi_search_backend
+    multi_search_backend = backend
+
+def _url_key(url):
+    """Normalizes a URL so http/https, www., trailing slashes and fragments don't create duplicates."""
+    parts = urlsplit(url.strip().lower())
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{parts.query}" if parts.query else "")
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.casefold())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {
+        hashlib.blake2b(" ".join(words[i:i + SHINGLE_SIZE]).encode(), digest_size=8).digest()
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+def _similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def rank_results(result_lists):
+    """
+    Merges the results of several queries into one ranked, deduplicated list.
+
+    Results are scored by reciprocal rank fusion, so pages that rank high for several query variants
+    come first. Results with the same normalized URL, or with nearly the same content (mirrors,
+    syndicated articles), are merged into the best-ranked one.
+
+    Args:
+        result_lists: One list of result dicts per query, each in the backend's rank order.
+
+    Returns:
+        The merged results, best first, each with a "queries" count added.
+    """
+    merged = []
+    by_url = {}
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            score = 1 / (RRF_K + rank + 1) + 0.01 * float(result.get("score") or 0)
+            key = _url_key(result.get("url", ""))
+            entry = by_url.get(key)
+            if entry is None:
+                shingles = _shingles(result.get("content", ""))
+                entry = next((e for e in merged if _similarity(e["shingles"], shingles) >= DUPLICATE_SIMILARITY), None)
+                if entry is None:
+                    entry = {"result": dict(result), "shingles": shingles, "score": 0.0, "queries": 0}
+                    merged.append(entry)
+                by_url[key] = entry
+            entry["score"] += score
+            entry["queries"] += 1
+            # Keep the longest snippet seen for the page
+            if len(result.get("content", "")) > len(entry["result"].get("content", "")):
+                entry["result"]["content"] = result["content"]
+
+    merged.sort(key=lambda e: e["score"], reverse=True)
+    return [dict(e["result"], queries=e["queries"]) for e in merged]
+
+def _estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def format_results(results, token_budget):
+    """Formats ranked results as numbered entries, stopping (or cutting the last snippet) at the token budget."""
+    lines = []
+    used = 0
+    for number, result in enumerate(results, start=1):
+        header = f"[{number}] {result.get('title') or result.get('url')}\n{result.get('url')}\n"
+        content = " ".join(result.get("content", "").split())
+        remaining = token_budget - used - _estimate_tokens(header)
+        if remaining < 20:
+            lines.append(f"[{len(results) - number + 1} more results omitted to stay within the token budget]")
+            break
+        if _estimate_tokens(content) > remaining:
+            content = content[:remaining * 4].rsplit(" ", 1)[0] + " [...]"
+        entry = header + content + "\n"
+        lines.append(entry)
+        used += _estimate_tokens(entry)
+    return "\n".join(lines)
+
+async def _fan_out(queries):
+    backend = multi_search_backend
+
+    async def one(query):
+        return await asyncio.wait_for(
+            search_cache.aget_or_fetch(query, backend, cacheable=lambda results: isinstance(results, list), namespace="multi"),
+            QUERY_TIMEOUT,
+        )
+
+    return await asyncio.gather(*(one(query) for query in queries), return_exceptions=True)
+
+def _summarize(queries, outcomes, token_budget):
+    result_lists = [outcome for outcome in outcomes if isinstance(outcome, list)]
+    failures = [f"'{query}': {outcome!r}" for query, outcome in zip(queries, outcomes) if isinstance(outcome, BaseException)]
+    if not result_lists:
+        return "Error searching the web: " + "; ".join(failures)
+    text = format_results(rank_results(result_lists), token_budget) or "No results found."
+    if failures:
+        text += "\n(Some searches failed: " + "; ".join(failures) + ")"
+    return text
+
+def _clean_queries(queries):
+    unique = []
+    seen = set()
+    for query in queries:
+        query = query.strip()
+        if query and query.casefold() not in seen:
+            seen.add(query.casefold())
+            unique.append(query)
+    return unique[:MAX_QUERIES]
+
+@read_only
+@tool
+def search_web_multi(queries: List[str], token_budget: int = 1500) -> str:
+    """
+    Search the web for several phrasings of a question at once and get one merged, deduplicated
+    list of the best results. Prefer this over search_on_web_tool for open-ended research.
+
+    Args:
+        queries: Up to 5 different search queries (e.g. variants or sub-questions of the same topic).
+        token_budget: Approximate maximum size of the returned results in tokens.
+
+    Returns:
+        Numbered results (title, URL and snippet), best first.
+    """
+    if multi_search_backend is None:
+        return "Web search is currently unavailable. Please check your Tavily API key."
+    queries = _clean_queries(queries)
+    if not queries:
+        return "Error: No search queries given."
+    try:
+        return _summarize(queries, run_coroutine(_fan_out(queries)), token_budget)
+    except Exception as e:
+        return f"Error searching the web: {str(e)}"
+
+async def _asearch_web_multi(queries: List[str], token_budget: int = 1500) -> str:
+    if multi_search_backend is None:
         return "Web search is currently unavailable. Please check your Tavily API key."
+    queries = _clean_queries(queries)
+    if not queries:
+        return "Error: No search queries given."
+    try:
+        return _summarize(queries, await run_in_runtime(_fan_out(queries)), token_budget)
+    except Exception as e:
+        return f"Error searching the web: {str(e)}"
+
+# Async callers (ainvoke) await the fan-out directly instead of blocking a worker thread
+search_web_multi.coroutine = _asearch_web_multi
+
+def _encode_results(results):
+    """Encodes search_on_web_tool's results as compact JSON with only the fields the model reads; error strings pass through."""
+    if not isinstance(results, list):
+        return results
+    return compact_json([
+        {"title": r.get("title"), "url": r.get("url"), "content": collapse_whitespace(r.get("content"))}
+        for r in results if isinstance(r, dict)
+    ])
 
+@read_only
+@tool
+def search_on_web_tool(query: str) -> str:
+    """
+    Search the web for information about a specific query.
 
+    Args:
+        query: The search term to look up on the web. Be specific for better results.
+
+    Returns:
+        The results as a JSON list of {"title", "url", "content"} objects.
+    """
+    backend = get_search_backend()
+    if backend is None:
+        return "Web search is currently unavailable. Please check your Tavily API key."
+    try:
+        # Tavily reports failures as a string instead of a list of results; those aren't cached
+        return _encode_results(search_cache.get_or_fetch(query, backend, cacheable=lambda results: isinstance(results, list)))
+    except Exception as e:
+        return f"Error searching the web: {str(e)}"
+
+async def _asearch_on_web_tool(query: str) -> str:
+    fetch = None
+    if _backend_replaced:
+        backend = search_backend
+        if backend is not None:
+            fetch = lambda query: asyncio.to_thread(backend, query)
+    elif tavily_api_key:
+        # Same results as the TavilySearchResults backend, fetched over the pooled keep-alive client
+        fetch = lambda query: tavily_search(query, max_results=SEARCH_RESULTS)
+    if fetch is None:
+        return "Web search is currently unavailable. Please check your Tavily API key."
+    try:
+        return _encode_results(await run_in_runtime(search_cache.aget_or_fetch(query, fetch, cacheable=lambda results: isinstance(results, list))))
+    except Exception as e:
+        return f"Error searching the web: {str(e)}"
 
+# Async callers (ainvoke) await the search instead of blocking a worker thread
+search_on_web_tool.coroutine = _asearch_on_web_tool
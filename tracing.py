@@ -0,0 +1,417 @@
+# tracing.py
+"""
+Per-step latency and token tracing for the agent loop.
+
+A TurnTracer is passed to the graph as a LangChain callback handler for one turn. It records every
+model call (duration, time to first token, prompt and completion tokens, prompt size), every tool
+call (duration, input and output bytes, plus metrics reported by the tool such as screen image
+bytes), every graph node and explicitly timed steps such as update_state, and writes them with a
+summary record of the turn to the configured sinks when the turn ends.
+
+Records are JSON objects with a "type" of "turn", "model", "tool", "node" or "step". Times are in
+seconds; "offset" is the start of a step relative to the start of its turn.
+
+Usage:
+    python tracing.py summary [path] [--last N]   # p50/p95 per turn, model, tool and step
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.callbacks.manager import dispatch_custom_event
+
+logger = logging.getLogger(__name__)
+
+METRIC_EVENT = "jarvis_step_metric"
+
+def record_step_metric(name, value):
+    """
+    Adds value to a metric of the tool call currently running, e.g. the bytes of an image it sent.
+
+    Does nothing when called outside a traced run, so tools can call it unconditionally.
+    """
+    try:
+        dispatch_custom_event(METRIC_EVENT, {"name": name, "value": value})
+    except Exception:
+        pass
+
+class JsonlTraceSink:
+    """
+    Appends trace records to a JSON Lines file, one record per line.
+
+    Args:
+        path: The trace file. Its directory is created if needed.
+        max_bytes: When the file grows beyond this size it is renamed to <path>.1 and a new one started.
+    """
+
+    def __init__(self, path, max_bytes=20 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, records):
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in records)
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+class OpenTelemetrySink:
+    """
+    Exports trace records as OpenTelemetry spans: one span per turn with a child span per step.
+
+    Spans go to whatever tracer provider the OpenTelemetry SDK was configured with (for example by
+    running under opentelemetry-instrument); without one they are dropped.
+    """
+
+    def __init__(self, tracer=None):
+        from opentelemetry import trace
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("jarvis")
+
+    def write(self, records):
+        turn = next((record for record in records if record["type"] == "turn"), None)
+        if turn is None:
+            return
+        start_ns = int(turn["ts"] * 1e9)
+        turn_span = self.tracer.start_span("jarvis.turn", start_time=start_ns, attributes=_span_attributes(turn))
+        context = self._trace.set_span_in_context(turn_span)
+        for record in records:
+            if record is turn:
+                continue
+            step_start = start_ns + int(record["offset"] * 1e9)
+            span = self.tracer.start_span(f"jarvis.{record['type']}.{record['name']}", context=context,
+                                          start_time=step_start, attributes=_span_attributes(record))
+            span.end(end_time=step_start + int(record["duration"] * 1e9))
+        turn_span.end(end_time=start_ns + int(turn["duration"] * 1e9))
+
+def _span_attributes(record):
+    # OpenTelemetry attributes must be primitive values; nested metrics are flattened
+    attributes = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            attributes.update({f"{key}.{name}": item for name, item in value.items()})
+        elif isinstance(value, (str, bool, int, float)):
+            attributes[key] = value
+    return attributes
+
+def sinks_from_env(default_path):
+    """
+    Returns the trace sinks configured by the environment.
+
+    JARVIS_TRACING=0 turns tracing off. Records go to JARVIS_TRACE_PATH (default_path if unset), and
+    also to OpenTelemetry if JARVIS_TRACE_OTEL=1 and the opentelemetry package is installed.
+    """
+    if os.getenv("JARVIS_TRACING", "1") == "0":
+        return []
+    sinks = [JsonlTraceSink(os.getenv("JARVIS_TRACE_PATH") or default_path)]
+    if os.getenv("JARVIS_TRACE_OTEL") == "1":
+        try:
+            sinks.append(OpenTelemetrySink())
+        except ImportError:
+            logger.warning("JARVIS_TRACE_OTEL is set but opentelemetry is not installed; traces only go to %s", sinks[0].path)
+    return sinks
+
+class TurnTracer(BaseCallbackHandler):
+    """
+    Callback handler recording the steps of one agent turn.
+
+    Args:
+        thread_id: The conversation thread ID, stored with every record.
+        sinks: Objects with a write(records) method that receive the records when finish() is called.
+    """
+
+    # Tools run on worker threads; recording inline keeps the timings accurate
+    run_inline = True
+
+    def __init__(self, thread_id, sinks=()):
+        self.trace_id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self.sinks = list(sinks)
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._open = {} # run_id -> record of a step in progress
+        self.records = []
+        self.first_token = None
+        self._finished = False
+
+    def _offset(self):
+        return time.perf_counter() - self._t0
+
+    def _start(self, key, kind, name, **fields):
+        record = {"type": kind, "trace_id": self.trace_id, "thread_id": self.thread_id, "name": name,
+                  "offset": round(self._offset(), 6), **fields}
+        with self._lock:
+            self._open[key] = record
+        return record
+
+    def _end(self, key, **fields):
+        with self._lock:
+            record = self._open.pop(key, None)
+            if record is None:
+                return None
+            record["duration"] = round(self._offset() - record["offset"], 6)
+            record.update(fields)
+            self.records.append(record)
+        return record
+
+    @contextmanager
+    def step(self, name):
+        """Times a block of code as a step of the turn, e.g. a checkpoint update outside the graph run."""
+        key = object()
+        self._start(key, "step", name)
+        try:
+            yield
+        except BaseException as e:
+            self._end(key, error=type(e).__name__)
+            raise
+        self._end(key)
+
+    # Model calls
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        prompt = messages[0] if messages else []
+        self._start(run_id, "model", (metadata or {}).get("ls_model_name") or kwargs.get("name") or "model",
+                    prompt_messages=len(prompt), prompt_chars=sum(len(str(message.content)) for message in prompt))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, "model", (metadata or {}).get("ls_model_name") or kwargs.get("name") or "model",
+                    prompt_messages=len(prompts), prompt_chars=sum(len(prompt) for prompt in prompts))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            record = self._open.get(run_id)
+            if record is None or "ttft" in record:
+                return
+            now = self._offset()
+            record["ttft"] = round(now - record["offset"], 6)
+            if self.first_token is None:
+                self.first_token = now
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_tokens = completion_tokens = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens = (prompt_tokens or 0) + usage.get("input_tokens", 0)
+                    completion_tokens = (completion_tokens or 0) + usage.get("output_tokens", 0)
+        if prompt_tokens is None:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        self._end(run_id, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    # Tool calls
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tool", kwargs.get("name") or (serialized or {}).get("name") or "tool",
+                    input_bytes=len(str(input_str).encode("utf-8")))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = getattr(output, "content", output)
+        self._end(run_id, output_bytes=len(str(content).encode("utf-8")))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        if name != METRIC_EVENT:
+            return
+        with self._lock:
+            # Reported from inside a tool, so run_id is the tool call's run
+            record = self._open.get(run_id)
+            if record is not None:
+                metrics = record.setdefault("metrics", {})
+                metrics[data["name"]] = metrics.get(data["name"], 0) + data["value"]
+
+    # Graph nodes ("agent" and "tools"); the many runnables nested inside them are ignored
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node and not node.startswith("__"):
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        # Interrupting a run (GraphInterrupt) or a cancelled stream ends the node as well
+        self._end(run_id, error=type(error).__name__)
+
+    def finish(self, status="done"):
+        """Adds the turn record and writes all records to the sinks. Only the first call has an effect."""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            # Steps still open when the turn ends were abandoned (e.g. a tool that timed out)
+            for record in self._open.values():
+                record.update(duration=round(self._offset() - record["offset"], 6), error="abandoned")
+                self.records.append(record)
+            self._open.clear()
+            models = [record for record in self.records if record["type"] == "model"]
+            prompt_tokens = [record["prompt_tokens"] for record in models if record.get("prompt_tokens") is not None]
+            completion_tokens = [record["completion_tokens"] for record in models if record.get("completion_tokens") is not None]
+            turn = {
+                "type": "turn",
+                "trace_id": self.trace_id,
+                "thread_id": self.thread_id,
+                "name": "turn",
+                "ts": self.started_at,
+                "offset": 0.0,
+                "duration": round(self._offset(), 6),
+                "status": status,
+                "ttft": None if self.first_token is None else round(self.first_token, 6),
+                "model_calls": len(models),
+                "tool_calls": sum(record["type"] == "tool" for record in self.records),
+                # None unless the model reported usage, so unknown counts don't read as zero in summaries
+                "prompt_tokens": sum(prompt_tokens) if prompt_tokens else None,
+                "completion_tokens": sum(completion_tokens) if completion_tokens else None,
+            }
+            records = sorted(self.records, key=lambda record: record["offset"]) + [turn]
+        logger.debug("Turn %s on thread %s: %s in %.2fs, %d model calls, %d tool calls",
+                     self.trace_id, self.thread_id, status, turn["duration"], turn["model_calls"], turn["tool_calls"])
+        for sink in self.sinks:
+            try:
+                sink.write(records)
+            except Exception as e:
+                logger.warning("Writing trace to %s failed: %s", type(sink).__name__, e)
+
+def load_records(path):
+    """Reads the records of a JSONL trace file, skipping lines that can't be parsed."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+def percentile(values, q):
+    """Returns the q-th percentile (0-100) of values by linear interpolation, or None if empty."""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def summarize(records):
+    """
+    Groups records by type and name and computes duration and time-to-first-token percentiles.
+
+    Returns:
+        A list of dicts with type, name, count, p50, p95, ttft_p50, ttft_p95, mean token counts and errors.
+    """
+    groups = defaultdict(list)
+    for record in records:
+        groups[(record.get("type"), record.get("name"))].append(record)
+    order = {"turn": 0, "model": 1, "node": 2, "tool": 3, "step": 4}
+    rows = []
+    for (kind, name), group in sorted(groups.items(), key=lambda item: (order.get(item[0][0], 5), str(item[0][1]))):
+        durations = [record["duration"] for record in group if record.get("duration") is not None]
+        ttfts = [record["ttft"] for record in group if record.get("ttft") is not None]
+        prompt_tokens = [record["prompt_tokens"] for record in group if record.get("prompt_tokens") is not None]
+        completion_tokens = [record["completion_tokens"] for record in group if record.get("completion_tokens") is not None]
+        rows.append({
+            "type": kind,
+            "name": name,
+            "count": len(group),
+            "p50": percentile(durations, 50),
+            "p95": percentile(durations, 95),
+            "ttft_p50": percentile(ttfts, 50),
+            "ttft_p95": percentile(ttfts, 95),
+            "prompt_tokens": sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else None,
+            "completion_tokens": sum(completion_tokens) / len(completion_tokens) if completion_tokens else None,
+            "errors": sum(1 for record in group if record.get("error")),
+        })
+    return rows
+
+def summarize_metrics(records):
+    """
+    Totals the metrics reported by tools (see record_step_metric), per tool and metric name.
+
+    Returns:
+        A list of dicts with tool, metric, calls (tool calls reporting it), total and mean per reporting call.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for record in records:
+        if record.get("type") == "tool":
+            for metric, value in (record.get("metrics") or {}).items():
+                total = totals[(record.get("name"), metric)]
+                total[0] += 1
+                total[1] += value
+    return [{"tool": tool, "metric": metric, "calls": calls, "total": total, "mean": total / calls}
+            for (tool, metric), (calls, total) in sorted(totals.items(), key=lambda item: (str(item[0][0]), item[0][1]))]
+
+def format_summary(rows):
+    """Formats the rows of summarize() as a text table."""
+    def cell(value, digits=3):
+        if value is None:
+            return "-"
+        return f"{value:.{digits}f}" if isinstance(value, float) else str(value)
+
+    header = ["type", "name", "count", "p50 s", "p95 s", "ttft p50", "ttft p95", "prompt tok", "compl tok", "errors"]
+    table = [header] + [
+        [row["type"], str(row["name"]), str(row["count"]), cell(row["p50"]), cell(row["p95"]), cell(row["ttft_p50"]),
+         cell(row["ttft_p95"]), cell(row["prompt_tokens"], 0), cell(row["completion_tokens"], 0), str(row["errors"])]
+        for row in rows
+    ]
+    return _format_table(table)
+
+def format_metrics(rows):
+    """Formats the rows of summarize_metrics() as a text table."""
+    def cell(value):
+        return f"{value:.4g}" if isinstance(value, float) else str(value)
+
+    header = ["tool", "metric", "calls", "total", "mean"]
+    return _format_table([header] + [[str(row["tool"]), row["metric"], str(row["calls"]), cell(row["total"]), cell(row["mean"])]
+                                     for row in rows])
+
+def _format_table(table):
+    widths = [max(len(line[column]) for line in table) for column in range(len(table[0]))]
+    return "\n".join("  ".join(value.ljust(width) for value, width in zip(line, widths)).rstrip() for line in table)
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize Jarvis agent traces.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary = subparsers.add_parser("summary", help="Print p50/p95 latency per turn, model, tool and step")
+    summary.add_argument("path", nargs="?", help="Trace file (defaults to the one the agent writes)")
+    summary.add_argument("--last", type=int, help="Only include the last N turns")
+    args = parser.parse_args()
+
+    path = args.path
+    if path is None:
+        from jarvis import CACHE_DIR
+        path = os.getenv("JARVIS_TRACE_PATH") or os.path.join(CACHE_DIR, "traces.jsonl")
+    if not os.path.exists(path):
+        print(f"No trace file at {path}.")
+        return
+    records = load_records(path)
+    if args.last:
+        turns = [record["trace_id"] for record in records if record.get("type") == "turn"][-args.last:]
+        keep = set(turns)
+        records = [record for record in records if record.get("trace_id") in keep]
+    print(f"{sum(record.get('type') == 'turn' for record in records)} turns from {path}\n")
+    print(format_summary(summarize(records)))
+    metrics = summarize_metrics(records)
+    if metrics:
+        print("\nTool metrics\n")
+        print(format_metrics(metrics))
+
+if __name__ == "__main__":
+    main()
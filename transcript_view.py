@@ -0,0 +1,273 @@
+# transcript_view.py
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QTimer
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QKeySequence, QPen
+from PyQt5.QtWidgets import QApplication, QListView, QShortcut, QStyle, QStyledItemDelegate
+
+SenderRole = Qt.UserRole + 1
+
+# Longer messages are cut when drawn (the full text is still copied with Ctrl+C)
+MAX_DISPLAY_CHARS = 20000
+
+def history_entries(messages):
+    """Returns (sender, text) for the messages of a checkpoint that the transcript shows."""
+    entries = []
+    for message in messages:
+        content = message.content
+        text = content if isinstance(content, str) else "".join(
+            block.get("text", "") for block in content if isinstance(block, dict) and block.get("type") == "text")
+        if message.type == "human":
+            entries.append(("User", text))
+        elif message.type == "ai" and text.strip():
+            entries.append(("JARVIS", text))
+    return entries
+
+class TranscriptModel(QAbstractListModel):
+    """
+    The messages shown in the transcript, as a list model with at most max_rows rows once trimmed.
+
+    Each row is [sender, text, from_history, cached layout]. Rows with from_history set correspond, in order,
+    to the user and assistant messages saved in the conversation's checkpoint. When old rows are
+    trimmed from the top, hidden_history counts how many of those messages are no longer resident,
+    so load_older() can read them back from the checkpoint. Other rows (status and error messages)
+    are dropped for good.
+    """
+
+    def __init__(self, max_rows=200, parent=None):
+        super().__init__(parent)
+        self.max_rows = max_rows
+        self.rows = []
+        self.hidden_history = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return row[1]
+        if role == SenderRole:
+            return row[0]
+        return None
+
+    def append(self, sender, text, from_history):
+        position = len(self.rows)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.append([sender, text, from_history, None])
+        self.endInsertRows()
+
+    def extend_last(self, text):
+        """Appends streamed text to the last message. Returns its index."""
+        self.rows[-1][1] += text
+        index = self.index(len(self.rows) - 1)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole])
+        return index
+
+    def set_last_from_history(self, from_history):
+        if self.rows:
+            self.rows[-1][2] = from_history
+
+    def trim(self):
+        """Drops the oldest rows beyond max_rows."""
+        excess = len(self.rows) - self.max_rows
+        if excess <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), 0, excess - 1)
+        self.hidden_history += sum(1 for row in self.rows[:excess] if row[2])
+        del self.rows[:excess]
+        self.endRemoveRows()
+
+    def load_older(self, history, count):
+        """
+        Prepends up to count of the trimmed history messages.
+
+        Args:
+            history: (sender, text) of every message in the checkpoint, oldest first.
+            count: Maximum number of messages to load.
+
+        Returns:
+            The number of rows added.
+        """
+        end = min(self.hidden_history, len(history))
+        page = history[max(0, end - count):end]
+        if not page:
+            return 0
+        self.beginInsertRows(QModelIndex(), 0, len(page) - 1)
+        self.rows[:0] = [[sender, text, True, None] for sender, text in page]
+        self.hidden_history = end - len(page)
+        self.endInsertRows()
+        return len(page)
+
+class MessageDelegate(QStyledItemDelegate):
+    """
+    Draws a message as plain wrapped text under its sender, with an accent bar on the left.
+
+    Only visible rows are drawn. Each row's height is cached with the width and text length it was
+    measured for, since the view asks for the size of every row whenever it lays them out.
+    """
+
+    PADDING = 10
+    BAR_WIDTH = 3
+    SPACING = 12
+
+    def __init__(self, accent_color, text_color, parent=None):
+        super().__init__(parent)
+        self.accent_color = QColor(accent_color)
+        self.text_color = QColor(text_color)
+
+    def _text_rect(self, rect, sender_height):
+        left = rect.left() + self.BAR_WIDTH + self.PADDING
+        return QRect(left, rect.top() + sender_height + 4, rect.right() - left - self.PADDING, rect.height())
+
+    def _fonts(self, option):
+        sender_font = QFont(option.font)
+        sender_font.setBold(True)
+        return sender_font, option.font
+
+    def sizeHint(self, option, index):
+        row = index.model().rows[index.row()]
+        width = option.rect.width() if option.rect.width() > 0 else self.parent().viewport().width()
+        cached = row[3]
+        if cached is None or cached[0] != width or cached[1] != len(row[1]):
+            sender_font, text_font = self._fonts(option)
+            sender_height = QFontMetrics(sender_font).height()
+            text_width = max(50, width - self.BAR_WIDTH - 3 * self.PADDING)
+            text_height = QFontMetrics(text_font).boundingRect(QRect(0, 0, text_width, 10 ** 7), Qt.TextWordWrap,
+                                                               row[1][:MAX_DISPLAY_CHARS]).height()
+            cached = row[3] = (width, len(row[1]), sender_height + 4 + text_height + self.SPACING)
+        return QSize(width, cached[2])
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect.adjusted(0, 0, 0, -self.SPACING)
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, QColor(self.accent_color.red(), self.accent_color.green(), self.accent_color.blue(), 40))
+        painter.fillRect(QRect(rect.left(), rect.top(), self.BAR_WIDTH, rect.height()), self.accent_color)
+
+        sender_font, text_font = self._fonts(option)
+        sender_height = QFontMetrics(sender_font).height()
+        painter.setFont(sender_font)
+        painter.setPen(QPen(self.accent_color))
+        painter.drawText(QRect(rect.left() + self.BAR_WIDTH + self.PADDING, rect.top(), rect.width(), sender_height),
+                         Qt.AlignLeft | Qt.AlignVCenter, f"{index.data(SenderRole)}:")
+
+        text = index.data(Qt.DisplayRole)
+        if len(text) > MAX_DISPLAY_CHARS:
+            text = text[:MAX_DISPLAY_CHARS] + f"\n... ({len(text) - MAX_DISPLAY_CHARS} more characters)"
+        painter.setFont(text_font)
+        painter.setPen(QPen(self.text_color))
+        painter.drawText(self._text_rect(rect, sender_height), Qt.TextWordWrap | Qt.AlignLeft | Qt.AlignTop, text)
+        painter.restore()
+
+class TranscriptView(QListView):
+    """
+    Conversation transcript that stays fast however long the session gets.
+
+    Messages are rows of a TranscriptModel drawn by a MessageDelegate, so only the visible ones are
+    laid out and painted. At most max_rows messages are kept; older ones are trimmed while the view
+    follows the newest message and are read back from the checkpoint with load_history when the
+    user scrolls to the top. Streamed text is buffered and applied once per frame.
+
+    Args:
+        accent_color: Color of sender names and the message bar.
+        text_color: Color of the message text.
+        load_history: Function returning (sender, text) of every message in the conversation's
+            checkpoint (see history_entries), or None to not page back trimmed messages.
+        max_rows: Messages kept in the view while following the newest one.
+        page_size: Messages read back per scroll to the top.
+    """
+
+    FRAME_MS = 16
+
+    def __init__(self, accent_color, text_color, load_history=None, max_rows=200, page_size=50, parent=None):
+        super().__init__(parent)
+        self.load_history = load_history
+        self.page_size = page_size
+        self.transcript = TranscriptModel(max_rows=max_rows, parent=self)
+        self.setModel(self.transcript)
+        self.delegate = MessageDelegate(accent_color, text_color, parent=self)
+        self.setItemDelegate(self.delegate)
+        self.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.Adjust)
+        self.setWordWrap(True)
+        self.setSelectionMode(QListView.ExtendedSelection)
+        self.verticalScrollBar().setSingleStep(20)
+        self.verticalScrollBar().valueChanged.connect(self._on_scroll)
+        QShortcut(QKeySequence.Copy, self, self.copySelection)
+
+        self.streaming = False # Whether streamed text goes into the last message
+        self._pending = [] # Streamed text not yet applied
+        self._follow_pending = False # Whether the next flush should trim and scroll to the newest message
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(self.FRAME_MS)
+        self._flush_timer.timeout.connect(self.flush)
+
+    def appendMessage(self, sender, text, from_history=False):
+        """Adds a message. from_history marks user and assistant messages that are saved in the checkpoint."""
+        self.endStreaming()
+        self._follow(lambda: self.transcript.append(sender, text, from_history))
+
+    def appendStreamingText(self, text):
+        """Adds streamed text to the current assistant message, starting one if needed."""
+        if not self.streaming:
+            self.appendMessage("JARVIS", "", from_history=True)
+            self.streaming = True
+        self._pending.append(text)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def endStreaming(self, from_history=True):
+        """Ends the current streamed message; from_history=False if it was never saved (e.g. cancelled)."""
+        self.flush()
+        if self.streaming and not from_history:
+            self.transcript.set_last_from_history(False)
+        self.streaming = False
+
+    def flush(self):
+        """Applies buffered streamed text in one model update, then scrolls to the newest message if following it."""
+        self._flush_timer.stop()
+        if self._pending and self.transcript.rows:
+            text = "".join(self._pending)
+            self._follow(lambda: self.delegate.sizeHintChanged.emit(self.transcript.extend_last(text)))
+        self._pending.clear()
+        if self._follow_pending:
+            self._follow_pending = False
+            self.transcript.trim()
+            self.scrollToBottom()
+
+    def copySelection(self):
+        rows = sorted(index.row() for index in self.selectedIndexes())
+        if rows:
+            QApplication.clipboard().setText("\n\n".join(f"{self.transcript.rows[row][0]}: {self.transcript.rows[row][1]}" for row in rows))
+
+    def _at_bottom(self):
+        scroll_bar = self.verticalScrollBar()
+        return scroll_bar.value() >= scroll_bar.maximum() - 4
+
+    def _follow(self, change):
+        # Keeps the newest message in view if it was, and only then trims old rows, so the messages
+        # the user is reading don't move. Laying out the rows is deferred to the next frame.
+        following = self._follow_pending or self._at_bottom()
+        change()
+        if following:
+            self._follow_pending = True
+            if not self._flush_timer.isActive():
+                self._flush_timer.start()
+
+    def _on_scroll(self, value):
+        if value == self.verticalScrollBar().minimum() and self.transcript.hidden_history and self.load_history:
+            self._load_older()
+        elif value == self.verticalScrollBar().maximum():
+            self.transcript.trim()
+
+    def _load_older(self):
+        first = self.transcript.index(0)
+        offset = self.visualRect(first).top()
+        added = self.transcript.load_older(self.load_history(), self.page_size)
+        if added:
+            # Keep the message that was at the top where it was
+            self.scrollTo(self.transcript.index(added), QListView.PositionAtTop)
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() - offset)